@@ -0,0 +1,56 @@
+"""基准测试的公共初始化
+
+基准测试脚本需要在初始化NoneBot并加载插件后才能导入插件模块，
+运行方式：`python benchmarks/bench_xxx.py`
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import nonebot
+from nonebot.adapters.onebot.v11 import Adapter as OneBotV11Adapter
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+_initialized = False
+
+
+def init_plugin() -> None:
+    """初始化NoneBot并加载插件，本地存储使用临时目录"""
+    global _initialized
+    if _initialized:
+        return
+    store_dir = Path(tempfile.mkdtemp(prefix="suggarchat-bench-"))
+    nonebot.init(
+        log_level="WARNING",
+        localstore_cache_dir=store_dir / "cache",
+        localstore_config_dir=store_dir / "config",
+        localstore_data_dir=store_dir / "data",
+    )
+    nonebot.get_driver().register_adapter(OneBotV11Adapter)
+    nonebot.load_plugin("nonebot_plugin_suggarchat")
+    nonebot.logger.remove()  # 基准测试不输出日志
+    _initialized = True
+
+
+def bench(func: Callable[[], object], *, number: int = 1000, repeat: int = 5) -> float:
+    """返回多次重复中单次调用的最短耗时（微秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def report(name: str, before: float, after: float, unit: str = "us") -> None:
+    """输出一行对比结果"""
+    print(f"{name:<40} {before:>12.1f} {unit} -> {after:>10.1f} {unit}")
@@ -0,0 +1,87 @@
+"""归档会话存储基准测试
+
+对比旧的JSON列（sessions_json）与压缩存储（sessions_blob）的单行大小与读取耗时。
+数据为合成的中文聊天记录（词表较小，压缩率会高于真实数据），
+默认生成1000行，`--rows 100000` 可复现完整规模。
+"""
+
+import argparse
+import json
+import random
+
+from _bootstrap import bench, init_plugin, report
+
+init_plugin()
+
+from nonebot_plugin_suggarchat.utils.archive import ARCHIVE_CODEC
+from nonebot_plugin_suggarchat.utils.models import (
+    MemoryModel,
+    Message,
+    _sessions_adapter,
+    dump_sessions_blob,
+    parse_sessions_blob,
+)
+
+WORDS = ["今天", "天气", "不错", "我们", "一起", "去", "吃饭", "好的", "哈哈", "为什么"]
+
+
+def make_row(rng: random.Random, sessions: int, messages: int) -> list[MemoryModel]:
+    return [
+        MemoryModel(
+            messages=[
+                Message(
+                    role="user" if i % 2 == 0 else "assistant",
+                    content="".join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                )
+                for i in range(messages)
+            ],
+            summary="".join(rng.choices(WORDS, k=20)),
+        )
+        for _ in range(sessions)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=5, help="每行的归档会话数")
+    parser.add_argument("--messages", type=int, default=20, help="每个会话的消息数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rows = [make_row(rng, args.sessions, args.messages) for _ in range(args.rows)]
+    # 旧格式：JSON列保存的文本（与SQLAlchemy JSON列的默认序列化一致）
+    json_rows = [
+        json.dumps(_sessions_adapter.dump_python(row, mode="json")) for row in rows
+    ]
+    codecs: list[ARCHIVE_CODEC] = ["zlib"]
+    try:
+        import zstandard  # pyright: ignore[reportMissingImports] # noqa: F401
+    except ImportError:
+        pass
+    else:
+        codecs.append("zstd")
+
+    print(
+        f"{args.rows} rows, {args.sessions} sessions x {args.messages} messages per row"
+    )
+    json_size = sum(len(i.encode("utf-8")) for i in json_rows) / len(rows)
+    sample = json_rows[0]
+    number = max(1, 2000 // args.sessions)
+    json_read = bench(
+        lambda: _sessions_adapter.validate_python(json.loads(sample)), number=number
+    )
+    for codec in codecs:
+        blobs = [dump_sessions_blob(row, codec) for row in rows]
+        blob_size = sum(len(i) for i in blobs) / len(rows)
+        blob = blobs[0]
+        report(f"row size ({codec})", json_size / 1024, blob_size / 1024, "KiB")
+        report(
+            f"read one row ({codec})",
+            json_read,
+            bench(lambda: parse_sessions_blob(blob), number=number),
+        )
+
+
+if __name__ == "__main__":
+    main()
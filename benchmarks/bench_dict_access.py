@@ -0,0 +1,91 @@
+"""dict风格字段访问基准测试（50条消息的多模态对话历史）
+
+对比旧的 `model_dump()[key]` 与直接读取字段值的 `BaseModel.__getitem__`：
+每轮对话扫描消息（msg["role"]、part["type"]、part["text"]），以及读取 Group_Data["enable"]。
+"""
+
+from typing import Any
+
+from _bootstrap import bench, init_plugin, report
+
+init_plugin()
+
+from nonebot_plugin_suggarchat.utils.memory import Memory, MemoryModel
+from nonebot_plugin_suggarchat.utils.models import (
+    ImageContent,
+    ImageUrl,
+    Message,
+    TextContent,
+)
+
+MESSAGES = 50
+
+
+def legacy_getitem(model: Any, key: str) -> Any:
+    """旧的dict风格访问：序列化整个模型后取值"""
+    return model.model_dump()[key]
+
+
+def make_messages() -> list[Message]:
+    return [
+        (
+            Message(
+                role="user",
+                content=[
+                    TextContent(text=f"第{index}张图片里是什么？"),
+                    ImageContent(image_url=ImageUrl(url="https://example.com/a.png")),
+                ],
+            )
+            if index % 2 == 0
+            else Message(role="assistant", content="图片里是一只猫。" * 5)
+        )
+        for index in range(MESSAGES)
+    ]
+
+
+def legacy_scan(messages: list[Message]) -> int:
+    count = 0
+    for msg in messages:
+        if legacy_getitem(msg, "role") != "user":
+            continue
+        content = legacy_getitem(msg, "content")
+        if isinstance(content, list):
+            for part in content:
+                if part["type"] == "text":
+                    count += len(part["text"])
+    return count
+
+
+def scan(messages: list[Message]) -> int:
+    count = 0
+    for msg in messages:
+        if msg["role"] != "user":
+            continue
+        content = msg["content"]
+        if isinstance(content, list):
+            for part in content:
+                if part["type"] == "text":
+                    count += len(part["text"])
+    return count
+
+
+def main() -> None:
+    messages = make_messages()
+    assert legacy_scan(messages) == scan(messages)
+    group_data = MemoryModel(memory=Memory(messages=list(messages)), sessions=[])
+
+    print(f"history with {MESSAGES} messages")
+    report(
+        "per-turn scan",
+        bench(lambda: legacy_scan(messages)),
+        bench(lambda: scan(messages)),
+    )
+    report(
+        'Group_Data["enable"]',
+        bench(lambda: legacy_getitem(group_data, "enable")),
+        bench(lambda: group_data["enable"], number=100000),
+    )
+
+
+if __name__ == "__main__":
+    main()
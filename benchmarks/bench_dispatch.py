@@ -0,0 +1,101 @@
+"""Suggar匹配器调度基准测试（50个已注册的处理器）
+
+对比逐次排序、解析签名、深拷贝关键字参数的旧调度方式与预编译调度计划。
+"""
+
+import asyncio
+import inspect
+from copy import deepcopy
+from typing import Any
+
+from _bootstrap import bench, init_plugin, report
+from nonebot import logger
+
+init_plugin()
+
+from nonebot_plugin_suggarchat.event import SuggarEvent
+from nonebot_plugin_suggarchat.matcher import EventRegistry, MatcherManager
+from nonebot_plugin_suggarchat.on_event import on_event
+
+EVENT_TYPE = "bench_dispatch"
+HANDLERS = 50
+
+
+class BenchEvent(SuggarEvent):
+    def get_event_type(self) -> str:
+        return EVENT_TYPE
+
+
+def register_handlers() -> None:
+    for index in range(HANDLERS):
+        matcher = on_event(event_type=EVENT_TYPE, priority=index % 5 + 1, block=False)
+
+        async def handler(event: BenchEvent, value: int) -> None:
+            event.model_response = str(value)
+
+        matcher.handle()(handler)
+
+
+async def legacy_trigger(*args: Any, **kwargs: Any) -> None:
+    """旧的调度方式：每次触发都重新排序处理器并解析签名（日志调用与旧实现一致）"""
+    event = next(i for i in args if isinstance(i, SuggarEvent))
+    event_type = event.get_event_type()
+    logger.info(f"正在为事件: {event_type} 运行matcher!")
+    handlers = sorted(
+        EventRegistry().get_handlers(event_type), key=lambda x: x.priority
+    )
+    priority_tmp = 0
+    for matcher in handlers:
+        if matcher.priority != priority_tmp:
+            priority_tmp = matcher.priority
+            logger.info(f"为优先级 {priority_tmp} 运行Matcher......")
+        session_args = [matcher.matcher, *args]
+        session_kwargs = {**deepcopy(kwargs)}
+        args_types = {k: v.annotation for k, v in matcher.signature.parameters.items()}
+        filtered = {k: v for k, v in args_types.items() if v is not inspect._empty}
+        if args_types != filtered:
+            continue
+        new_args = []
+        used: set[int] = set()
+        for param_type in filtered.values():
+            for i, arg in enumerate(session_args):
+                if i not in used and isinstance(arg, param_type):
+                    new_args.append(arg)
+                    used.add(i)
+                    break
+        f_kwargs = {
+            name: session_kwargs[param.annotation]
+            for name, param in matcher.signature.parameters.items()
+            if param.annotation in session_kwargs
+        }
+        if len(new_args) != len(filtered):
+            continue
+        try:
+            logger.info(f"开始运行Matcher: '{matcher.function.__name__}'")
+            await matcher.function(*new_args, **f_kwargs)
+        finally:
+            logger.info(f"处理器 {matcher.function.__name__} 已结束")
+            if matcher.block:
+                break
+
+
+def main() -> None:
+    register_handlers()
+    event = BenchEvent("", None, 0, [])  # type: ignore[arg-type]
+    loop = asyncio.new_event_loop()
+
+    def run_legacy() -> None:
+        loop.run_until_complete(legacy_trigger(event, 1))
+
+    def run_compiled() -> None:
+        loop.run_until_complete(MatcherManager.trigger_event(event, 1))
+
+    print(f"dispatch with {HANDLERS} handlers")
+    report(
+        "trigger_event", bench(run_legacy, number=200), bench(run_compiled, number=200)
+    )
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
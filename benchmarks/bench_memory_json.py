@@ -0,0 +1,108 @@
+"""记忆列序列化基准测试（50条消息的对话历史）
+
+对比旧的 `model_dump()` + JSON列 + 逐条按role校验的读写方式与PydanticJSON列的往返耗时，
+以及两者写入数据库的文本大小。
+"""
+
+import json
+
+from _bootstrap import bench, init_plugin, report
+
+init_plugin()
+
+from sqlalchemy.dialects import sqlite
+
+from nonebot_plugin_suggarchat.utils.models import (
+    Function,
+    MemoryModel,
+    Message,
+    PydanticJSON,
+    ToolCall,
+    ToolResult,
+)
+
+MESSAGES = 50
+
+
+def make_memory() -> MemoryModel:
+    messages: list[Message | ToolResult] = []
+    while len(messages) < MESSAGES:
+        index = len(messages)
+        messages.append(
+            Message(role="user", content=f"第{index}条消息：今天天气怎么样？" * 3)
+        )
+        messages.append(
+            Message(
+                role="assistant",
+                content="",
+                tool_calls=[
+                    ToolCall(
+                        id=f"call_{index}",
+                        function=Function(name="weather", arguments='{"city": "上海"}'),
+                    )
+                ],
+            )
+        )
+        messages.append(
+            ToolResult(
+                name="weather",
+                content="上海：晴，气温二十五度，东南风三级",
+                tool_call_id=f"call_{index}",
+            )
+        )
+        messages.append(
+            Message(role="assistant", content="今天上海天气晴朗，适合出门走走。" * 2)
+        )
+    return MemoryModel(messages=messages[:MESSAGES], summary="之前聊过周末的安排")
+
+
+def legacy_dump(memory: MemoryModel) -> str:
+    """旧的写入方式：model_dump() 后由JSON列序列化"""
+    return json.dumps(memory.model_dump())
+
+
+def legacy_load(text: str) -> MemoryModel:
+    """旧的读取方式：JSON列解析后逐条按role校验"""
+    memory_data = json.loads(text)
+    return MemoryModel(
+        messages=[
+            (
+                Message.model_validate(i)
+                if i["role"] != "tool"
+                else ToolResult.model_validate(i)
+            )
+            for i in memory_data["messages"]
+        ],
+        time=memory_data["time"],
+        summary=memory_data.get("summary", ""),
+    )
+
+
+def main() -> None:
+    memory = make_memory()
+    column = PydanticJSON(MemoryModel)
+    dialect = sqlite.dialect()
+    bind = column.bind_processor(dialect)
+    result = column.result_processor(dialect, None)
+
+    legacy_text = legacy_dump(memory)
+    text = bind(memory)
+    assert text is not None
+    assert legacy_load(legacy_text) == result(text) == memory
+
+    print(f"memory with {MESSAGES} messages")
+    report(
+        "round trip",
+        bench(lambda: legacy_load(legacy_dump(memory))),
+        bench(lambda: result(bind(memory))),
+    )
+    report(
+        "stored size",
+        len(legacy_text.encode("utf-8")) / 1024,
+        len(text.encode("utf-8")) / 1024,
+        "KiB",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""请求消息转换基准测试（50条消息的对话历史）
+
+对比每次尝试预设都逐条 `model_dump()` 的旧方式与 `dump_messages()` 只转换一次，
+计时范围为从数据库中的JSON文本到API请求使用的dict列表。
+"""
+
+import json
+
+from _bootstrap import bench, init_plugin, report
+
+init_plugin()
+
+from bench_memory_json import MESSAGES, make_memory
+
+from nonebot_plugin_suggarchat.utils.models import MemoryModel, dump_messages
+
+_validator = MemoryModel.__pydantic_validator__
+
+
+def legacy_turn(text: str, attempts: int) -> None:
+    memory = _validator.validate_python(json.loads(text))
+    for _ in range(attempts):
+        [i.model_dump() for i in memory.messages]
+
+
+def turn(text: str) -> None:
+    # 请求消息只转换一次，之后的每次预设尝试复用同一份结果
+    memory = _validator.validate_python(json.loads(text))
+    dump_messages(memory.messages)
+
+
+def main() -> None:
+    memory = make_memory()
+    text = memory.model_dump_json()
+    assert dump_messages(memory.messages) == [i.model_dump() for i in memory.messages]
+
+    print(f"memory with {MESSAGES} messages")
+    for attempts in (1, 2):
+        report(
+            f"{attempts} preset attempt(s)",
+            bench(lambda: legacy_turn(text, attempts)),
+            bench(lambda: turn(text)),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""发送消息组装基准测试（50条消息的多模态对话历史）
+
+对比旧的 `copy.deepcopy` 复制历史消息、启用匹配器时的 `copy_messages()` 副本，
+以及未启用匹配器时直接共享会话记忆中的消息，输出tracemalloc统计的分配与耗时。
+"""
+
+import copy
+import tracemalloc
+from collections.abc import Callable
+
+from _bootstrap import bench, init_plugin, report
+
+init_plugin()
+
+from bench_dict_access import MESSAGES, make_messages
+
+from nonebot_plugin_suggarchat.utils.models import (
+    Message,
+    ToolResult,
+    copy_messages,
+    dump_messages,
+)
+
+
+def allocations(func: Callable[[], object]) -> tuple[int, float]:
+    """返回调用期间新分配的内存块数与峰值（KiB）"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(
+        max(0, stat.count_diff) for stat in after.compare_to(before, "filename")
+    )
+    del result
+    return blocks, peak / 1024
+
+
+def main() -> None:
+    history: list[Message | ToolResult] = list(make_messages())
+    system = Message(role="system", content="system prompt")
+
+    def legacy() -> list[Message | ToolResult]:
+        return [system, *copy.deepcopy(history)]
+
+    def copied() -> list[Message | ToolResult]:
+        return [system, *copy_messages(history)]
+
+    def shared() -> list[Message | ToolResult]:
+        return [system, *history]
+
+    assert dump_messages(legacy()) == dump_messages(copied()) == dump_messages(shared())
+
+    print(f"history with {MESSAGES} messages")
+    legacy_blocks, legacy_peak = allocations(legacy)
+    legacy_time = bench(legacy, number=200)
+    for name, func in (("copy_messages", copied), ("shared", shared)):
+        blocks, peak = allocations(func)
+        report(f"allocated blocks ({name})", legacy_blocks, blocks, "blocks")
+        report(f"peak ({name})", legacy_peak, peak, "KiB")
+        report(f"time ({name})", legacy_time, bench(func, number=200))
+
+
+if __name__ == "__main__":
+    main()
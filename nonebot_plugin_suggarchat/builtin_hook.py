@@ -3,7 +3,6 @@ import os
 import random
 import typing
 from collections.abc import Awaitable, Callable
-from copy import deepcopy
 from typing import Any, TypeAlias
 
 from nonebot import get_bot
@@ -24,11 +23,12 @@ from .utils.libchat import (
     tools_caller,
 )
 from .utils.llm_tools.builtin_tools import (
+    READ_TOOL_OUTPUT_TOOL,
     REASONING_TOOL,
     REPORT_TOOL,
     STOP_TOOL,
-    report,
 )
+from .utils.llm_tools.context import AgentContext
 from .utils.llm_tools.manager import ToolsManager
 from .utils.llm_tools.models import ToolContext
 from .utils.memory import (
@@ -36,6 +36,12 @@ from .utils.memory import (
     ToolResult,
     get_memory_data,
 )
+from .utils.moderation import (
+    enforce_verdict,
+    is_cacheable_input,
+    review,
+    start_speculative_review,
+)
 
 prehook = on_before_chat(block=False, priority=2)
 checkhook = on_before_chat(block=False, priority=1)
@@ -49,8 +55,11 @@ BUILTIN_TOOLS_NAME = {
     REPORT_TOOL.function.name,
     STOP_TOOL.function.name,
     REASONING_TOOL.function.name,
+    READ_TOOL_OUTPUT_TOOL.function.name,
 }
 
+READ_TOOL_OUTPUT_TOOL_DICT = READ_TOOL_OUTPUT_TOOL.model_dump(exclude_none=True)
+
 AGENT_PROCESS_TOOLS = (
     REASONING_TOOL,
     STOP_TOOL,
@@ -62,39 +71,22 @@ async def text_check(event: BeforeChatEvent) -> None:
     config = config_manager.config
     if not config.llm_config.tools.enable_report:
         checkhook.pass_event()
-    logger.info("正在进行内容审查......")
-    bot = get_bot()
-    tool_list = [REPORT_TOOL]
     msg = event._send_message
     if config.llm_config.tools.report_exclude_system_prompt:
         msg = msg[1:]
     if config.llm_config.tools.report_exclude_context:
         msg = msg[:-1]
-    response = await tools_caller(msg, tool_list)
     nonebot_event = typing.cast(MessageEvent, event.get_nonebot_event())
-    if tool_calls := response.tool_calls:
-        for tool_call in tool_calls:
-            function_name = tool_call.function.name
-            function_args: dict[str, Any] = json.loads(tool_call.function.arguments)
-            if function_name == REPORT_TOOL.function.name:
-                await report(
-                    nonebot_event,
-                    function_args.get("content", ""),
-                    typing.cast(Bot, bot),
-                )
-                if config_manager.config.llm_config.tools.report_then_block:
-                    data = await get_memory_data(nonebot_event)
-                    data.memory.messages = []
-                    await data.save(nonebot_event)
-                    await bot.send(
-                        nonebot_event,
-                        random.choice(config_manager.config.llm_config.block_msg),
-                    )
-                    prehook.cancel_nonebot_process()
-            else:
-                await send_to_admin(
-                    f"[LLM-Report] 检测到非传入工具调用：{function_name}，请向模型提供商反馈此问题。"
-                )
+    cacheable = is_cacheable_input(nonebot_event)
+    if config.llm_config.tools.report_speculative:
+        # 审查结果由聊天处理器在发送回复前检查
+        logger.info("正在后台进行内容审查......")
+        start_speculative_review(nonebot_event, list(msg), cacheable)
+        return
+    logger.info("正在进行内容审查......")
+    verdict = await review(msg, cacheable)
+    if await enforce_verdict(nonebot_event, typing.cast(Bot, get_bot()), verdict):
+        prehook.cancel_nonebot_process()
 
 
 @prehook.handle()
@@ -136,33 +128,54 @@ async def agent_core(event: BeforeChatEvent) -> None:
                     )
                 )
 
+    def complete_tool_results(msg_list: list, start: int, tool_calls: list) -> None:
+        """为没有返回结果的工具调用补充空结果，API要求每个工具调用都有对应的结果"""
+        answered = {
+            msg.tool_call_id for msg in msg_list[start:] if isinstance(msg, ToolResult)
+        }
+        msg_list.extend(
+            ToolResult(name=call.function.name, content="", tool_call_id=call.id)
+            for call in tool_calls
+            if call.id not in answered
+        )
+
     async def run_tools(
-        msg_list: list,
+        context: AgentContext,
         nonebot_event: MessageEvent,
-        call_count: int = 0,
         original_msg: str = "",
     ):
-        logger.debug(f"开始第{call_count + 1}轮工具调用，当前消息数: {len(msg_list)}")
-        if config_manager.config.llm_config.tools.agent_mode_enable and (
-            (
-                call_count == 0
-                and config_manager.config.llm_config.tools.agent_thought_mode
-                == "reasoning"
+        msg_list = context.messages
+        tools_config = config_manager.config.llm_config.tools
+        call_count = 0
+        while True:
+            context.begin_round()
+            logger.debug(
+                f"开始第{len(context.round_tokens) + 1}轮工具调用，当前消息数: {len(msg_list)}"
             )
-            or config_manager.config.llm_config.tools.agent_thought_mode
-            == "reasoning-required"
-        ):
-            await append_reasoning_msg(msg_list, original_msg)
+            estimated_tokens = await context.fit_budget()
+            if tools_config.agent_mode_enable and (
+                (call_count == 0 and tools_config.agent_thought_mode == "reasoning")
+                or tools_config.agent_thought_mode == "reasoning-required"
+            ):
+                await append_reasoning_msg(msg_list, original_msg)
 
-        if call_count > config_manager.config.llm_config.tools.agent_tool_call_limit:
-            await bot.send(nonebot_event, "调用工具次数过多，Agent工作已终止。")
-            return
-        response_msg = await tools_caller(
-            msg_list,
-            tools,
-        )
-        if tool_calls := response_msg.tool_calls:
+            if call_count > tools_config.agent_tool_call_limit:
+                await bot.send(nonebot_event, "调用工具次数过多，Agent工作已终止。")
+                return
+            if context.has_outputs and READ_TOOL_OUTPUT_TOOL_DICT not in tools:
+                tools.append(READ_TOOL_OUTPUT_TOOL_DICT)
+            response_msg = await tools_caller(
+                msg_list,
+                tools,
+            )
+            await context.record_round(response_msg, estimated_tokens)
+            if not (tool_calls := response_msg.tool_calls):
+                return
             result_msg_list: list[ToolResult] = []
+            # 同一轮的多个工具调用只对应一条模型消息，且必须位于所有工具结果之前
+            msg_list.append(Message.model_validate(response_msg, from_attributes=True))
+            results_start = len(msg_list)
+            reasoning_requested = False
             for tool_call in tool_calls:
                 function_name = tool_call.function.name
                 function_args: dict[str, Any] = json.loads(tool_call.function.arguments)
@@ -171,15 +184,12 @@ async def agent_core(event: BeforeChatEvent) -> None:
                 try:
                     match function_name:
                         case REASONING_TOOL.function.name:
-                            logger.debug("正在生成任务摘要与原因。")
-                            await append_reasoning_msg(
-                                msg_list,
-                                original_msg,
-                                agent_last_step[0],
-                            )
+                            # 任务摘要在本轮的工具结果全部追加后生成
+                            reasoning_requested = True
                             continue
                         case STOP_TOOL.function.name:
                             logger.debug("Agent工作已终止。")
+                            complete_tool_results(msg_list, results_start, tool_calls)
                             msg_list.append(
                                 Message(
                                     role="user",
@@ -192,20 +202,19 @@ async def agent_core(event: BeforeChatEvent) -> None:
                                 )
                             )
                             return
+                        case READ_TOOL_OUTPUT_TOOL.function.name:
+                            func_response = context.read_output(
+                                str(function_args.get("handle", "")),
+                                int(function_args.get("offset", 0)),
+                            )
                         case _:
                             if (
                                 tool_data := ToolsManager().get_tool(function_name)
                             ) is not None:
                                 if not tool_data.custom_run:
-                                    msg_list.append(
-                                        Message.model_validate(
-                                            response_msg, from_attributes=True
-                                        )
+                                    func_response: str = await ToolsManager().call_tool(
+                                        function_name, function_args
                                     )
-                                    func_response: str = await typing.cast(
-                                        Callable[[dict[str, Any]], Awaitable[str]],
-                                        tool_data.func,
-                                    )(function_args)
                                 elif (
                                     tool_response := await typing.cast(
                                         Callable[[ToolContext], Awaitable[str | None]],
@@ -221,12 +230,8 @@ async def agent_core(event: BeforeChatEvent) -> None:
                                 ) is None:
                                     continue
                                 else:
-                                    msg_list.append(
-                                        Message.model_validate(
-                                            response_msg, from_attributes=True
-                                        )
-                                    )
                                     func_response = tool_response
+                                func_response = context.offload(func_response)
                             else:
                                 logger.opt(exception=True, colors=True).error(
                                     f"ChatHook中遇到了未定义的函数：{function_name}"
@@ -237,7 +242,7 @@ async def agent_core(event: BeforeChatEvent) -> None:
                         raise
                     logger.warning(f"函数{function_name}执行失败：{e}")
                     if (
-                        config_manager.config.llm_config.tools.agent_mode_enable
+                        tools_config.agent_mode_enable
                         and function_name not in BUILTIN_TOOLS_NAME
                     ):
                         await bot.send(
@@ -253,7 +258,6 @@ async def agent_core(event: BeforeChatEvent) -> None:
                     continue
                 else:
                     logger.debug(f"函数{function_name}返回：{func_response}")
-
                     msg: ToolResult = ToolResult(
                         content=func_response,
                         name=function_name,
@@ -263,23 +267,27 @@ async def agent_core(event: BeforeChatEvent) -> None:
                     result_msg_list.append(msg)
                 finally:
                     call_count += 1
-            if config_manager.config.llm_config.tools.agent_mode_enable:
-                # 发送工具调用信息给用户
-                await bot.send(
-                    nonebot_event,
-                    f"调用了函数{''.join([f'`{i.function.name}`,' for i in tool_calls])}",
-                )
-                observation_msg = "\n".join(
-                    [f"{result.name}: {result.content}\n" for result in result_msg_list]
-                )
-                msg_list.append(
-                    Message(
-                        role="user",
-                        content=f"观察结果:\n```text\n{observation_msg}\n```"
-                        + f"\n请基于以上工具执行结果继续完成任务，如果任务已完成请使用工具 '{STOP_TOOL.function.name}' 结束。",
-                    )
+            complete_tool_results(msg_list, results_start, tool_calls)
+            if reasoning_requested:
+                logger.debug("正在生成任务摘要与原因。")
+                await append_reasoning_msg(msg_list, original_msg, agent_last_step[0])
+            if not tools_config.agent_mode_enable:
+                return
+            # 发送工具调用信息给用户
+            await bot.send(
+                nonebot_event,
+                f"调用了函数{''.join([f'`{i.function.name}`,' for i in tool_calls])}",
+            )
+            observation_msg = "\n".join(
+                [f"{result.name}: {result.content}\n" for result in result_msg_list]
+            )
+            msg_list.append(
+                Message(
+                    role="user",
+                    content=f"观察结果:\n```text\n{observation_msg}\n```"
+                    + f"\n请基于以上工具执行结果继续完成任务，如果任务已完成请使用工具 '{STOP_TOOL.function.name}' 结束。",
                 )
-                await run_tools(msg_list, nonebot_event, call_count, original_msg)
+            )
 
     config = config_manager.config
     if not config.llm_config.tools.enable_tools:
@@ -288,11 +296,14 @@ async def agent_core(event: BeforeChatEvent) -> None:
     if not isinstance(nonebot_event, MessageEvent):
         return
     bot = typing.cast(Bot, get_bot(str(nonebot_event.self_id)))
-    msg_list = [
-        *deepcopy([i for i in event.message if i["role"] == "system"]),
-        deepcopy(event.message)[-1],
-    ]
-    chat_list_backup = deepcopy(event.message.copy())
+    # 工具调用只会追加消息而不会修改已有消息，无需复制
+    context = AgentContext(
+        [
+            *(i for i in event.message if i["role"] == "system"),
+            # 缓存友好布局下末尾为携带用户变量的系统消息，用户输入为最后一条非系统消息
+            next(i for i in reversed(event.message) if i["role"] != "system"),
+        ]
+    )
     tools: list[dict[str, Any]] = []
     if config.llm_config.tools.agent_mode_enable:
         tools.append(STOP_TOOL.model_dump())
@@ -311,13 +322,13 @@ async def agent_core(event: BeforeChatEvent) -> None:
             "注意：当前工具类型仅有Agent模式过程工具，而无其他有效工具定义，这通常不是使用Agent模式的最佳实践。配置环境变量AMRITA_IGNORE_AGENT_TOOLS=true可忽略此警告。"
         )
 
+    initial_length = len(context.messages)
     try:
         await run_tools(
-            msg_list, nonebot_event, original_msg=nonebot_event.get_plaintext()
-        )
-        event._send_message.extend(
-            [msg for msg in msg_list if msg not in event._send_message]
+            context, nonebot_event, original_msg=nonebot_event.get_plaintext()
         )
+        # 上下文在成功完成后才会被追加到发送列表，失败时原数据保持不变
+        event._send_message.extend(context.messages[initial_length:])
 
     except Exception as e:
         if isinstance(e, ChatException):
@@ -325,7 +336,11 @@ async def agent_core(event: BeforeChatEvent) -> None:
         logger.opt(colors=True, exception=e).exception(
             f"ERROR\n{e!s}\n!调用Tools失败！已旧数据继续处理..."
         )
-        event._send_message = chat_list_backup
+    finally:
+        if context.round_tokens:
+            logger.debug(
+                f"Agent共进行了{len(context.round_tokens)}轮工具调用，每轮输入tokens：{context.round_tokens}"
+            )
 
 
 @posthook.handle()
@@ -344,6 +359,7 @@ async def cookie(event: ChatEvent, bot: Bot):
                 )
                 data = await get_memory_data(nonebot_event)
                 data.memory.messages = []
+                data.memory.summary = ""
                 await data.save(nonebot_event)
                 await bot.send(
                     nonebot_event,
@@ -17,6 +17,8 @@ class ChatManager:
     session_clear_user: dict[str, SessionTemp] = field(default_factory=dict)
     custom_menu: list[dict[str, str]] = field(default_factory=list)
     running_messages_poke: dict[str, Any] = field(default_factory=dict)
+    # 已禁用聊天功能的群号，为None时尚未从数据库加载
+    disabled_groups: set[int] | None = None
     menu_msg: str = "聊天功能菜单:\n" + "/聊天菜单 唤出菜单 \n"
     menu_msg += "/del_memory 丢失这个群/聊天的记忆 \n"
     menu_msg += "/enable 在群聊启用聊天 \n"
@@ -18,7 +18,7 @@ from .utils.functions import (
     synthesize_message,
 )
 from .utils.libchat import usage_enough
-from .utils.memory import Message, get_memory_data
+from .utils.memory import Message, get_memory_data, is_group_disabled
 
 nb_config = get_driver().config
 
@@ -34,15 +34,17 @@ class FakeEvent(Event):
 
 
 async def is_bot_enabled(event: Event) -> bool:
-    if not config_manager.config.enable:
+    """聊天功能是否对该事件启用
+
+    所有匹配器都使用此规则，只读取内存中的状态，不访问数据库。
+    """
+    if not config_manager.ins_config.enable:
         return False
     with contextlib.suppress(Exception):
-        bots = set(nonebot.get_bots().keys())
-        if event.get_user_id() in bots:  # 多实例下防止冲突
+        if event.get_user_id() in nonebot.get_bots():  # 多实例下防止冲突
             return False
-    if hasattr(event, "group_id"):
-        data = await get_memory_data(event)
-        return data.enable
+    if (group_id := getattr(event, "group_id", None)) is not None:
+        return not await is_group_disabled(group_id)
     return True
 
 
@@ -81,39 +83,36 @@ async def is_group_admin_if_is_in_group(event: MessageEvent, bot: Bot) -> bool:
 async def should_respond_to_message(event: MessageEvent, bot: Bot) -> bool:
     """根据配置和消息事件判断是否需要回复"""
 
-    message = event.get_message()
-    message_text = message.extract_plain_text().strip()
     if not isinstance(event, GroupMessageEvent):
         return True
 
+    config = config_manager.config
+    autoreply = config.autoreply
+    message = event.get_message()
+    message_text = message.extract_plain_text().strip()
+
     # 判断是否以关键字触发回复
-    if "at" in config_manager.config.autoreply.keywords:  # 如果配置为 at 开头
+    if "at" in autoreply.keywords:  # 如果配置为 at 开头
         if event.is_tome():  # 判断是否 @ 了机器人
             return True
-    if config_manager.config.autoreply.keywords_mode == "starts_with":
-        if message_text.startswith(
-            tuple(i for i in config_manager.config.autoreply.keywords if i != "at")
-        ):
+    if autoreply.keywords_mode == "starts_with":
+        if message_text.startswith(tuple(i for i in autoreply.keywords if i != "at")):
             return True
-    elif config_manager.config.autoreply.keywords_mode == "contains":
+    elif autoreply.keywords_mode == "contains":
         if any(
-            keyword in message_text
-            for keyword in config_manager.config.autoreply.keywords
-            if keyword != "at"
+            keyword in message_text for keyword in autoreply.keywords if keyword != "at"
         ):
             return True
 
-    # 判断是否启用了AutoReply模式
-    if config_manager.config.autoreply.enable:
+    # 判断是否启用了AutoReply模式，未启用时不需要读取记忆
+    if autoreply.enable:
         # 根据概率决定是否回复
         rand = random.random()
-        rate = config_manager.config.autoreply.probability
+        rate = autoreply.probability
 
         # 获取记忆数据
         memory_data = await get_memory_data(event)
-        if rand <= rate and (
-            config_manager.config.autoreply.global_enable or memory_data.fake_people
-        ):
+        if rand <= rate and (autoreply.global_enable or memory_data.fake_people):
             memory_data.timestamp = time.time()
             await memory_data.save(event)
             return True
@@ -146,7 +145,7 @@ async def should_respond_to_message(event: MessageEvent, bot: Bot) -> bool:
             (await bot.get_group_member_info(group_id=event.group_id, user_id=user_id))[
                 "nickname"
             ]
-            if not config_manager.config.function.use_user_nickname
+            if not config.function.use_user_nickname
             else event.sender.nickname
         )
 
@@ -164,7 +163,7 @@ async def should_respond_to_message(event: MessageEvent, bot: Bot) -> bool:
             message_l[-1].content += "\n" + content_message
         if len(
             message_l[-1].content
-        ) > config_manager.config.llm_config.memory_lenth_limit * 10 and isinstance(
+        ) > config.llm_config.memory_lenth_limit * 10 and isinstance(
             message_l[-1].content, str
         ):
             lines = message_l[-1].content.splitlines(keepends=True)
@@ -182,6 +181,14 @@ async def should_respond_to_message(event: MessageEvent, bot: Bot) -> bool:
 
 
 async def should_respond_with_usage_check(event: MessageEvent, bot: Bot) -> bool:
+    """判断是否需要回复消息并检查额度
+
+    NoneBot会并发执行同一规则中的所有检查函数，无法在检查失败时提前结束，
+    因此这里按开销从低到高依次检查：内存中的启用状态、消息是否触发回复、数据库中的额度，
+    不会回复的消息不访问数据库。
+    """
+    if not await is_bot_enabled(event):
+        return False
     if await should_respond_to_message(event, bot):
         if not await usage_enough(event) or not (
             await usage_enough(
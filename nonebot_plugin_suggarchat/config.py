@@ -3,12 +3,13 @@ import copy
 import json
 import os
 import re
-from copy import deepcopy
+from collections.abc import Iterable
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Literal
 
 import aiofiles
+import aiofiles.os
 import nonebot_plugin_localstore as store
 import tomli
 import tomli_w
@@ -16,6 +17,8 @@ from nonebot import get_driver, logger
 from pydantic import BaseModel
 from watchfiles import awatch
 
+from .utils.prompt import PromptTemplate
+
 __kernel_version__ = "unknow"
 
 # 保留为其他插件提供的引用
@@ -55,6 +58,22 @@ def replace_env_vars(
     return data_copy
 
 
+def write_if_changed(path: Path, data: str | bytes) -> bool:
+    """内容有变化时才写入文件，避免无意义的写入（及其触发的配置重载）
+
+    Returns:
+        是否写入了文件
+    """
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    try:
+        if path.read_bytes() == raw:
+            return False
+    except FileNotFoundError:
+        pass
+    path.write_bytes(raw)
+    return True
+
+
 class ExtraModelPreset(BaseModel, extra="allow"):
     def __getattr__(self, item: str) -> str:
         if item in self.__dict__:
@@ -84,9 +103,10 @@ class ModelPreset(BaseModel):
             return cls.model_validate(data)
         return cls()  # 返回默认值
 
-    def save(self, path: Path):
-        with path.open("w", encoding="u8") as f:
-            json.dump(self.model_dump(), f, indent=4, ensure_ascii=False)
+    def save(self, path: Path) -> bool:
+        return write_if_changed(
+            path, json.dumps(self.model_dump(), indent=4, ensure_ascii=False)
+        )
 
 
 class ToolsConfig(BaseModel):
@@ -97,9 +117,20 @@ class ToolsConfig(BaseModel):
     )
     report_exclude_context: bool = False  # 默认情况下，内容审查会检查系统提示和上下文。
     report_then_block: bool = True
+    report_cache_ttl: float = (
+        3600.0  # 纯文本输入的审查结果按送审消息缓存的有效期(秒)，0为不缓存
+    )
+    report_cache_size: int = 4096  # 审查结果缓存的最大条目数
+    report_speculative: bool = (
+        False  # 审查与工具调用、模型请求并行进行，发送回复前再检查审查结果
+    )
     require_tools: bool = False
     agent_mode_enable: bool = False  # 使用实验性的智能体模式
     agent_tool_call_limit: int = 10  # 智能体模式下的工具调用限制
+    agent_round_token_budget: int = (
+        8000  # 工具调用每轮请求的上下文tokens预算，超出时截断较早的工具结果(0为不限制)
+    )
+    agent_tool_output_max_chars: int = 4000  # 超出该长度的工具输出存储在上下文之外，上下文中只保留开头部分与引用(0为不限制)
     agent_thought_mode: Literal[
         "reasoning", "chat", "reasoning-required", "reasoning-optional"
     ] = (
@@ -111,6 +142,19 @@ class ToolsConfig(BaseModel):
     )
     agent_mcp_client_enable: bool = False
     agent_mcp_server_scripts: list[str] = []
+    agent_mcp_lazy_connect: bool = (
+        False  # 有可用的工具目录缓存时，在首次调用工具时才连接MCP Server
+    )
+    agent_mcp_connect_timeout: float = (
+        30.0  # 连接单个MCP Server的超时时间(秒)，0为不限制
+    )
+    tool_cache_max_entries: int = 512  # 工具结果缓存的最大条目数
+    agent_mcp_tool_cache_ttl: dict[
+        str, float
+    ] = {}  # MCP工具结果的缓存有效期(秒)，键为工具名称
+    agent_mcp_readonly_cache_ttl: float = (
+        0.0  # 声明为只读(readOnlyHint)的MCP工具的默认缓存有效期(秒)，0为不缓存
+    )
 
 
 class SessionConfig(BaseModel):
@@ -118,6 +162,16 @@ class SessionConfig(BaseModel):
     session_control_time: int = 60
     session_control_history: int = 10
     session_max_tokens: int = 5000
+    summary_enable: bool = False  # 超出记忆长度/上下文Tokens限制时，将被移出的旧消息压缩为摘要而不是直接丢弃
+    summary_preset: str = (
+        ""  # 生成摘要使用的模型预设（建议使用较便宜的模型，留空则使用当前预设）
+    )
+    summary_keep_ratio: float = (
+        0.5  # 启用摘要或缓存友好布局时，超出上限后一次性删减到的消息数/Tokens比例
+    )
+    archive_compression: Literal["none", "zlib", "zstd"] = (
+        "zlib"  # 归档会话的压缩算法，zstd需要安装 zstandard
+    )
 
 
 class AutoReplyConfig(BaseModel):
@@ -136,6 +190,10 @@ class FunctionConfig(BaseModel):
     enable_private_chat: bool = True
     allow_custom_prompt: bool = True
     use_user_nickname: bool = False  # 使用用户昵称而不是群内昵称（仅群内）
+    send_interval: float = 1.0  # 同一会话内两次发送之间的最小间隔（秒），避免触发风控
+    cancel_superseded_generation: bool = (
+        True  # 同一用户在回复生成前发送新消息时，取消尚未完成的回复生成
+    )
 
 
 class PresetSwitch(BaseModel):
@@ -197,15 +255,45 @@ class UsageLimitConfig(BaseModel):
     global_insights_expire_days: int = 7
 
 
+class PerformanceConfig(BaseModel):
+    cpu_inline_threshold: int = 2000  # 小于该字符数的CPU任务直接在事件循环中执行
+    cpu_process_threshold: int = 200000  # 大于等于该字符数的批量任务交给进程池执行
+    cpu_thread_workers: int = 4  # CPU任务线程池大小
+    cpu_process_workers: int = 0  # CPU任务进程池大小(0为禁用进程池，仅支持fork的平台可用，在多线程进程中fork可能死锁)
+    loop_lag_monitor: bool = False  # 是否启用事件循环卡顿监视
+    loop_lag_interval: float = 0.1  # 卡顿监视的心跳间隔(秒)
+    loop_lag_threshold: float = 0.2  # 事件循环阻塞超过该时长(秒)时记录日志
+
+
+class ResponseCacheConfig(BaseModel):
+    enable: bool = (
+        False  # 是否启用精确匹配的模型响应缓存（仅对声明了缓存场景的调用生效）
+    )
+    backend: Literal["memory", "sqlite"] = "memory"  # 缓存后端
+    max_entries: int = 1024  # 最大缓存条目数，超出后淘汰最久未使用的条目
+    default_ttl: float = 300.0  # 默认缓存有效期(秒)
+    ttl: dict[str, float] = {
+        "poke": 600.0,
+    }  # 各调用场景的缓存有效期(秒)，小于等于0为不缓存该场景
+
+
 class LLM_Config(BaseModel):
     tools: ToolsConfig = ToolsConfig()
     stream: bool = False
     memory_lenth_limit: int = 50
     use_base_prompt: bool = True
+    prompt_cache_layout: bool = False  # 缓存友好的提示词布局：系统提示词保持不变，用户相关变量放在末尾，以命中模型供应商的前缀缓存
     max_tokens: int = 100
     tokens_count_mode: Literal["word", "bpe", "char"] = "bpe"
     enable_tokens_limit: bool = True
     llm_timeout: int = 60
+    llm_connect_timeout: float = 10.0  # 建立连接的超时时间(秒)
+    llm_first_token_timeout: float = (
+        30.0  # 流式响应等待首个token的超时时间(秒)，0为不限制
+    )
+    llm_stream_idle_timeout: float = (
+        15.0  # 流式响应两个分块之间的最长间隔(秒)，0为不限制
+    )
     auto_retry: bool = True
     max_retries: int = 3
     block_msg: list[str] = [
@@ -271,9 +359,12 @@ class Config(BaseModel):
     llm_config: LLM_Config = LLM_Config()
     extra: ExtraConfig = ExtraConfig()
     usage_limit: UsageLimitConfig = UsageLimitConfig()
+    performance: PerformanceConfig = PerformanceConfig()
+    response_cache: ResponseCacheConfig = ResponseCacheConfig()
     enable: bool = False
     parse_segments: bool = True
     matcher_function: bool = True
+    matcher_concurrency: bool = False  # 并发运行同优先级且不阻断(block=False)的Matcher
     preset: str = "default"
     group_prompt_character: str = "default"
     private_prompt_character: str = "default"
@@ -293,8 +384,29 @@ class Config(BaseModel):
             raise ValueError("max_tokens必须大于零!")
         if self.llm_config.llm_timeout <= 0:
             raise ValueError("LLM请求超时时间必须大于零！")
+        if self.llm_config.llm_connect_timeout <= 0:
+            raise ValueError("LLM连接超时时间必须大于零！")
+        if (
+            self.llm_config.llm_first_token_timeout < 0
+            or self.llm_config.llm_stream_idle_timeout < 0
+        ):
+            raise ValueError("流式响应超时时间不能小于零！")
         if self.session.session_max_tokens <= 0:
             raise ValueError("上下文最大Tokens限制必须大于零！")
+        if not 0 < self.session.summary_keep_ratio <= 1:
+            raise ValueError("摘要压缩后保留比例必须在(0, 1]之间！")
+        if self.function.send_interval < 0:
+            raise ValueError("消息发送间隔不能小于零！")
+        if self.llm_config.tools.tool_cache_max_entries <= 0:
+            raise ValueError("工具结果缓存最大条目数必须大于零！")
+        if self.llm_config.tools.report_cache_size <= 0:
+            raise ValueError("审查结果缓存最大条目数必须大于零！")
+        if self.response_cache.max_entries <= 0:
+            raise ValueError("响应缓存最大条目数必须大于零！")
+        if self.performance.cpu_thread_workers <= 0:
+            raise ValueError("CPU任务线程池大小必须大于零！")
+        if self.performance.cpu_process_workers < 0:
+            raise ValueError("CPU任务进程池大小不能小于零！")
         if self.session.session_control:
             if self.session.session_control_history <= 0:
                 raise ValueError("会话历史最大值不能为0！")
@@ -308,10 +420,13 @@ class Config(BaseModel):
             data: dict[str, Any] = json.load(f)
         return cls.model_validate(data)
 
-    def save_to_toml(self, path: Path):
-        """保存配置到 TOML 文件"""
-        with path.open("wb") as f:
-            tomli_w.dump(self.model_dump(), f)
+    def save_to_toml(self, path: Path) -> bool:
+        """保存配置到 TOML 文件，内容未变化时不写入
+
+        Returns:
+            是否写入了文件
+        """
+        return write_if_changed(path, tomli_w.dumps(self.model_dump()))
 
 
 @dataclass
@@ -326,22 +441,14 @@ class Prompts:
     private: list[Prompt] = field(default_factory=list)
 
     def save_group(self, path: Path):
-        """保存群组提示词"""
+        """保存群组提示词（内容未变化的文件不会被写入）"""
         for prompt in self.group:
-            with (path / f"{prompt.name}.txt").open(
-                "w",
-                encoding="u8",
-            ) as f:
-                f.write(prompt.text)
+            write_if_changed(path / f"{prompt.name}.txt", prompt.text)
 
     def save_private(self, path: Path):
-        """保存私聊提示词"""
+        """保存私聊提示词（内容未变化的文件不会被写入）"""
         for prompt in self.private:
-            with (path / f"{prompt.name}.txt").open(
-                "w",
-                encoding="u8",
-            ) as f:
-                f.write(prompt.text)
+            write_if_changed(path / f"{prompt.name}.txt", prompt.text)
 
 
 @dataclass
@@ -356,9 +463,16 @@ class ConfigManager:
     custom_models_dir: Path = config_dir / "models"
     _private_train: dict[str, Any] = field(default_factory=dict)
     _group_train: dict[str, Any] = field(default_factory=dict)
+    _private_template: PromptTemplate = field(default_factory=PromptTemplate)
+    _group_template: PromptTemplate = field(default_factory=PromptTemplate)
     ins_config: Config = field(default_factory=Config)
     models: list[tuple[ModelPreset, str]] = field(default_factory=list)
     prompts: Prompts = field(default_factory=Prompts)
+    # 配置与模型预设的版本号，内容变化时递增，进程内的缓存据此失效：
+    # 审查结果缓存（配置或预设变化）、工具结果缓存（配置变化）。
+    # 提示词变化时直接重新编译模板；响应缓存的键包含提示词与预设内容，无需版本号
+    config_version: int = 0
+    presets_version: int = 0
 
     @property
     def config(self) -> Config:
@@ -385,6 +499,7 @@ class ConfigManager:
             self.ins_config.save_to_toml(self.toml_config)
 
         self.ins_config.save_to_toml(self.toml_config)
+        self.config_version += 1
         self.validate_presets()
         await self.get_all_presets(cache=False)
         await self.get_prompts(cache=False)
@@ -398,31 +513,105 @@ class ConfigManager:
 
     async def _watch_config_dir(self):
         async for changes in awatch(self.config_dir):
-            if any(path == str(self.toml_config) for _, path in changes):
+            try:
+                await self.apply_changes({path for _, path in changes})
+            except Exception as e:
+                logger.opt(exception=e, colors=True).warning("配置重载失败")
+
+    async def apply_changes(self, paths: Iterable[str | Path]):
+        """按变更的文件增量重载配置、提示词与模型预设
+
+        只重新解析发生变化的文件，内容未变化时不会更新版本号。
+        文件以当前是否存在为准（编辑器保存时可能产生先删除后创建的事件）。
+        """
+        reload_prompt = False
+        for kind, path in self._classify_changes(paths):
+            if kind == "config":
                 logger.info("检测到配置文件更改，正在重新加载配置...")
-                try:
-                    await self.reload_config()
-                except Exception as e:
-                    logger.opt(exception=e, colors=True).warning("配置文件重载失败")
-            elif any(
-                (
-                    path.startswith(str(self.group_prompts))
-                    or path.startswith(str(self.private_prompts))
+                await self.reload_config()
+                # 配置中可能切换了使用的提示词
+                reload_prompt = True
+            elif kind == "preset":
+                self._reload_preset_file(path)
+            else:
+                prompts = (
+                    self.prompts.group if kind == "group" else self.prompts.private
                 )
-                and path.endswith(".txt")
-                for _, path in changes
+                reload_prompt |= await self._reload_prompt_file(prompts, path)
+        if reload_prompt:
+            await self.load_prompt()
+
+    def _classify_changes(
+        self, paths: Iterable[str | Path]
+    ) -> list[tuple[Literal["config", "group", "private", "preset"], Path]]:
+        """筛选出需要重载的文件及其类型"""
+        dirs: dict[Path, Literal["group", "private", "preset"]] = {
+            self.group_prompts.resolve(): "group",
+            self.private_prompts.resolve(): "private",
+            self.custom_models_dir.resolve(): "preset",
+        }
+        toml_config = self.toml_config.resolve()
+        result: list[tuple[Literal["config", "group", "private", "preset"], Path]] = []
+        for path in sorted({Path(p).resolve() for p in paths}):
+            if path == toml_config:
+                if path.exists():
+                    result.append(("config", path))
+            elif (kind := dirs.get(path.parent)) is not None and path.suffix == (
+                ".json" if kind == "preset" else ".txt"
             ):
-                logger.info("检测到提示词文件更改，正在重新加载提示词...")
-                await self.get_prompts(cache=False, load_only=True)
-                await self.load_prompt()
-                logger.info("完成。")
-            elif any(
-                path.startswith(str(self.custom_models_dir)) and path.endswith(".json")
-                for _, path in changes
-            ):
-                logger.info("检测到模型预设文件更改，正在重新加载模型预设...")
-                await self.get_all_presets(cache=False)
-                logger.info("完成。")
+                result.append((kind, path))
+        return result
+
+    async def _reload_prompt_file(self, prompts: list[Prompt], path: Path) -> bool:
+        """重新读取单个提示词文件
+
+        Returns:
+            提示词是否发生变化
+        """
+        existing = next((i for i in prompts if i.name == path.stem), None)
+        if not await aiofiles.os.path.exists(path):
+            if existing is None:
+                return False
+            prompts.remove(existing)
+            if not prompts:
+                prompts.append(Prompt("", "default"))
+            logger.info(f"提示词 {path.stem} 已移除")
+        else:
+            async with aiofiles.open(str(path), encoding="utf-8") as f:
+                text = await f.read()
+            if existing is None:
+                prompts.append(Prompt(text, path.stem))
+            elif existing.text == text:
+                return False
+            else:
+                existing.text = text
+            logger.info(f"提示词 {path.stem} 已重新加载")
+        return True
+
+    def _reload_preset_file(self, path: Path):
+        """重新解析单个模型预设文件"""
+        index = next(
+            (i for i, (_, name) in enumerate(self.models) if name == path.stem), None
+        )
+        if not path.exists():
+            if index is None:
+                return
+            del self.models[index]
+            logger.info(f"模型预设 {path.stem} 已移除")
+        else:
+            try:
+                preset = self._parse_preset(path)
+            except Exception as e:
+                logger.warning(f"模型预设 {path.name} 解析失败，保留原有内容：{e!s}")
+                return
+            if index is None:
+                self.models.append((preset, path.stem))
+            elif self.models[index][0] == preset:
+                return
+            else:
+                self.models[index] = (preset, path.stem)
+            logger.info(f"模型预设 {path.stem} 已重新加载")
+        self.presets_version += 1
 
     def validate_presets(self):
         def validate_preset(path: Path):
@@ -437,19 +626,28 @@ class ConfigManager:
         for file in self.custom_models_dir.glob("*.json"):
             validate_preset(file)
 
+    @staticmethod
+    def _parse_preset(file: Path) -> ModelPreset:
+        model_data = ModelPreset.load(file).model_dump()
+        preset_data = replace_env_vars(model_data)
+        if not isinstance(preset_data, dict):
+            raise TypeError("Expected replace_env_vars to return a dict")
+        return ModelPreset.model_validate(preset_data)
+
     async def get_all_presets(self, cache: bool = False) -> list[ModelPreset]:
-        """获取模型列表"""
+        """获取模型列表
+
+        配置监视器会增量更新已加载的模型预设，一般使用缓存即可。
+        """
         if cache and self.models:
             return [model for model, _ in self.models]
-        self.models.clear()  # 清空模型列表
-
-        for file in self.custom_models_dir.glob("*.json"):
-            model_data = ModelPreset.load(file).model_dump()
-            preset_data = replace_env_vars(model_data)
-            if not isinstance(preset_data, dict):
-                raise TypeError("Expected replace_env_vars to return a dict")
-            model_preset = ModelPreset.model_validate(preset_data)
-            self.models.append((model_preset, file.stem))
+        models = [
+            (self._parse_preset(file), file.stem)
+            for file in self.custom_models_dir.glob("*.json")
+        ]
+        if models != self.models:
+            self.models[:] = models
+            self.presets_version += 1
 
         return [model for model, _ in self.models]
 
@@ -505,15 +703,25 @@ class ConfigManager:
     @property
     def private_train(self) -> dict[str, str]:
         """获取私聊提示词"""
-        return deepcopy(self._private_train)
+        return dict(self._private_train)
 
     @property
     def group_train(self) -> dict[str, str]:
         """获取群聊提示词"""
-        return deepcopy(self._group_train)
+        return dict(self._group_train)
+
+    @property
+    def private_template(self) -> PromptTemplate:
+        """获取编译后的私聊提示词模板"""
+        return self._private_template
+
+    @property
+    def group_template(self) -> PromptTemplate:
+        """获取编译后的群聊提示词模板"""
+        return self._group_template
 
     async def load_prompt(self):
-        """加载提示词，匹配预设"""
+        """加载提示词，匹配预设，并编译为提示词模板"""
         for prompt in self.prompts.group:
             if prompt.name == self.ins_config.group_prompt_character:
                 self._group_train = {"role": "system", "content": prompt.text}
@@ -543,6 +751,8 @@ class ConfigManager:
                     i for i in self.prompts.private if i.name == "default"
                 ).text,
             }
+        self._group_template = PromptTemplate(self._group_train["content"])
+        self._private_template = PromptTemplate(self._private_train["content"])
 
     async def reload(self):
         """重加载所有内容"""
@@ -550,13 +760,17 @@ class ConfigManager:
         await self.load()
 
     async def reload_config(self):
-        self.ins_config = Config.load_from_toml(self.toml_config)
+        config = Config.load_from_toml(self.toml_config)
+        if config == self.ins_config:
+            return
+        self.ins_config = config
+        self.config_version += 1
         logger.info("重载配置文件")
 
     async def save_config(self):
         """保存配置"""
-        if self.ins_config:
-            self.ins_config.save_to_toml(self.toml_config)
+        if self.ins_config and self.ins_config.save_to_toml(self.toml_config):
+            self.config_version += 1
 
     async def set_config(self, key: str, value: str):
         """
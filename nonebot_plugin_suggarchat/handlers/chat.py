@@ -3,12 +3,8 @@
 该模块实现了聊天功能的核心逻辑，包括群聊和私聊的处理、会话管理、消息处理等功能。
 """
 
-import asyncio
 import contextlib
-import copy
-import random
 import time
-import typing
 from collections.abc import AsyncGenerator
 from datetime import datetime
 from typing import Any
@@ -33,13 +29,16 @@ from ..config import config_manager
 from ..event import BeforeChatEvent, ChatEvent
 from ..exception import CancelException
 from ..matcher import MatcherManager
+from ..utils.delivery import get_delivery_queue
+from ..utils.executor import count_tokens, loop_stage
 from ..utils.functions import (
     get_current_datetime_timestamp,
     get_friend_name,
     split_message_into_chats,
     synthesize_message,
 )
-from ..utils.libchat import get_chat, get_tokens
+from ..utils.inflight import GenerationCancelled, cancel_generation, run_generation
+from ..utils.libchat import extract_text_content, get_chat, get_tokens
 from ..utils.lock import get_group_lock, get_private_lock
 from ..utils.memory import (
     Memory,
@@ -54,9 +53,17 @@ from ..utils.models import (
     InsightsModel,
     TextContent,
     UniResponseUsage,
+    copy_messages,
 )
+from ..utils.moderation import discard_review, settle_review
+from ..utils.prompt import PromptTemplate, render_system_prompt
 from ..utils.protocol import UniResponse
-from ..utils.tokenizer import hybrid_token_count
+from ..utils.summary import (
+    apply_pending_summary,
+    conversation_key,
+    schedule_summary,
+    summary_message,
+)
 
 command_prefix = get_driver().config.command_start or "/"
 
@@ -66,17 +73,31 @@ command_prefix = get_driver().config.command_start or "/"
 # =============================================================================
 
 
+def batch_eviction_enabled() -> bool:
+    """是否在超出上限后一次性删减上下文
+
+    启用摘要时可以减少生成摘要的次数；启用缓存友好布局时，上下文只会在删减时改变前缀，
+    其余轮次保持只追加，从而命中供应商的前缀缓存。
+    """
+    config = config_manager.config
+    return config.session.summary_enable or config.llm_config.prompt_cache_layout
+
+
 async def enforce_token_limit(
     data: MemoryModel,
     train: dict[str, Any],
     response: UniResponse[str, None],
+    evicted: list[Message | ToolResult] | None = None,
 ) -> UniResponseUsage[int]:
     """控制 token 数量，删除超出限制的旧消息
 
+    启用上下文摘要或缓存友好布局时，超出限制后会一次性删减到 `summary_keep_ratio` 比例以下。
+
     Args:
         data: 内存模型数据
         train: 训练数据
         response: 模型响应
+        evicted: 用于收集被删除消息的列表
 
     Returns:
         token使用情况
@@ -86,38 +107,28 @@ async def enforce_token_limit(
     tokens = await get_tokens(memory_l, response)
     if not config_manager.config.llm_config.enable_tokens_limit:
         return tokens
+    max_tokens = config_manager.config.session.session_max_tokens
     tk_tmp = tokens.total_tokens
-    while tk_tmp > config_manager.config.session.session_max_tokens:
-        try:
-            if len(data.memory.messages) > 0:
-                del data.memory.messages[0]
-            else:
-                logger.warning(
-                    f"提示词大小过大！为{hybrid_token_count(train['content'])}>{config_manager.config.session.session_max_tokens}！"
-                )
-                break
-        except Exception as e:
-            logger.opt(exception=e, colors=True).exception(
-                f"上下文限制清理出现异常！{e!s}"
-            )
+    if tk_tmp <= max_tokens:
+        return tokens
+    # 每条消息只计数一次，删除旧消息时直接扣减
+    train_tokens, *message_tokens = await count_tokens(
+        [extract_text_content(msg.content) for msg in memory_l],
+        config_manager.config.llm_config.tokens_count_mode,
+        stage="enforce_token_limit",
+    )
+    if batch_eviction_enabled():
+        max_tokens = int(max_tokens * config_manager.config.session.summary_keep_ratio)
+    while tk_tmp > max_tokens:
+        if len(data.memory.messages) > 0:
+            message = data.memory.messages.pop(0)
+            if evicted is not None:
+                evicted.append(message)
+            del message_tokens[0]
+        else:
+            logger.warning(f"提示词大小过大！为{train_tokens}>{max_tokens}！")
             break
-        tk_tmp = 0
-        for st in memory_l:
-            if isinstance(st["content"], str):
-                string_parts = st["content"]
-            else:
-                string_parts = "".join(
-                    [
-                        s.get("text")
-                        for s in st["content"]
-                        if s["type"] == "text" and s.get("text") is not None
-                    ]
-                )
-
-            tk_tmp += hybrid_token_count(
-                string_parts, config_manager.config.llm_config.tokens_count_mode
-            )
-        await asyncio.sleep(0)
+        tk_tmp = train_tokens + sum(message_tokens)
     return tokens
 
 
@@ -138,7 +149,7 @@ async def synthesize_message_to_msg(
     is_multimodal: bool = (
         any(
             [
-                (await config_manager.get_preset(preset=preset)).multimodal
+                (await config_manager.get_preset(preset=preset, cache=True)).multimodal
                 for preset in [
                     config_manager.config.preset,
                     *config_manager.config.preset_extension.backup_preset_list,
@@ -168,6 +179,62 @@ async def synthesize_message_to_msg(
     return text
 
 
+def prepare_send_messages(
+    event: MessageEvent, data: MemoryModel, template: PromptTemplate
+) -> list[Message | ToolResult]:
+    """准备发送给聊天模型的消息列表，包括系统提示词数据和上下文。
+
+    启用缓存友好布局时，系统提示词中不再代入用户相关变量与自定义提示词，
+    这些内容作为最后一条系统消息发送，使得同一会话的请求前缀在多轮之间保持一致。
+
+    启用匹配器时消息会交给事件处理器，上下文消息使用副本，处理器原地修改消息不会影响会话记忆；
+    未启用时上下文消息与会话记忆共享同一对象，不进行复制。
+
+    Args:
+        event: 消息事件
+        data: 内存模型数据
+        template: 编译后的提示词模板
+
+    Returns:
+        准备发送的消息列表
+    """
+    cache_layout = config_manager.config.llm_config.prompt_cache_layout
+    user_id, user_name = (
+        ("当前发言用户的QQ号", "当前发言用户的昵称")
+        if cache_layout
+        else (str(event.user_id), str(event.sender.nickname))
+    )
+    content = render_system_prompt(
+        template,
+        use_base_prompt=config_manager.config.llm_config.use_base_prompt,
+        cookie=config_manager.config.cookies.cookie,
+        self_id=str(event.self_id),
+        user_id=user_id,
+        user_name=user_name,
+    )
+    supplement = f"以下是一些补充内容，如果与上面任何一条有冲突请忽略。\n{data.prompt if data.prompt != '' else '无'}"
+    if not cache_layout:
+        content += f"\n{supplement}"
+    send_messages: list[Message | ToolResult] = [
+        Message(role="system", content=content)
+    ]
+    if data.memory.summary:
+        send_messages.append(summary_message(data.memory.summary))
+    send_messages.extend(
+        copy_messages(data.memory.messages)
+        if config_manager.config.matcher_function
+        else data.memory.messages
+    )
+    if cache_layout:
+        send_messages.append(
+            Message(
+                role="system",
+                content=f"当前发言用户：{event.sender.nickname}（QQ:{event.user_id}）\n{supplement}",
+            )
+        )
+    return send_messages
+
+
 # =============================================================================
 # 主聊天处理函数
 # =============================================================================
@@ -231,6 +298,7 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
 
         # 管理会话上下文
         await manage_sessions(event, data, chat_manager.session_clear_group)
+        apply_pending_summary(data, event)
 
         group_id = event.group_id
         user_id = event.user_id
@@ -265,15 +333,16 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
         if chat_manager.debug:
             logger.debug(f"当前群组提示词：\n{config_manager.group_train}")
         # 控制记忆长度和 token 限制
-        await enforce_memory_limit(data, memory_length_limit)
+        evicted = await enforce_memory_limit(data, memory_length_limit)
 
         # 准备发送给模型的消息
-        send_messages = prepare_send_messages(
-            data, copy.deepcopy(Message.model_validate(config_manager.group_train))
-        )
-        response = await process_chat(event, send_messages)
+        with loop_stage("prepare_send_messages"):
+            send_messages = prepare_send_messages(
+                event, data, config_manager.group_template
+            )
+        response = await process_chat(event, send_messages, evicted)
 
-        await send_response(event, response.content)
+        send_response(event, response.content)
 
     # -------------------------------------------------------------------------
     # 内部辅助函数 - 私聊消息处理
@@ -307,6 +376,7 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
 
         # 管理会话上下文
         await manage_sessions(event, data, chat_manager.session_clear_user)
+        apply_pending_summary(data, event)
 
         content = await synthesize_message(event.get_message(), bot)
 
@@ -328,14 +398,15 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
         if chat_manager.debug:
             logger.debug(f"当前私聊提示词：\n{config_manager.private_train}")
         # 控制记忆长度和 token 限制
-        await enforce_memory_limit(data, memory_length_limit)
+        evicted = await enforce_memory_limit(data, memory_length_limit)
 
         # 准备发送给模型的消息
-        send_messages = prepare_send_messages(
-            data, copy.deepcopy(Message.model_validate(config_manager.private_train))
-        )
-        response = await process_chat(event, send_messages)
-        await send_response(event, response.content)
+        with loop_stage("prepare_send_messages"):
+            send_messages = prepare_send_messages(
+                event, data, config_manager.private_template
+            )
+        response = await process_chat(event, send_messages, evicted)
+        send_response(event, response.content)
 
     # -------------------------------------------------------------------------
     # 内部辅助函数 - 会话管理
@@ -372,8 +443,13 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
                 if (time_now - data.timestamp) >= (
                     float(config_manager.config.session.session_control_time * 60)
                 ):
+                    await data.load_sessions()
                     data.sessions.append(
-                        Memory(messages=data.memory.messages, time=time_now)
+                        Memory(
+                            messages=data.memory.messages,
+                            time=time_now,
+                            summary=data.memory.summary,
+                        )
                     )
                     while (
                         len(data.sessions)
@@ -381,6 +457,7 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
                     ):
                         data.sessions.remove(data.sessions[0])
                     data.memory.messages = []
+                    data.memory.summary = ""
                     timestamp = data.timestamp
                     data.timestamp = time_now
                     await data.save(event, raise_err=True)
@@ -407,7 +484,9 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
 
                     del session_clear_map[session_id]
 
+                    await data.load_sessions()
                     data.memory.messages = data.sessions[-1].messages
+                    data.memory.summary = data.sessions[-1].summary
                     data.sessions.pop()
                     await matcher.send("让我们继续聊天吧～")
                     await data.save(event, raise_err=True)
@@ -474,85 +553,65 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
     # 内部辅助函数 - 记忆长度限制
     # -------------------------------------------------------------------------
 
-    async def enforce_memory_limit(data: MemoryModel, memory_length_limit: int):
+    async def enforce_memory_limit(
+        data: MemoryModel, memory_length_limit: int
+    ) -> list[Message | ToolResult]:
         """控制记忆长度，删除超出限制的旧消息，移除不支持的消息。
 
-        Args:
-            data: 内存模型数据
-            memory_length_limit: 记忆长度限制
-        """
-        is_multimodal = (
-            await config_manager.get_preset(config_manager.config.preset)
-        ).multimodal
-        # Process multimodal messages when needed
-        for message in data.memory.messages:
-            if (
-                isinstance(message.content, list)
-                and not is_multimodal
-                and message.role in ("user", "assistant")
-            ):
-                message_text = ""
-                for content_part in message.content:
-                    # if isinstance(content_part)
-                    if content_part["type"] == "text":
-                        message_text += content_part["text"]
-                message.content = message_text
-
-        # Enforce memory length limit
-        while len(data.memory.messages) > 0:
-            if (
-                len(data.memory.messages) > memory_length_limit
-                or data.memory.messages[0].role != "user"
-            ):
-                del data.memory.messages[0]
-            else:
-                break
-
-    # -------------------------------------------------------------------------
-    # 内部辅助函数 - 准备发送消息
-    # -------------------------------------------------------------------------
-
-    def prepare_send_messages(data: MemoryModel, train: Message[str]) -> list:
-        """准备发送给聊天模型的消息列表，包括系统提示词数据和上下文。
+        启用上下文摘要或缓存友好布局时，超出限制后会一次性删减到 `summary_keep_ratio` 比例的长度。
 
         Args:
             data: 内存模型数据
-            train: 训练数据
+            memory_length_limit: 记忆长度限制
 
         Returns:
-            准备发送的消息列表
+            被删除的消息
         """
-        train = copy.deepcopy(train)
-        train.content = typing.cast(str, train.content)
-        if config_manager.config.llm_config.use_base_prompt:
-            train.content = (
-                "你在纯文本环境工作，不允许使用MarkDown回复，我会提供聊天记录，你可以从这里面获取一些关键信息，比如时间与用户身份（e.g.: [管理员/群主/自己/群员][YYYY-MM-DD weekday hh:mm:ss AM/PM][昵称（QQ号）]说:<内容>），但是请不要以这个格式回复。对于消息上报我给你的有几个类型，除了文本还有,\\（戳一戳消息）\\：就是QQ的戳一戳消息是戳一戳了你，而不是我，请参与讨论。交流时不同话题尽量不使用相似句式回复，用户与你交谈的信息在<内容>。\n"
-                + (
-                    train.content.replace(
-                        "{cookie}", config_manager.config.cookies.cookie
-                    )
-                    .replace("{self_id}", str(event.self_id))
-                    .replace("{user_id}", str(event.user_id))
-                    .replace("{user_name}", str(event.sender.nickname))
+        is_multimodal = (
+            await config_manager.get_preset(config_manager.config.preset, cache=True)
+        ).multimodal
+        with loop_stage("enforce_memory_limit"):
+            # Process multimodal messages when needed
+            for message in data.memory.messages:
+                if (
+                    isinstance(message.content, list)
+                    and not is_multimodal
+                    and message.role in ("user", "assistant")
+                ):
+                    message.content = extract_text_content(message.content)
+
+            # Enforce memory length limit
+            messages = data.memory.messages
+            if batch_eviction_enabled() and len(messages) > memory_length_limit:
+                memory_length_limit = max(
+                    1,
+                    int(
+                        memory_length_limit
+                        * config_manager.config.session.summary_keep_ratio
+                    ),
                 )
-            )
-        train.content += f"\n以下是一些补充内容，如果与上面任何一条有冲突请忽略。\n{data.prompt if data.prompt != '' else '无'}"
-        send_messages = copy.deepcopy(data.memory.messages)
-        send_messages.insert(0, Message.model_validate(train))
-        return send_messages
+            cut = max(0, len(messages) - memory_length_limit)
+            while cut < len(messages) and messages[cut].role != "user":
+                cut += 1
+            evicted = messages[:cut]
+            del messages[:cut]
+            return evicted
 
     # -------------------------------------------------------------------------
     # 内部辅助函数 - 处理聊天
     # -------------------------------------------------------------------------
 
     async def process_chat(
-        event: MessageEvent, send_messages: list[Message | ToolResult]
+        event: MessageEvent,
+        send_messages: list[Message | ToolResult],
+        evicted: list[Message | ToolResult],
     ) -> UniResponse[str, None]:
         """调用聊天模型生成回复，并触发相关事件。
 
         Args:
             event: 消息事件
             send_messages: 发送消息列表
+            evicted: 本轮被移出上下文的消息，将在后台压缩进会话摘要
 
         Returns:
             模型响应
@@ -567,7 +626,17 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
             await MatcherManager.trigger_event(chat_event, event, bot)
             send_messages = chat_event.get_send_message()
 
-        response = await get_chat(send_messages)
+        try:
+            response = await run_generation(
+                event, data, send_messages, get_chat(send_messages)
+            )
+        except GenerationCancelled as e:
+            if e.keep_turn:
+                # 被取代的用户消息已随记忆数据保存，被移出上下文的消息照常压缩进摘要
+                schedule_summary(event, evicted)
+            raise
+        if await settle_review(event, bot):
+            raise CancelException()
 
         if config_manager.config.matcher_function:
             chat_event = ChatEvent(
@@ -579,8 +648,9 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
             await MatcherManager.trigger_event(chat_event, event, bot)
 
         tokens = await enforce_token_limit(
-            data, copy.deepcopy(config_manager.group_train), response
+            data, config_manager.group_train, response, evicted
         )
+        schedule_summary(event, evicted)
         # 记录模型回复
         data.memory.messages.append(
             Message(
@@ -589,12 +659,14 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
             )
         )
 
-        insights = await InsightsModel.get()
+        insights = await InsightsModel.load()
 
         # 写入全局统计
         insights.usage_count += 1
         insights.token_output += tokens.completion_tokens
         insights.token_input += tokens.prompt_tokens
+        insights.token_cached += tokens.cached_tokens
+        insights.token_reasoning += tokens.reasoning_tokens
         await insights.save()
 
         # 写入记忆数据
@@ -625,23 +697,38 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
     # 内部辅助函数 - 发送响应
     # -------------------------------------------------------------------------
 
-    async def send_response(event: MessageEvent, response: str):
-        """发送聊天模型的回复，根据配置选择不同的发送方式。
+    def send_response(event: MessageEvent, response: str):
+        """将聊天模型的回复提交到会话投递队列，根据配置选择不同的发送方式。
+
+        投递在会话锁之外进行，拟人化的分段停顿不会阻塞该会话的下一轮对话；
+        发送失败时交由 `handle_exception` 处理。
 
         Args:
             event: 消息事件
             response: 模型响应内容
         """
+        is_group = isinstance(event, GroupMessageEvent)
+        queue = get_delivery_queue(
+            event.group_id if is_group else event.user_id, is_group
+        )
         if not config_manager.config.function.nature_chat_style:
-            await matcher.send(
-                MessageSegment.reply(event.message_id) + MessageSegment.text(response)
+            queue.submit(
+                bot,
+                event,
+                [
+                    MessageSegment.reply(event.message_id)
+                    + MessageSegment.text(response)
+                ],
+                paced=False,
+                on_error=handle_exception,
             )
         elif response_list := split_message_into_chats(response):
-            for message in response_list:
-                await matcher.send(MessageSegment.text(message))
-                await asyncio.sleep(
-                    random.randint(1, 3) + (len(message) // random.randint(80, 100))
-                )
+            queue.submit(
+                bot,
+                event,
+                [MessageSegment.text(message) for message in response_list],
+                on_error=handle_exception,
+            )
 
     # -------------------------------------------------------------------------
     # 内部辅助函数 - 异常处理
@@ -670,16 +757,29 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
     ):
         matcher.skip()
 
+    if config_manager.config.function.cancel_superseded_generation and isinstance(
+        event, GroupMessageEvent | PrivateMessageEvent
+    ):
+        cancel_generation(
+            *conversation_key(event),
+            "已被同一用户的新消息取代",
+            user_id=event.user_id,
+            delivery=False,
+            keep_turn=True,
+        )
+
     try:
-        data = await get_memory_data(event)
+        # 记忆数据在会话锁内读取，被取代的调用在释放锁前已保存了其用户消息与用量
         if isinstance(event, GroupMessageEvent):
             async with get_group_lock(event.group_id):
+                data = await get_memory_data(event)
                 await handle_group_message(
                     event, matcher, bot, data, memory_length_limit, Date
                 )
 
         elif isinstance(event, PrivateMessageEvent):
             async with get_private_lock(event.user_id):
+                data = await get_memory_data(event)
                 await handle_private_message(
                     event, matcher, bot, data, memory_length_limit, Date
                 )
@@ -692,3 +792,5 @@ async def chat(event: MessageEvent, matcher: Matcher, bot: Bot):
         return
     except Exception as e:
         await handle_exception(e)
+    finally:
+        discard_review(event)
@@ -3,16 +3,25 @@ from nonebot.adapters.onebot.v11 import Bot, MessageEvent
 from nonebot.matcher import Matcher
 
 from ..check_rule import is_group_admin_if_is_in_group
+from ..utils.inflight import cancel_generation
+from ..utils.lock import get_group_lock, get_private_lock
 from ..utils.memory import get_memory_data
+from ..utils.summary import conversation_key, discard_summary
 
 
 async def del_memory(bot: Bot, event: MessageEvent, matcher: Matcher):
     """处理删除记忆的指令"""
     if not await is_group_admin_if_is_in_group(event, bot):
         return
-    data = await get_memory_data(event)
-    data.memory.messages.clear()
-    await data.save(event)
+    ins_id, is_group = conversation_key(event)
+    cancel_generation(ins_id, is_group, "上下文已清除")
+    # 等待被取消的调用在会话锁内记录完用量后再清除，避免覆盖其写入的数据
+    async with (get_group_lock if is_group else get_private_lock)(ins_id):
+        data = await get_memory_data(event)
+        data.memory.messages.clear()
+        data.memory.summary = ""
+        discard_summary(event)
+        await data.save(event)
     await matcher.send("上下文已清除")
     logger.info(
         f"{event.get_event_name()}:{getattr(event, 'group_id') if hasattr(event, 'group_id') else event.user_id} 的记忆已清除"
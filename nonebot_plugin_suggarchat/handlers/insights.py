@@ -9,8 +9,10 @@ from nonebot.params import CommandArg
 
 from ..check_rule import is_bot_admin
 from ..config import config_manager
+from ..utils.libchat import preset_stats
 from ..utils.memory import get_memory_data
 from ..utils.models import InsightsModel
+from ..utils.response_cache import response_cache
 
 
 async def insights(event: MessageEvent, matcher: Matcher, args: Message = CommandArg()):
@@ -41,14 +43,33 @@ async def insights(event: MessageEvent, matcher: Matcher, args: Message = Comman
     elif arg == "global":
         if not is_bot_admin(event):
             await matcher.finish("你没有权限查看全局数据")
-        data = await InsightsModel.get()
+        data = await InsightsModel.load()
         msg = (
             f"今日全局数据：\n输入token使用量：{data.token_input}token"
             + f"\n输出token使用量：{data.token_output}token"
             + f"\n总使用次数：{data.usage_count}次"
             + f"\n总使用token为：{data.token_input + data.token_output}tokens"
             + f"\n(I: {data.token_input}tokens, O: {data.token_output}tokens)"
+            + f"\n输入缓存命中：{data.token_cached}token（命中率：{data.token_cached / data.token_input if data.token_input else 0:.2%}）"
+            + f"\n输出中的思考：{data.token_reasoning}token"
         )
+        if response_cache.stats:
+            msg += "\n响应缓存：" + "".join(
+                f"\n  {scope}：命中{stats.hits}次，未命中{stats.misses}次（命中率：{stats.hit_rate:.2%}）"
+                for scope, stats in response_cache.stats.items()
+            )
+        if preset_stats:
+            msg += "\n预设调用：" + "".join(
+                f"\n  {name}：成功{stats.successes}次，失败{stats.total_failures}次"
+                + (
+                    "（"
+                    + "，".join(f"{k}×{v}" for k, v in stats.failures.items())
+                    + "）"
+                    if stats.failures
+                    else ""
+                )
+                for name, stats in preset_stats.items()
+            )
 
     await matcher.finish(
         MessageSegment.at(event.user_id) + MessageSegment.text(f"\n{msg}")
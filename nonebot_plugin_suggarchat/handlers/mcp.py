@@ -12,6 +12,7 @@ from nonebot.params import CommandArg
 from ..builtin_hook import ChatException
 from ..config import config_manager
 from ..send import send_forward_msg
+from ..utils.llm_tools.manager import ToolsManager
 from ..utils.llm_tools.mcp_client import ClientManager
 
 
@@ -43,6 +44,11 @@ async def mcp_status(bot: Bot, matcher: Matcher, event: MessageEvent, arg: list[
     mcp_server_counts = len(ClientManager().clients)
     tools_mapping_count = len(ClientManager().tools_remapping)
     std_txt = f"MCP状态统计\nMCP Servers: {mcp_server_counts}\nMCP Tools: {tools_count}\nMCP Tools(Mapped): {tools_mapping_count}"
+    if cache_stats := ToolsManager.cache_stats:
+        std_txt += "\n工具结果缓存：" + "".join(
+            f"\n - {name}: {stats.hits}/{stats.hits + stats.misses} ({stats.hit_rate:.2%})"
+            for name, stats in cache_stats.items()
+        )
     if arg_text in ("-d", "--detail", "--details"):
         if not isinstance(event, PrivateMessageEvent):
             await matcher.finish("-d只允许在私聊执行来避免安全问题")
@@ -1,5 +1,3 @@
-import asyncio
-import random
 import sys
 import traceback
 
@@ -13,6 +11,7 @@ from ..config import config_manager
 from ..event import BeforePokeEvent, PokeEvent  # 自定义事件类型
 from ..matcher import MatcherManager  # 自定义匹配器
 from ..utils.admin import send_to_admin
+from ..utils.delivery import get_delivery_queue
 from ..utils.functions import (
     get_friend_name,
     split_message_into_chats,
@@ -21,9 +20,25 @@ from ..utils.libchat import get_chat, get_tokens, usage_enough
 from ..utils.lock import get_group_lock, get_private_lock
 from ..utils.memory import Message, get_memory_data
 from ..utils.models import InsightsModel
+from ..utils.prompt import PromptTemplate, render_system_prompt
 from .chat import FakeEvent
 
 
+def poke_system_prompt(
+    template: PromptTemplate, event: PokeNotifyEvent, user_name: str
+) -> str:
+    """使用提示词模板生成戳一戳的系统提示词"""
+    config = config_manager.config
+    return render_system_prompt(
+        template,
+        use_base_prompt=config.llm_config.use_base_prompt,
+        cookie=config.cookies.cookie,
+        self_id=str(event.self_id),
+        user_id=str(event.user_id),
+        user_name=user_name,
+    )
+
+
 async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
     """处理戳一戳事件"""
 
@@ -59,7 +74,12 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
 
         # 构造发送的消息
         send_messages = [
-            Message(role="system", content=f"{config_manager.group_train}"),
+            Message(
+                role="system",
+                content=poke_system_prompt(
+                    config_manager.group_template, event, user_name
+                ),
+            ),
             Message(
                 role="user",
                 content=f"\\（戳一戳消息\\){user_name} (QQ:{event.user_id}) 戳了戳你",
@@ -76,9 +96,11 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
 
         # 根据配置决定消息发送方式
         if not config_manager.config.function.nature_chat_style:
-            await matcher.send(message)
+            get_delivery_queue(event.group_id, True).submit(
+                bot, event, [message], paced=False, on_error=handle_delivery_exception
+            )
         else:
-            await send_split_messages(response, event.user_id)
+            send_split_messages(response, event.user_id)
 
     async def handle_private_poke(event: PokeNotifyEvent, bot: Bot):
         """处理私聊中的戳一戳事件"""
@@ -91,7 +113,12 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
 
         name = await get_friend_name(event.user_id, bot)  # 获取好友信息
         send_messages = [
-            Message(role="system", content=f"{config_manager.group_train}"),
+            Message(
+                role="system",
+                content=poke_system_prompt(
+                    config_manager.private_template, event, name
+                ),
+            ),
             Message(
                 role="user",
                 content=f"\\（戳一戳消息\\){name} (QQ:{event.user_id}) 戳了戳你",
@@ -101,9 +128,15 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
         # 处理戳一戳事件并获取回复
         response = await process_poke_event(event, send_messages)
         if not config_manager.config.function.nature_chat_style:
-            await matcher.send(MessageSegment.text(response))
+            get_delivery_queue(event.user_id, False).submit(
+                bot,
+                event,
+                [MessageSegment.text(response)],
+                paced=False,
+                on_error=handle_delivery_exception,
+            )
         else:
-            await send_split_messages(response, event.user_id)
+            send_split_messages(response, event.user_id)
 
     async def process_poke_event(event: PokeNotifyEvent, send_messages: list) -> str:
         """处理戳一戳事件的核心逻辑"""
@@ -120,17 +153,19 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
             send_messages = poke_event.get_send_message()
 
         # 获取聊天模型的回复
-        response = await get_chat(send_messages)
+        response = await get_chat(send_messages, cache_scope="poke")
         tokens = await get_tokens(
             [Message.model_validate(i) for i in send_messages], response
         )
         input_tokens = tokens.prompt_tokens
         output_tokens = tokens.completion_tokens
-        insights = await InsightsModel.get()
+        insights = await InsightsModel.load()
 
         insights.usage_count += 1
         insights.token_output += output_tokens
         insights.token_input += input_tokens
+        insights.token_cached += tokens.cached_tokens
+        insights.token_reasoning += tokens.reasoning_tokens
         for d, ev in (
             (
                 (data, event),
@@ -170,20 +205,23 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
 
         return response.content
 
-    async def send_split_messages(response: str, user_id: int):
-        """发送分段消息"""
+    def send_split_messages(response: str, user_id: int):
+        """将分段消息提交到会话投递队列，在会话锁之外逐条发送"""
         if response_list := split_message_into_chats(response):  # 将消息分段
             first_message = (
                 MessageSegment.at(user_id) + MessageSegment.text(" ") + response_list[0]
             )
-            await matcher.send(first_message)
-
-            # 逐条发送分段消息
-            for message in response_list[1:]:
-                await matcher.send(message)
-                await asyncio.sleep(
-                    random.randint(1, 3) + len(message) // random.randint(80, 100)
-                )
+            queue = (
+                get_delivery_queue(event.group_id, True)
+                if event.group_id is not None
+                else get_delivery_queue(user_id, False)
+            )
+            queue.submit(
+                bot,
+                event,
+                [first_message, *response_list[1:]],
+                on_error=handle_delivery_exception,
+            )
 
     async def handle_poke_exception():
         """处理戳一戳事件中的异常"""
@@ -199,6 +237,10 @@ async def poke_event(event: PokeNotifyEvent, bot: Bot, matcher: Matcher):
             f"Detailed exception info:\n{''.join(traceback.format_exception(exc_type, exc_value, exc_traceback))}"
         )
 
+    async def handle_delivery_exception(e: BaseException):
+        """处理回复投递中的异常"""
+        await handle_poke_exception()
+
     # 主逻辑入口
     if (
         not config_manager.config.enable
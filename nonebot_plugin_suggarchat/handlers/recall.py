@@ -5,10 +5,15 @@ from nonebot.adapters.onebot.v11.event import GroupRecallNoticeEvent
 from nonebot.matcher import Matcher
 
 from ..config import config_manager
+from ..utils.inflight import cancel_generation
 
 
 async def recall(bot: Bot, event: GroupRecallNoticeEvent, matcher: Matcher):
     """处理消息撤回事件"""
+    # 撤回了触发回复的消息时，取消尚未完成的回复
+    cancel_generation(
+        event.group_id, True, "触发回复的消息已被撤回", message_id=event.message_id
+    )
     # 随机决定是否响应，降低触发频率
     if random.randint(1, 3) != 2:
         return
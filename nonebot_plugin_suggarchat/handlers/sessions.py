@@ -35,9 +35,9 @@ async def sessions(
         """将当前会话覆盖为指定编号的会话"""
         try:
             if len(arg_list) >= 2:
-                data.memory.messages = deepcopy(
-                    data.sessions[int(arg_list[1])].messages
-                )
+                session = data.sessions[int(arg_list[1])]
+                data.memory.messages = deepcopy(session.messages)
+                data.memory.summary = session.summary
                 data.timestamp = time.time()
                 await data.save(event)
                 await matcher.send("完成记忆覆盖。")
@@ -68,9 +68,14 @@ async def sessions(
         try:
             if data.memory.messages:
                 data.sessions.append(
-                    Memory(messages=data.memory.messages, time=time.time())
+                    Memory(
+                        messages=data.memory.messages,
+                        time=time.time(),
+                        summary=data.memory.summary,
+                    )
                 )
                 data.memory.messages = []
+                data.memory.summary = ""
                 data.timestamp = time.time()
                 await data.save(event)
                 await matcher.finish("当前会话已归档。")
@@ -99,6 +104,7 @@ async def sessions(
 
     # 获取当前用户的会话数据
     data = await get_memory_data(event)
+    await data.load_sessions()
 
     # 解析用户输入的命令参数
     arg_list = args.extract_plain_text().strip().split()
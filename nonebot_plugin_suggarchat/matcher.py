@@ -1,6 +1,8 @@
+import asyncio
+import copy
 import inspect
 from collections.abc import Awaitable, Callable
-from copy import deepcopy
+from dataclasses import dataclass, field
 from types import FrameType
 from typing import Any, ClassVar
 
@@ -14,6 +16,7 @@ from nonebot.exception import (
 from pydantic import BaseModel, Field
 from typing_extensions import Self
 
+from .config import config_manager
 from .event import SuggarEvent
 from .exception import BlockException, CancelException, PassException
 
@@ -31,9 +34,81 @@ class FunctionData(BaseModel, arbitrary_types_allowed=True):
     matcher: Any = Field(...)
 
 
+@dataclass
+class HandlerPlan:
+    """预编译的处理器调度信息，在注册后首次触发时编译一次"""
+
+    data: FunctionData
+    param_types: tuple[Any, ...]  # 按参数顺序排列的类型注解
+    kw_slots: tuple[tuple[str, Any], ...]  # (参数名, 类型注解)
+    file_name: str
+    line_number: int
+    _slots_cache: dict[tuple[type, ...], tuple[int, ...] | None] = field(
+        default_factory=dict
+    )
+
+    @classmethod
+    def compile(cls, data: FunctionData) -> Self | None:
+        """编译处理器，存在没有类型注解的参数时返回None"""
+        params = data.signature.parameters
+        frame = data.frame
+        if failed_args := [
+            k for k, v in params.items() if v.annotation is inspect.Parameter.empty
+        ]:
+            logger.warning(
+                f"匹配器 {data.function.__name__} (File: {frame.f_code.co_filename}: Line {frame.f_lineno!s}) 有没有类型注解的参数！"
+                + f"(Args:{''.join(i + ',' for i in failed_args)}).跳过......"
+            )
+            return None
+        return cls(
+            data=data,
+            param_types=tuple(v.annotation for v in params.values()),
+            kw_slots=tuple((k, v.annotation) for k, v in params.items()),
+            file_name=frame.f_code.co_filename,
+            line_number=frame.f_lineno,
+        )
+
+    def bind_kwargs(self, kwargs: dict[Any, Any]) -> dict[str, Any]:
+        """根据类型注解从关键字参数中取出要注入的参数"""
+        if not kwargs:
+            return {}
+        return {
+            param_name: kwargs[annotation]
+            for param_name, annotation in self.kw_slots
+            if annotation in kwargs
+        }
+
+    def resolve(self, arg_types: tuple[type, ...]) -> tuple[int, ...] | None:
+        """根据传入参数的类型解析注入位置（索引0为Matcher），无法满足所有参数时返回None
+
+        Args:
+            arg_types: 传入trigger_event的位置参数的类型
+        """
+        try:
+            return self._slots_cache[arg_types]
+        except KeyError:
+            pass
+        session_types = (type(self.data.matcher), *arg_types)
+        slots: list[int] = []
+        used_indices: set[int] = set()
+        for param_type in self.param_types:
+            for i, arg_type in enumerate(session_types):
+                if i in used_indices:
+                    continue
+                if issubclass(arg_type, param_type):
+                    slots.append(i)
+                    used_indices.add(i)
+                    break
+        result = tuple(slots) if len(slots) == len(self.param_types) else None
+        self._slots_cache[arg_types] = result
+        return result
+
+
 class EventRegistry:
     _instance = None
     __event_handlers: ClassVar[dict[str, list[FunctionData]]] = {}
+    __dispatch_plans: ClassVar[dict[str, tuple[HandlerPlan, ...]]] = {}
+    __dispatch_batches: ClassVar[dict[str, tuple[tuple[HandlerPlan, ...], ...]]] = {}
 
     def __new__(cls) -> Self:
         if cls._instance is None:
@@ -41,12 +116,57 @@ class EventRegistry:
         return cls._instance
 
     def register_handler(self, event_type: str, data: FunctionData):
-        self.__event_handlers.setdefault(event_type, []).append(data)
+        handlers = self.__event_handlers.setdefault(event_type, [])
+        handlers.append(data)
+        handlers.sort(key=lambda x: x.priority, reverse=False)
+        self.invalidate(event_type)
 
     def get_handlers(self, event_type: str) -> list[FunctionData]:
-        self.__event_handlers.setdefault(event_type, [])
-        self.__event_handlers[event_type].sort(key=lambda x: x.priority, reverse=False)
-        return self.__event_handlers[event_type]
+        return self.__event_handlers.setdefault(event_type, [])
+
+    def get_dispatch_plan(self, event_type: str) -> tuple[HandlerPlan, ...]:
+        """获取事件类型的调度计划（按优先级排序），注册新处理器后重新编译"""
+        if (plan := self.__dispatch_plans.get(event_type)) is None:
+            plan = self.__dispatch_plans[event_type] = tuple(
+                handler_plan
+                for data in self.get_handlers(event_type)
+                if (handler_plan := HandlerPlan.compile(data)) is not None
+            )
+        return plan
+
+    def get_dispatch_batches(
+        self, event_type: str
+    ) -> tuple[tuple[HandlerPlan, ...], ...]:
+        """获取按批次划分的调度计划，相邻的同优先级且不阻断（block=False）的处理器归入同一批次"""
+        if (batches := self.__dispatch_batches.get(event_type)) is None:
+            grouped: list[list[HandlerPlan]] = []
+            for plan in self.get_dispatch_plan(event_type):
+                if (
+                    grouped
+                    and not plan.data.block
+                    and not grouped[-1][-1].data.block
+                    and grouped[-1][-1].data.priority == plan.data.priority
+                ):
+                    grouped[-1].append(plan)
+                else:
+                    grouped.append([plan])
+            batches = self.__dispatch_batches[event_type] = tuple(
+                tuple(batch) for batch in grouped
+            )
+        return batches
+
+    def invalidate(self, event_type: str | None = None):
+        """使调度计划失效，直接修改处理器列表后需要调用
+
+        Args:
+            event_type: 事件类型，为None时使所有调度计划失效
+        """
+        if event_type is None:
+            self.__dispatch_plans.clear()
+            self.__dispatch_batches.clear()
+        else:
+            self.__dispatch_plans.pop(event_type, None)
+            self.__dispatch_batches.pop(event_type, None)
 
     def _all(self) -> dict[str, list[FunctionData]]:
         return self.__event_handlers
@@ -126,15 +246,20 @@ class MatcherManager:
         """
         触发特定类型的事件，并调用该类型的所有注册事件处理程序。
 
+        启用 `matcher_concurrency` 时，相邻的同优先级且不阻断（block=False）的处理器会并发运行，
+        每个处理器操作独立的事件视图，结束后按注册顺序合并对上下文与模型响应的修改。
+
         参数:
         - event: SuggarEvent 对象，包含事件相关数据。
         - **kwargs: 关键字参数，传递给依赖注入系统的参数。
         - *args: 可变参数，传递给依赖注入系统的参数。
         """
         event: SuggarEvent | None = None
-        for i in args:
+        event_index = 0
+        for index, i in enumerate(args):
             if isinstance(i, SuggarEvent):
                 event = i
+                event_index = index
                 break
         if not event:
             logger.error("事件必须被传入，但是是没有找到！")
@@ -142,60 +267,45 @@ class MatcherManager:
         event_type = event.get_event_type()  # 获取事件类型
         priority_tmp = 0
         logger.info(f"正在为事件: {event_type} 运行matcher!")
+        registry = EventRegistry()
         # 检查是否有处理该事件类型的处理程序
-        if matcher_list := EventRegistry().get_handlers(event_type):
-            for matcher in matcher_list:
-                if matcher.priority != priority_tmp:
-                    priority_tmp = matcher.priority
+        if plans := registry.get_dispatch_plan(event_type):
+            arg_types = tuple(type(i) for i in args)
+            # 每次触发都会读取该选项，直接读取原始配置以避免重建整个配置对象
+            batches = (
+                registry.get_dispatch_batches(event_type)
+                if config_manager.ins_config.matcher_concurrency
+                else tuple((plan,) for plan in plans)
+            )
+            for batch in batches:
+                plan = batch[0]
+                if plan.data.priority != priority_tmp:
+                    priority_tmp = plan.data.priority
                     logger.info(f"为优先级 {priority_tmp} 运行Matcher......")
 
-                signature = matcher.signature
-                frame = matcher.frame
-                line_number = frame.f_lineno
-                file_name = frame.f_code.co_filename
-                handler = matcher.function
-                session_args = [matcher.matcher, *args]
-                session_kwargs = {**deepcopy(kwargs)}
-
-                args_types = {k: v.annotation for k, v in signature.parameters.items()}
-                filtered_args_types = {
-                    k: v for k, v in args_types.items() if v is not inspect._empty
-                }
-                if args_types != filtered_args_types:
-                    failed_args = list(args_types.keys() - filtered_args_types.keys())
-                    logger.warning(
-                        f"匹配器 {matcher.function.__name__} (File: {file_name}: Line {frame.f_lineno!s}) 有没有类型注解的参数！"
-                        + f"(Args:{''.join(i + ',' for i in failed_args)}).跳过......"
-                    )
-                    continue
-                new_args = []
-                used_indices = set()
-                for param_type in filtered_args_types.values():
-                    for i, arg in enumerate(session_args):
-                        if i in used_indices:
-                            continue
-                        if isinstance(arg, param_type):
-                            new_args.append(arg)
-                            used_indices.add(i)
-                            break
-                new_args_tuple = tuple(new_args)
-
-                # 获取关键词参数类型注解
-                kwparams = signature.parameters
-                f_kwargs = {
-                    param_name: session_kwargs[param.annotation]
-                    for param_name, param in kwparams.items()
-                    if param.annotation in session_kwargs
-                }
-                if len(new_args_tuple) != len(list(filtered_args_types)):
+                if len(batch) > 1:
+                    if await MatcherManager._run_concurrently(
+                        batch, event, event_index, args, kwargs, arg_types
+                    ):
+                        continue
+                    return
+
+                matcher = plan.data
+                if (slots := plan.resolve(arg_types)) is None:
                     continue
+                file_name = plan.file_name
+                line_number = plan.line_number
+                handler = matcher.function
+                session_args = (matcher.matcher, *args)
 
                 # 调用处理程序
 
                 try:
                     logger.info(f"开始运行Matcher: '{handler.__name__}'")
 
-                    await handler(*new_args_tuple, **f_kwargs)
+                    await handler(
+                        *(session_args[i] for i in slots), **plan.bind_kwargs(kwargs)
+                    )
 
                 except ProcessException as e:
                     logger.info("停止Nonebot处理")
@@ -224,3 +334,122 @@ class MatcherManager:
                         break
         else:
             logger.info(f"没有为 {event_type} 事件注册的Matcher，跳过处理。")
+
+    @staticmethod
+    async def _run_concurrently(
+        batch: tuple[HandlerPlan, ...],
+        event: SuggarEvent,
+        event_index: int,
+        args: tuple[Any, ...],
+        kwargs: dict[Any, Any],
+        arg_types: tuple[type, ...],
+    ) -> bool:
+        """并发运行同一批次的处理器，按注册顺序汇总结果
+
+        异常语义与顺序执行一致：按注册顺序找到第一个中断处理的异常
+        （ProcessException/NoneBotException 继续抛出，CancelException 取消处理，BlockException 停止后续处理器），
+        仅合并该处理器及其之前的处理器对事件的修改。
+
+        Returns:
+            是否继续运行后续批次
+        """
+        calls: list[tuple[HandlerPlan, SuggarEvent, Awaitable[Any]]] = []
+        for plan in batch:
+            if (slots := plan.resolve(arg_types)) is None:
+                continue
+            view = copy.copy(event)
+            view._send_message = list(event._send_message)
+            view._modelResponse = list(event._modelResponse)
+            session_args = (
+                plan.data.matcher,
+                *args[:event_index],
+                view,
+                *args[event_index + 1 :],
+            )
+            calls.append(
+                (
+                    plan,
+                    view,
+                    plan.data.function(
+                        *(session_args[i] for i in slots), **plan.bind_kwargs(kwargs)
+                    ),
+                )
+            )
+        if not calls:
+            return True
+        logger.info(
+            f"并发运行Matcher: {', '.join(repr(plan.data.function.__name__) for plan, _, _ in calls)}"
+        )
+        results = await asyncio.gather(
+            *(coro for _, _, coro in calls), return_exceptions=True
+        )
+
+        cut = len(results)
+        for index, result in enumerate(results):
+            if isinstance(
+                result, NoneBotException | CancelException | BlockException
+            ) or (
+                isinstance(result, BaseException) and not isinstance(result, Exception)
+            ):
+                cut = index + 1
+                break
+        _merge_event_views(event, [view for _, view, _ in calls[:cut]])
+
+        for (plan, _, _), result in zip(calls[:cut], results[:cut]):
+            handler = plan.data.function
+            logger.info(f"处理器 {handler.__name__} 已结束")
+            if not isinstance(result, BaseException):
+                continue
+            if isinstance(result, ProcessException):
+                logger.info("停止Nonebot处理")
+                raise result
+            if isinstance(result, PassException):
+                logger.info(
+                    f"Matcher '{handler.__name__}'(~{plan.file_name}:{plan.line_number}) 已跳过"
+                )
+            elif isinstance(result, CancelException):
+                logger.info("取消了Matcher处理")
+                return False
+            elif isinstance(result, BlockException):
+                return False
+            elif isinstance(result, NoneBotException) or not isinstance(
+                result, Exception
+            ):
+                raise result
+            else:
+                logger.error(
+                    f"运行时发生了错误 '{handler.__name__}'({plan.file_name}:{plan.line_number}) "
+                )
+                logger.opt(exception=result, colors=True).error(str(result))
+        return True
+
+
+def _merge_event_views(event: SuggarEvent, views: list[SuggarEvent]) -> None:
+    """按注册顺序将并发处理器的事件视图合并回原事件
+
+    仅追加了消息的视图，其新增消息依次追加；替换或删减了上下文的视图，以其结果作为新的基准，
+    其他视图追加的消息会追加在该基准之后。多个视图都替换了上下文时以最后一个为准，并记录警告。
+    模型响应以最后一个修改了响应的视图为准。
+    """
+    base = event._send_message
+    messages = list(base)
+    appended: list[Any] = []
+    replaced = False
+    response = event._modelResponse[0]
+    for view in views:
+        view_messages = view._send_message
+        if len(view_messages) >= len(base) and all(
+            a is b for a, b in zip(view_messages, base)
+        ):
+            appended.extend(view_messages[len(base) :])
+        else:
+            if replaced:
+                logger.warning(
+                    "多个并发运行的Matcher替换了上下文，仅保留最后一个的修改"
+                )
+            replaced = True
+            messages = list(view_messages)
+        if view._modelResponse[0] != event._modelResponse[0]:
+            response = view._modelResponse[0]
+    event._send_message[:] = messages + appended
+    event._modelResponse[0] = response
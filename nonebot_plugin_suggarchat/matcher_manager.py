@@ -50,11 +50,11 @@ base_matcher.on_notice(
     block=False,
 ).append_handler(recall)
 
-# 添加消息事件处理器，处理聊天消息
+# 添加消息事件处理器，处理聊天消息（规则内部先检查is_bot_enabled再访问数据库）
 base_matcher.on_message(
     block=False,
     priority=11,
-    rule=Rule(should_respond_with_usage_check, is_bot_enabled),
+    rule=Rule(should_respond_with_usage_check),
 ).append_handler(chat)
 
 # 添加各种命令处理器
@@ -6,6 +6,9 @@ from . import config
 from .chatmanager import chat_manager
 from .config import config_manager
 from .hook_manager import run_hooks
+from .utils.executor import loop_lag_monitor, shutdown_executors
+from .utils.llm_tools.mcp_client import ClientManager
+from .utils.memory import load_disabled_groups
 
 driver = get_driver()
 __LOGO = """\033[31m
@@ -40,4 +43,23 @@ async def onEnable():
     logger.debug("加载配置文件...")
     await config_manager.load()
     config_manager.init_watch()
+    try:
+        await load_disabled_groups()
+    except Exception as e:
+        # 首次检查群聊时会再次加载
+        logger.warning(f"加载已禁用的群聊失败: {e}")
+    performance = config_manager.config.performance
+    if performance.loop_lag_monitor:
+        loop_lag_monitor.start(
+            performance.loop_lag_interval, performance.loop_lag_threshold
+        )
+    if config_manager.config.llm_config.tools.agent_mcp_client_enable:
+        await ClientManager().startup()
     logger.debug("成功启动！")
+
+
+@driver.on_shutdown
+async def onDisable():
+    loop_lag_monitor.stop()
+    shutdown_executors()
+    await ClientManager().close_all()
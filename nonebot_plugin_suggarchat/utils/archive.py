@@ -0,0 +1,59 @@
+"""归档会话的压缩存储
+
+归档的会话以「1字节格式标记 + 数据」的二进制格式存储：
+- `j`：未压缩的JSON；
+- `z`：zlib压缩的JSON；
+- `s`：zstd压缩的JSON（需要安装 `zstandard`，未安装时使用zlib）。
+
+读取时根据格式标记解压，修改压缩算法后已有的归档仍可读取。
+JSON的序列化与解析由调用方完成（见 `utils.models.dump_sessions_blob`/`parse_sessions_blob`），这里只处理压缩。
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Literal
+
+from nonebot import logger
+
+try:
+    import zstandard  # pyright: ignore[reportMissingImports]
+except ImportError:
+    zstandard = None
+
+ARCHIVE_CODEC = Literal["none", "zlib", "zstd"]
+
+_TAG_JSON = b"j"
+_TAG_ZLIB = b"z"
+_TAG_ZSTD = b"s"
+
+
+def compress_archive(data: bytes, codec: ARCHIVE_CODEC) -> bytes:
+    """压缩归档会话的JSON
+
+    Args:
+        data: UTF-8编码的JSON
+        codec: 压缩算法
+    """
+    if codec == "zstd":
+        if zstandard is not None:
+            return _TAG_ZSTD + zstandard.ZstdCompressor().compress(data)
+        logger.warning("未安装 zstandard，归档的会话将使用zlib压缩")
+        codec = "zlib"
+    if codec == "zlib":
+        return _TAG_ZLIB + zlib.compress(data)
+    return _TAG_JSON + data
+
+
+def decompress_archive(blob: bytes) -> bytes:
+    """解压归档会话，返回UTF-8编码的JSON"""
+    tag, data = blob[:1], blob[1:]
+    if tag == _TAG_ZLIB:
+        return zlib.decompress(data)
+    if tag == _TAG_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("归档的会话使用zstd压缩，请安装 zstandard 后重试")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if tag != _TAG_JSON:
+        raise ValueError(f"未知的归档格式：{tag!r}")
+    return data
@@ -0,0 +1,190 @@
+"""会话消息投递队列
+
+模型回复的（拟人化）分段发送在会话锁之外进行，每个会话拥有一个投递队列：
+- 同一会话内的投递严格按照提交顺序进行；
+- 提交新的回复时，同一用户上一条尚未发送完毕的回复会被取消，回复其他用户的投递不受影响；
+- 同一会话内相邻两次发送之间至少间隔 `function.send_interval` 秒，避免触发 OneBot 风控；
+- 队列空闲超过发送间隔后即被移除。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Bot, Event, Message, MessageSegment
+
+from ..config import config_manager
+
+DELIVERY_MESSAGE = str | Message | MessageSegment
+ERROR_HANDLER = Callable[[BaseException], Awaitable[None]]
+
+
+def pacing_delay(message: DELIVERY_MESSAGE) -> int:
+    """计算拟人化发送时，发送完一条消息后的停顿时间（秒）"""
+    return random.randint(1, 3) + (len(str(message)) // random.randint(80, 100))
+
+
+@dataclass
+class _Delivery:
+    """一次尚未完成的投递"""
+
+    task: asyncio.Task[None]
+    user_id: int | None
+    message_id: int | None
+
+
+class DeliveryQueue:
+    """单个会话的消息投递队列"""
+
+    def __init__(self, key: tuple[int, bool]) -> None:
+        self._key = key
+        self._pending: list[_Delivery] = []
+        self._last_sent: float = 0.0
+        self._evict_handle: asyncio.TimerHandle | None = None
+
+    @property
+    def busy(self) -> bool:
+        """是否有尚未完成的投递"""
+        return bool(self._pending)
+
+    def submit(
+        self,
+        bot: Bot,
+        event: Event,
+        messages: Iterable[DELIVERY_MESSAGE],
+        *,
+        paced: bool = True,
+        on_error: ERROR_HANDLER | None = None,
+    ) -> asyncio.Task[None]:
+        """提交一次投递，取代同一用户在当前会话中尚未完成的投递
+
+        Args:
+            bot: Bot实例
+            event: 回复的目标事件
+            messages: 依次发送的消息
+            paced: 是否在消息之间按拟人化节奏停顿
+            on_error: 发送失败时的异常处理，未提供时仅记录日志
+
+        Returns:
+            投递任务
+        """
+        if self._evict_handle is not None:
+            self._evict_handle.cancel()
+            self._evict_handle = None
+        user_id = getattr(event, "user_id", None)
+        for delivery in self._pending:
+            if delivery.user_id == user_id:
+                delivery.task.cancel()
+        previous = [delivery.task for delivery in self._pending]
+        task = asyncio.create_task(
+            self._deliver(previous, bot, event, list(messages), paced, on_error)
+        )
+        task.add_done_callback(self._finish)
+        self._pending.append(
+            _Delivery(task, user_id, getattr(event, "message_id", None))
+        )
+        return task
+
+    def cancel(self, message_id: int | None = None) -> bool:
+        """取消当前会话中尚未完成的投递
+
+        Args:
+            message_id: 仅取消对该消息的回复
+
+        Returns:
+            是否取消了正在进行的投递
+        """
+        cancelled = False
+        for delivery in self._pending:
+            if message_id in (None, delivery.message_id) and not delivery.task.done():
+                delivery.task.cancel()
+                cancelled = True
+        return cancelled
+
+    async def _wait_rate_limit(self) -> None:
+        interval = config_manager.config.function.send_interval
+        if (wait := self._last_sent + interval - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+    async def _deliver(
+        self,
+        previous: list[asyncio.Task[None]],
+        bot: Bot,
+        event: Event,
+        messages: list[DELIVERY_MESSAGE],
+        paced: bool,
+        on_error: ERROR_HANDLER | None,
+    ) -> None:
+        try:
+            if previous:
+                # 等待先提交的投递全部退出，保证同一会话内的发送顺序
+                await asyncio.wait(previous)
+            for index, message in enumerate(messages):
+                if index and paced:
+                    await asyncio.sleep(pacing_delay(messages[index - 1]))
+                await self._wait_rate_limit()
+                await bot.send(event, message)
+                self._last_sent = time.monotonic()
+        except asyncio.CancelledError:
+            logger.debug("回复已被取代，剩余的消息已取消发送")
+            raise
+        except Exception as e:
+            if on_error is None:
+                logger.opt(exception=e, colors=True).error(f"投递消息时出错：{e!s}")
+            else:
+                try:
+                    await on_error(e)
+                except Exception as err:
+                    logger.opt(exception=err, colors=True).error(
+                        f"处理投递异常时出错：{err!s}（原始异常：{e!s}）"
+                    )
+
+    def _finish(self, task: asyncio.Task[None]) -> None:
+        self._pending = [d for d in self._pending if d.task is not task]
+        if not self._pending and self._evict_handle is None:
+            # 保留发送间隔内的队列，使限速在队列移除前仍然生效
+            self._evict_handle = asyncio.get_running_loop().call_later(
+                config_manager.config.function.send_interval, self._evict
+            )
+
+    def _evict(self) -> None:
+        self._evict_handle = None
+        if not self._pending and _delivery_queues.get(self._key) is self:
+            del _delivery_queues[self._key]
+
+
+_delivery_queues: dict[tuple[int, bool], DeliveryQueue] = {}
+
+
+def get_delivery_queue(ins_id: int, is_group: bool) -> DeliveryQueue:
+    """获取会话对应的投递队列
+
+    Args:
+        ins_id: 群号或用户ID
+        is_group: 是否为群聊
+    """
+    key = (ins_id, is_group)
+    if (queue := _delivery_queues.get(key)) is None:
+        queue = _delivery_queues[key] = DeliveryQueue(key)
+    return queue
+
+
+def cancel_delivery(ins_id: int, is_group: bool, message_id: int | None = None) -> bool:
+    """取消会话中尚未完成的回复投递
+
+    Args:
+        ins_id: 群号或用户ID
+        is_group: 是否为群聊
+        message_id: 仅取消对该消息的回复
+
+    Returns:
+        是否取消了正在进行的投递
+    """
+    if (queue := _delivery_queues.get((ins_id, is_group))) is None:
+        return False
+    return queue.cancel(message_id)
@@ -0,0 +1,219 @@
+"""CPU密集型任务执行器
+
+分词计数、合并转发消息合成等CPU密集型任务不应直接在事件循环上运行，
+该模块根据任务规模选择执行位置：
+- 规模小于 `performance.cpu_inline_threshold` 的任务直接在事件循环上执行；
+- 规模大于等于 `performance.cpu_process_threshold` 的批量任务交给进程池（需手动启用，仅支持fork的平台）；
+- 其余任务交给线程池。
+
+同时提供事件循环卡顿监视器，在事件循环被阻塞超过阈值时记录日志以及当时所处的阶段。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import math
+import multiprocessing
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Literal, TypeVar
+
+from nonebot import logger
+
+from ..config import config_manager
+from .tokenizer import count_tokens_batch
+
+R = TypeVar("R")
+
+PROCESS_POOL_AVAILABLE = "fork" in multiprocessing.get_all_start_methods()
+
+_thread_pool: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+_current_stage: str = "idle"
+
+
+@contextlib.contextmanager
+def loop_stage(name: str) -> Iterator[None]:
+    """标记事件循环当前所处的阶段，供卡顿监视器定位阻塞来源
+
+    阶段是全局状态，只能包裹不含 `await` 的同步代码，否则并发任务会相互覆盖阶段。
+    """
+    global _current_stage
+    previous = _current_stage
+    _current_stage = name
+    try:
+        yield
+    finally:
+        _current_stage = previous
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=config_manager.config.performance.cpu_thread_workers,
+            thread_name_prefix="suggarchat-cpu",
+        )
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor | None:
+    global _process_pool
+    workers = config_manager.config.performance.cpu_process_workers
+    if not PROCESS_POOL_AVAILABLE or workers <= 0:
+        return None
+    if _process_pool is None:
+        # 子进程需要继承已加载的模块（插件包无法在未初始化NoneBot的进程中导入）
+        _process_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        )
+    return _process_pool
+
+
+def _pick_executor(size: int) -> Executor | None:
+    conf = config_manager.config.performance
+    if size < conf.cpu_inline_threshold:
+        return None
+    if size >= conf.cpu_process_threshold and (pool := _get_process_pool()):
+        return pool
+    return _get_thread_pool()
+
+
+async def run_cpu(
+    func: Callable[..., R], *args: Any, size: int, stage: str | None = None
+) -> R:
+    """根据任务规模在合适的位置执行CPU密集型函数
+
+    Args:
+        func: 要执行的函数，交给进程池时必须可被pickle
+        *args: 函数参数
+        size: 任务规模（通常为待处理文本的字符数）
+        stage: 阶段名称，默认为函数名
+
+    Returns:
+        函数返回值
+    """
+    executor = _pick_executor(size)
+    if executor is None:
+        with loop_stage(stage or func.__name__):
+            return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def count_tokens(
+    texts: list[str],
+    mode: Literal["word", "bpe", "char"] = "word",
+    *,
+    stage: str = "count_tokens",
+) -> list[int]:
+    """批量计算文本的token数量，大批量任务会被拆分到多个进程中
+
+    Args:
+        texts: 文本列表
+        mode: 分词模式
+        stage: 阶段名称
+
+    Returns:
+        与texts一一对应的token数量
+    """
+    executor = _pick_executor(sum(map(len, texts)))
+    if executor is None:
+        with loop_stage(stage):
+            return count_tokens_batch(texts, mode)
+    loop = asyncio.get_running_loop()
+    if executor is _process_pool and len(texts) > 1:
+        chunk_size = math.ceil(
+            len(texts) / config_manager.config.performance.cpu_process_workers
+        )
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor, count_tokens_batch, texts[i : i + chunk_size], mode
+                )
+                for i in range(0, len(texts), chunk_size)
+            )
+        )
+        return [count for result in results for count in result]
+    return await loop.run_in_executor(executor, count_tokens_batch, texts, mode)
+
+
+def shutdown_executors() -> None:
+    """关闭线程池与进程池"""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+class LoopLagMonitor:
+    """事件循环卡顿监视器
+
+    事件循环中的心跳任务定期记录时间，独立的看门狗线程在心跳停滞时记下事件循环当时所处的阶段，
+    心跳恢复后输出卡顿时长与阶段。
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task[None] | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._interval: float = 0.1
+        self._threshold: float = 0.2
+        self._last_beat: float = 0.0
+        self._stall_stage: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, interval: float, threshold: float) -> None:
+        """启动监视器，必须在事件循环中调用
+
+        Args:
+            interval: 心跳间隔（秒）
+            threshold: 卡顿阈值（秒）
+        """
+        if self.running:
+            return
+        self._interval = interval
+        self._threshold = threshold
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name="suggarchat-loop-lag", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止监视器"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self._interval)
+            lag = time.monotonic() - self._last_beat - self._interval
+            if lag > self._threshold:
+                logger.warning(
+                    f"事件循环被阻塞了 {lag * 1000:.0f}ms，阻塞阶段：{self._stall_stage or _current_stage}"
+                )
+            self._stall_stage = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self._interval):
+            lag = time.monotonic() - self._last_beat - self._interval
+            if lag > self._threshold and self._stall_stage is None:
+                self._stall_stage = _current_stage
+
+
+loop_lag_monitor = LoopLagMonitor()
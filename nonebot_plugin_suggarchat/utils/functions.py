@@ -13,39 +13,97 @@ from nonebot.adapters.onebot.v11 import (
 
 from ..chatmanager import chat_manager
 from ..config import config_manager
+from .executor import run_cpu
 
 
-def remove_think_tag(text: str) -> str:
-    """移除第一次出现的think标签
+def _partial_tag_length(text: str, tag: str) -> int:
+    """text末尾可能是tag开头部分的最大长度"""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
 
-    Args:
-        text (str): 处理的参数
 
-    Returns:
-        str: 处理后的文本
+class ThinkTagFilter:
+    """增量移除think标签的过滤器
+
+    流式输出时逐块输入，标签可以跨越分块边界；可见文本在输入后立即返回，
+    只有可能是标签开头的末尾几个字符会被暂存到下一块。
     """
 
     start_tag = "<think>"
     end_tag = "</think>"
 
-    # 查找第一个起始标签的位置
-    start_idx = text.find(start_tag)
-    if start_idx == -1:
-        return text  # 没有找到起始标签，直接返回原文本
+    def __init__(self) -> None:
+        self._pending = ""
+        self._in_think = False
+        self._strip_newlines = False
+        self._current: list[str] = []  # 当前未闭合的think块内容
+        self._reasoning: list[str] = []
+
+    @property
+    def reasoning(self) -> str:
+        """已闭合的think块内容"""
+        return "".join(self._reasoning)
+
+    def _visible(self, text: str) -> str:
+        if self._strip_newlines and text:
+            text = text.lstrip("\n")
+            self._strip_newlines = not text
+        return text
+
+    def feed(self, chunk: str) -> str:
+        """输入一块文本
+
+        Returns:
+            str: 可以立即输出的可见文本
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        visible: list[str] = []
+        while text:
+            tag = self.end_tag if self._in_think else self.start_tag
+            if (idx := text.find(tag)) == -1:
+                keep = _partial_tag_length(text, tag)
+                self._pending = text[len(text) - keep :]
+                text = text[: len(text) - keep]
+                if self._in_think:
+                    self._current.append(text)
+                else:
+                    visible.append(self._visible(text))
+                break
+            if self._in_think:
+                self._current.append(text[:idx])
+                self._reasoning.extend(self._current)
+                self._current = []
+                self._strip_newlines = True
+            else:
+                visible.append(self._visible(text[:idx]))
+            self._in_think = not self._in_think
+            text = text[idx + len(tag) :]
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """输入结束，返回剩余的可见文本（未闭合的think块按原样保留）"""
+        pending, self._pending = self._pending, ""
+        if self._in_think:
+            self._in_think = False
+            current, self._current = "".join(self._current), []
+            return self._visible(self.start_tag + current + pending)
+        return self._visible(pending)
 
-    # 在起始标签之后查找结束标签的位置
-    end_idx = text.find(end_tag, start_idx + len(start_tag))
-    if end_idx == -1:
-        return text  # 没有找到对应的结束标签，返回原文本
 
-    # 计算结束标签的结束位置
-    end_of_end_tag = end_idx + len(end_tag)
+def remove_think_tag(text: str) -> str:
+    """移除think标签
 
-    # 拼接移除标签后的文本
-    text_new = text[:start_idx] + text[end_of_end_tag:]
-    while text_new.startswith("\n"):
-        text_new = text_new[1:]
-    return text_new
+    Args:
+        text (str): 处理的参数
+
+    Returns:
+        str: 处理后的文本
+    """
+    think_filter = ThinkTagFilter()
+    return think_filter.feed(text) + think_filter.flush()
 
 
 async def is_member(event: GroupMessageEvent, bot: Bot) -> bool:
@@ -72,6 +130,9 @@ def format_datetime_timestamp(time: int) -> str:
     return f"[{formatted_date} {formatted_weekday} {formatted_time}]"
 
 
+# 合并转发消息单个节点的估计字符数，用于选择执行位置
+FORWARD_NODE_SIZE = 200
+
 # 在文件顶部预编译正则表达式
 SENTENCE_DELIMITER_PATTERN = re.compile(r'([。！？!?;；\n]+)[""\'\'"\s]*', re.UNICODE)
 
@@ -144,6 +205,35 @@ async def synthesize_forward_message(forward_msg: dict, bot: Bot) -> str:
         }
     ]
     """
+    nested: dict[str, str] = {}
+    for segment in forward_msg:
+        try:
+            data = segment["data"]
+            if isinstance(data, str):
+                data = json.loads(data)
+            if not isinstance(data["content"], list):
+                continue
+            for segments in data["content"]:
+                if segments["type"] == "forward":
+                    forward_id = segments["data"]["id"]
+                    nested[forward_id] = await synthesize_forward_message(
+                        await bot.get_forward_msg(id=forward_id), bot
+                    )
+        except Exception as e:
+            logger.opt(colors=True, exception=e).warning(
+                f"获取嵌套合并转发消息时出错：{e!s}"
+            )
+    return await run_cpu(
+        _format_forward_message,
+        forward_msg,
+        nested,
+        size=len(forward_msg) * FORWARD_NODE_SIZE,
+        stage="synthesize_forward_message",
+    )
+
+
+def _format_forward_message(forward_msg: dict, nested: dict[str, str]) -> str:
+    """将合并转发消息格式化为字符串（嵌套的合并转发由nested提供）"""
     result = ""
     for segment in forward_msg:
         try:
@@ -165,7 +255,9 @@ async def synthesize_forward_message(forward_msg: dict, bot: Bot) -> str:
                         case "at":
                             result += f" [@{segments['data']['qq']}]"
                         case "forward":
-                            result += f"\\（合并转发:{await synthesize_forward_message(await bot.get_forward_msg(id=segments['data']['id']), bot)}）\\"
+                            result += (
+                                f"\\（合并转发:{nested[segments['data']['id']]}）\\"
+                            )
         except Exception as e:
             logger.opt(colors=True, exception=e).warning(f"解析消息时出错：{e!s}'")
             result += f"\n<!--该消息段无法被解析--><origin>{segment!s}</origin>"
@@ -0,0 +1,171 @@
+"""进行中的生成任务
+
+每个会话登记正在进行的模型调用，以下情况会取消该会话尚未完成的模型调用与回复投递：
+- 用户撤回了触发回复的消息；
+- 清除了会话上下文；
+- 同一用户在回复生成前发送了新的消息（`function.cancel_superseded_generation`）。
+
+被取消的调用已经发送给模型，其输入token按估算值计入用量统计。
+统计在会话锁内进行：被新消息取代的调用记入处理器自身的记忆数据并保存，被取代的用户消息因此保留在上下文中；
+其他情况下重新读取记忆数据后只记录用量，不保存本轮的消息。
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Coroutine
+from dataclasses import dataclass
+from typing import Any
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Event, MessageEvent
+
+from ..check_rule import FakeEvent
+from ..exception import CancelException
+from .delivery import cancel_delivery
+from .executor import count_tokens
+from .libchat import extract_text_content
+from .memory import MemoryModel, Message, ToolResult, get_memory_data
+from .models import InsightsModel, UniResponse
+from .summary import conversation_key
+
+
+@dataclass
+class InFlight:
+    """会话中进行中的模型调用"""
+
+    task: asyncio.Task[UniResponse[str, None]]
+    message_id: int
+    user_id: int
+    cancel_reason: str | None = None
+    keep_turn: bool = False  # 取消后是否保留触发回复的用户消息
+
+
+class GenerationCancelled(CancelException):
+    """模型调用被取消"""
+
+    def __init__(self, keep_turn: bool) -> None:
+        super().__init__()
+        self.keep_turn = keep_turn
+
+
+_in_flight: dict[tuple[int, bool], InFlight] = {}
+
+
+async def run_generation(
+    event: MessageEvent,
+    data: MemoryModel,
+    messages: list[Message | ToolResult],
+    coro: Coroutine[Any, Any, UniResponse[str, None]],
+) -> UniResponse[str, None]:
+    """登记并等待会话的模型调用，必须在会话锁内调用
+
+    Args:
+        event: 触发回复的消息事件
+        data: 处理器持有的记忆数据，其中已记录了本轮的用户消息
+        messages: 发送给模型的消息，用于估算被取消调用的用量
+        coro: 模型调用
+
+    Raises:
+        GenerationCancelled: 模型调用被取消
+    """
+    key = conversation_key(event)
+    entry = InFlight(
+        task=asyncio.create_task(coro),
+        message_id=event.message_id,
+        user_id=event.user_id,
+    )
+    _in_flight[key] = entry
+    try:
+        return await entry.task
+    except asyncio.CancelledError:
+        if entry.cancel_reason is None:
+            # 处理流程本身被取消
+            entry.task.cancel()
+            raise
+        logger.info(f"会话{key}的回复生成已取消：{entry.cancel_reason}")
+        await _account_cancelled(event, data if entry.keep_turn else None, messages)
+        raise GenerationCancelled(entry.keep_turn) from None
+    finally:
+        if _in_flight.get(key) is entry:
+            del _in_flight[key]
+
+
+def cancel_generation(
+    ins_id: int,
+    is_group: bool,
+    reason: str,
+    *,
+    message_id: int | None = None,
+    user_id: int | None = None,
+    delivery: bool = True,
+    keep_turn: bool = False,
+) -> bool:
+    """取消会话中进行中的模型调用与尚未完成的回复投递
+
+    Args:
+        ins_id: 群号或用户ID
+        is_group: 是否为群聊
+        reason: 取消原因
+        message_id: 仅当调用由该消息触发时取消
+        user_id: 仅当调用由该用户触发时取消
+        delivery: 是否同时取消尚未完成的回复投递
+        keep_turn: 是否在记忆中保留被取消调用的用户消息
+
+    Returns:
+        是否取消了进行中的模型调用
+    """
+    cancelled = False
+    entry = _in_flight.get((ins_id, is_group))
+    if (
+        entry is not None
+        and not entry.task.done()
+        and message_id in (None, entry.message_id)
+        and user_id in (None, entry.user_id)
+    ):
+        entry.cancel_reason = reason
+        entry.keep_turn = keep_turn
+        entry.task.cancel()
+        cancelled = True
+    if delivery:
+        cancel_delivery(ins_id, is_group, message_id)
+    return cancelled
+
+
+async def _account_cancelled(
+    event: MessageEvent,
+    data: MemoryModel | None,
+    messages: list[Message | ToolResult],
+) -> None:
+    """按估算的输入token记录被取消调用的用量
+
+    Args:
+        event: 触发回复的消息事件
+        data: 需要连同本轮消息一起保存的记忆数据，为None时重新读取记忆数据，仅记录用量
+        messages: 发送给模型的消息
+    """
+    try:
+        tokens = sum(
+            await count_tokens(
+                [extract_text_content(msg.content) for msg in messages],
+                stage="account_cancelled",
+            )
+        )
+        insights = await InsightsModel.load()
+        insights.token_input += tokens
+        await insights.save()
+        targets: list[tuple[MemoryModel, Event]] = [
+            (data or await get_memory_data(event), event)
+        ]
+        if getattr(event, "group_id", None) is not None:
+            targets.append(
+                (
+                    await get_memory_data(user_id=event.user_id),
+                    FakeEvent(time=0, self_id=0, post_type="", user_id=event.user_id),
+                )
+            )
+        for target, ev in targets:
+            target.input_token_usage += tokens
+            await target.save(ev)
+    except Exception as e:
+        logger.warning(f"记录被取消调用的用量失败：{e!s}")
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import time
 import typing
 from collections.abc import Iterable
 from copy import deepcopy
+from dataclasses import dataclass, field
 
+import httpx
 import openai
 from nonebot import logger
 from nonebot.adapters.onebot.v11 import Event
@@ -20,6 +23,7 @@ from openai.types.chat.chat_completion_named_tool_choice_param import (
 from openai.types.chat.chat_completion_tool_choice_option_param import (
     ChatCompletionToolChoiceOptionParam,
 )
+from openai.types.completion_usage import CompletionUsage
 from typing_extensions import override
 
 from ..chatmanager import chat_manager
@@ -27,18 +31,21 @@ from ..config import ModelPreset, config_manager
 from ..utils.llm_tools.models import ToolFunctionSchema
 from ..utils.models import InsightsModel
 from ..utils.protocol import ToolCall
-from .functions import remove_think_tag
+from .executor import count_tokens
+from .functions import ThinkTagFilter, remove_think_tag
 from .llm_tools.models import ToolChoice
 from .memory import BaseModel, Message, ToolResult, get_memory_data
 from .models import (
     TextContent,
     UniResponse,
     UniResponseUsage,
+    dump_messages,
 )
 from .protocol import (
     AdapterManager,
     ModelAdapter,
 )
+from .response_cache import response_cache
 from .tokenizer import hybrid_token_count
 
 TEST_MSG_PROMPT: Message[list[TextContent]] = Message(
@@ -55,6 +62,50 @@ TEST_MSG_LIST: list[Message[list[TextContent]]] = [
 ]
 
 
+class StreamTimeoutError(TimeoutError):
+    """流式响应超时（等待首个token超时或分块间隔超时）"""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(
+            "等待首个token超时"
+            if reason == "first_token_timeout"
+            else "流式响应停滞超时"
+        )
+        self.reason = reason
+
+
+@dataclass
+class PresetStats:
+    """预设的调用统计"""
+
+    successes: int = 0
+    failures: dict[str, int] = field(default_factory=dict)  # 失败原因->次数
+
+    @property
+    def total_failures(self) -> int:
+        return sum(self.failures.values())
+
+
+preset_stats: dict[str, PresetStats] = {}
+
+
+def _failure_reason(e: Exception) -> str:
+    """归类调用失败的原因"""
+    if isinstance(e, StreamTimeoutError):
+        return e.reason
+    if isinstance(e, openai.APITimeoutError):
+        return (
+            "connect_timeout"
+            if isinstance(e.__cause__, httpx.ConnectTimeout)
+            else "timeout"
+        )
+    if isinstance(e, openai.APIConnectionError):
+        return "connection_error"
+    if isinstance(e, openai.APIStatusError):
+        return f"http_{e.status_code}"
+    return type(e).__name__
+
+
 class PresetReport(BaseModel):
     preset_name: str  # 预设名称
     preset_data: ModelPreset  # 预设数据
@@ -109,7 +160,9 @@ async def test_presets() -> typing.AsyncGenerator[PresetReport, None]:
                     content=[TextContent(type="text", text=data.content)]
                 ),
                 token_prompt=prompt_tokens,
-                token_completion=hybrid_token_count(data.content),
+                token_completion=(
+                    await count_tokens([data.content], stage="test_presets")
+                )[0],
                 status=True,
                 message="",
                 time_used=time_delta,
@@ -129,6 +182,27 @@ async def test_presets() -> typing.AsyncGenerator[PresetReport, None]:
             )
 
 
+def extract_text_content(content: str | list[typing.Any] | None) -> str:
+    """提取消息内容中的纯文本部分
+
+    Args:
+        content: 消息内容（字符串或内容片段列表）
+
+    Returns:
+        拼接后的文本
+    """
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.text if isinstance(part, TextContent) else part.get("text") or ""
+        for part in content
+        if isinstance(part, TextContent)
+        or (isinstance(part, dict) and part.get("type") == "text")
+    )
+
+
 async def get_tokens(
     memory: list[Message | ToolResult], response: UniResponse[str, None]
 ) -> UniResponseUsage[int]:
@@ -141,7 +215,6 @@ async def get_tokens(
     Returns:
         包含token使用情况的对象
     """
-    memory_l = [i.model_dump() for i in memory]
     if (
         response.usage is not None
         and response.usage.total_tokens is not None
@@ -149,18 +222,11 @@ async def get_tokens(
         and response.usage.prompt_tokens is not None
     ):
         return response.usage
-    it = 0
-    for st in memory_l:
-        if st["content"] is None:
-            continue
-        temp_string = (
-            st["content"]
-            if isinstance(st["content"], str)
-            else "".join(s["text"] for s in st["content"] if s["type"] == "text")
-        )
-        it += hybrid_token_count(temp_string)
-
-    ot = hybrid_token_count(response.content)
+    *prompt_counts, ot = await count_tokens(
+        [*(extract_text_content(msg.content) for msg in memory), response.content],
+        stage="get_tokens",
+    )
+    it = sum(prompt_counts)
     return UniResponseUsage(
         prompt_tokens=it, total_tokens=it + ot, completion_tokens=ot
     )
@@ -176,7 +242,7 @@ async def usage_enough(event: Event) -> bool:
         return True
 
     # ### Starts of Global Insights ###
-    global_insights = await InsightsModel.get()
+    global_insights = await InsightsModel.load()
     if (
         config.usage_limit.total_daily_limit != -1
         and global_insights.usage_count >= config.usage_limit.total_daily_limit
@@ -272,7 +338,7 @@ async def _determine_presets(
         ] + [
             preset
             for preset in config.preset_extension.backup_preset_list
-            if (await config_manager.get_preset(preset)).multimodal
+            if (await config_manager.get_preset(preset, cache=True)).multimodal
         ]
         return multimodal_presets
     else:
@@ -291,7 +357,7 @@ async def _call_with_presets(
 
     err: Exception | None = None
     for pname in presets:
-        preset = await config_manager.get_preset(pname)
+        preset = await config_manager.get_preset(pname, cache=True)
         adapter_class = AdapterManager().safe_get_adapter(preset.protocol)
         if adapter_class:
             logger.debug(
@@ -307,15 +373,20 @@ async def _call_with_presets(
         logger.debug(f"API地址：{preset.base_url}")
         logger.debug(f"模型：{preset.model}")
 
+        stats = preset_stats.setdefault(pname, PresetStats())
         try:
             adapter = adapter_class(preset, config_manager.config)
-            return await call_func(adapter, *args, **kwargs)
+            response = await call_func(adapter, *args, **kwargs)
         except NotImplementedError:
             continue
         except Exception as e:
+            reason = _failure_reason(e)
+            stats.failures[reason] = stats.failures.get(reason, 0) + 1
             logger.warning(f"调用适配器失败{e}，正在尝试下一个Adapter")
             err = e
             continue
+        stats.successes += 1
+        return response
     else:
         raise err or RuntimeError("所有适配器调用失败")
 
@@ -324,9 +395,26 @@ async def tools_caller(
     messages: Iterable[Message | ToolResult],
     tools: list,
     tool_choice: ToolChoice | None = None,
+    *,
+    cache_scope: str | None = None,
 ) -> UniResponse[None, list[ToolCall] | None]:
+    """调用工具
+
+    Args:
+        messages: 消息列表
+        tools: 工具列表
+        tool_choice: 工具选择策略
+        cache_scope: 响应缓存场景，为空时不使用缓存
+    """
     messages = _validate_msg_list(messages)
     presets = await _determine_presets(messages)
+    cache_key: str | None = None
+    if cache_scope and response_cache.ttl(cache_scope) > 0:
+        cache_key = await response_cache.make_key(
+            "tools", presets, messages, tools, tool_choice
+        )
+        if (cached := await response_cache.get(cache_scope, cache_key)) is not None:
+            return cached
 
     async def _call_tools(
         adapter: ModelAdapter,
@@ -336,33 +424,64 @@ async def tools_caller(
     ):
         return await adapter.call_tools(messages, tools, tool_choice)
 
-    return await _call_with_presets(presets, _call_tools, messages, tools, tool_choice)
+    response = await _call_with_presets(
+        presets, _call_tools, messages, tools, tool_choice
+    )
+    if cache_scope and cache_key:
+        await response_cache.set(cache_scope, cache_key, response)
+    return response
 
 
 async def get_chat(
     messages: list[Message | ToolResult],
+    presets: list[str] | None = None,
+    *,
+    cache_scope: str | None = None,
 ) -> UniResponse[str, None]:
-    """获取聊天响应"""
-    messages = _validate_msg_list(messages)
-    presets = await _determine_presets(messages)
+    """获取聊天响应
 
-    async def _call_api(
-        adapter: ModelAdapter, messages: Iterable[Message | ToolResult]
-    ):
-        response = await adapter.call_api([(i.model_dump()) for i in messages])
+    Args:
+        messages: 消息列表
+        presets: 使用的预设列表，为空时根据消息内容自动确定
+        cache_scope: 响应缓存场景，为空时不使用缓存
+    """
+    messages = _validate_msg_list(messages)
+    presets = presets or await _determine_presets(messages)
+    cache_key: str | None = None
+    if cache_scope and response_cache.ttl(cache_scope) > 0:
+        cache_key = await response_cache.make_key("chat", presets, messages)
+        if (cached := await response_cache.get(cache_scope, cache_key)) is not None:
+            return cached
+
+    async def _call_api(adapter: ModelAdapter, payload: list[dict[str, typing.Any]]):
+        response = await adapter.call_api(payload)
         preset = adapter.preset
-        if preset.thought_chain_model:
+        # OpenAI适配器在接收响应时已增量移除think标签
+        if preset.thought_chain_model and not isinstance(adapter, OpenAIAdapter):
             response.content = remove_think_tag(response.content)
         return response
 
     # 调用适配器获取聊天响应
-    response = await _call_with_presets(presets, _call_api, messages)
+    # 请求消息只转换一次，切换预设重试时复用
+    response = await _call_with_presets(presets, _call_api, dump_messages(messages))
+    if cache_scope and cache_key:
+        await response_cache.set(cache_scope, cache_key, response)
 
     if chat_manager.debug:
         logger.debug(response)
     return response
 
 
+def _convert_usage(usage: CompletionUsage) -> UniResponseUsage[int]:
+    """转换OpenAI兼容的用量信息，包括命中前缀缓存的token数与思考token数"""
+    uni_usage = UniResponseUsage.model_validate(usage, from_attributes=True)
+    if (details := usage.prompt_tokens_details) is not None:
+        uni_usage.cached_tokens = details.cached_tokens or 0
+    if (completion_details := usage.completion_tokens_details) is not None:
+        uni_usage.reasoning_tokens = completion_details.reasoning_tokens or 0
+    return uni_usage
+
+
 class OpenAIAdapter(ModelAdapter):
     """OpenAI协议适配器"""
 
@@ -372,22 +491,41 @@ class OpenAIAdapter(ModelAdapter):
         """调用OpenAI API获取聊天响应"""
         preset = self.preset
         config = self.config
+        llm_config = config.llm_config
         client = openai.AsyncOpenAI(
             base_url=preset.base_url,
             api_key=preset.api_key,
-            timeout=config.llm_config.llm_timeout,
-            max_retries=config.llm_config.max_retries,
+            timeout=httpx.Timeout(
+                llm_config.llm_timeout, connect=llm_config.llm_connect_timeout
+            ),
+            max_retries=llm_config.max_retries,
         )
         completion: ChatCompletion | openai.AsyncStream[ChatCompletionChunk] | None = (
             None
         )
+        loop = asyncio.get_running_loop()
+        # 流式响应从发出请求开始计算等待首个token的时间
+        first_token_deadline = loop.time() + llm_config.llm_first_token_timeout
+        received = False  # 是否已收到首个token
+
+        def stream_timeout() -> float | None:
+            if received:
+                return llm_config.llm_stream_idle_timeout or None
+            if llm_config.llm_first_token_timeout <= 0:
+                return None
+            return first_token_deadline - loop.time()
+
         if config.llm_config.stream:
-            completion = await client.chat.completions.create(
-                model=preset.model,
-                messages=messages,
-                max_tokens=config.llm_config.max_tokens,
-                stream=config.llm_config.stream,
-                stream_options={"include_usage": True},
+            completion = await self._wait_stream(
+                client.chat.completions.create(
+                    model=preset.model,
+                    messages=messages,
+                    max_tokens=config.llm_config.max_tokens,
+                    stream=config.llm_config.stream,
+                    stream_options={"include_usage": True},
+                ),
+                stream_timeout(),
+                "first_token_timeout",
             )
         else:
             completion = await client.chat.completions.create(
@@ -398,35 +536,73 @@ class OpenAIAdapter(ModelAdapter):
             )
         response: str = ""
         uni_usage = None
+        # 思考内容（reasoning_content与think标签）与可见回复分开处理，不计入回复
+        think_filter = ThinkTagFilter() if preset.thought_chain_model else None
+        reasoning_parts: list[str] = []
         # 处理流式响应
         if config.llm_config.stream and isinstance(completion, openai.AsyncStream):
-            async for chunk in completion:
+            parts: list[str] = []
+            chunks = aiter(completion)
+            while True:
+                try:
+                    chunk = await self._wait_stream(
+                        anext(chunks),
+                        stream_timeout(),
+                        "idle_timeout" if received else "first_token_timeout",
+                    )
+                except StopAsyncIteration:
+                    break
+                except StreamTimeoutError:
+                    await completion.close()
+                    raise
                 try:
                     if chunk.usage:
-                        uni_usage = UniResponseUsage.model_validate(
-                            chunk.usage, from_attributes=True
+                        uni_usage = _convert_usage(chunk.usage)
+                    delta = chunk.choices[0].delta
+                    if reasoning := getattr(delta, "reasoning_content", None):
+                        reasoning_parts.append(reasoning)
+                        received = True
+                    if delta.content is not None:
+                        received = received or bool(delta.content)
+                        visible = (
+                            think_filter.feed(delta.content)
+                            if think_filter
+                            else delta.content
                         )
-                    if chunk.choices[0].delta.content is not None:
-                        response += chunk.choices[0].delta.content
-                        if chat_manager.debug:
-                            logger.debug(chunk.choices[0].delta.content)
+                        if visible:
+                            parts.append(visible)
+                            if chat_manager.debug:
+                                logger.debug(visible)
                 except IndexError:
                     break
+            if think_filter:
+                parts.append(think_filter.flush())
+            response = "".join(parts)
         else:
             if chat_manager.debug:
                 logger.debug(response)
             if isinstance(completion, ChatCompletion):
-                response = (
-                    completion.choices[0].message.content
-                    if completion.choices[0].message.content is not None
-                    else ""
-                )
+                message = completion.choices[0].message
+                response = message.content if message.content is not None else ""
+                if think_filter:
+                    response = think_filter.feed(response) + think_filter.flush()
+                if reasoning := getattr(message, "reasoning_content", None):
+                    reasoning_parts.append(reasoning)
                 if completion.usage:
-                    uni_usage = UniResponseUsage.model_validate(
-                        completion.usage, from_attributes=True
-                    )
+                    uni_usage = _convert_usage(completion.usage)
             else:
                 raise RuntimeError("收到意外的响应类型")
+        if think_filter:
+            reasoning_parts.append(think_filter.reasoning)
+        if (
+            uni_usage is not None
+            and not uni_usage.reasoning_tokens
+            and (reasoning_text := "".join(reasoning_parts))
+        ):
+            # 供应商未返回思考token数时估算
+            (uni_usage.reasoning_tokens,) = await count_tokens(
+                [reasoning_text], config.llm_config.tokens_count_mode
+            )
         uni_response = UniResponse(
             content=response,
             usage=uni_usage,
@@ -434,6 +610,18 @@ class OpenAIAdapter(ModelAdapter):
         )
         return uni_response
 
+    @staticmethod
+    async def _wait_stream(
+        awaitable: typing.Awaitable[typing.Any], timeout: float | None, reason: str
+    ) -> typing.Any:
+        """等待流式响应的下一步，超时则抛出 `StreamTimeoutError` 以便立即切换到备用预设"""
+        if timeout is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, max(timeout, 0))
+        except asyncio.TimeoutError:
+            raise StreamTimeoutError(reason) from None
+
     @override
     async def call_tools(
         self,
@@ -467,7 +655,7 @@ class OpenAIAdapter(ModelAdapter):
             preset_list = ["default"]
         for name in preset_list:
             try:
-                preset = await config_manager.get_preset(name)
+                preset = await config_manager.get_preset(name, cache=True)
 
                 if preset.protocol not in ("__main__", "openai"):
                     continue
@@ -477,7 +665,10 @@ class OpenAIAdapter(ModelAdapter):
                 client = openai.AsyncOpenAI(
                     base_url=base_url,
                     api_key=key,
-                    timeout=config.llm_config.llm_timeout,
+                    timeout=httpx.Timeout(
+                        config.llm_config.llm_timeout,
+                        connect=config.llm_config.llm_connect_timeout,
+                    ),
                 )
                 completion: ChatCompletion = await client.chat.completions.create(
                     model=model,
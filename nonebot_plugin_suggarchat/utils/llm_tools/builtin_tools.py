@@ -82,3 +82,26 @@ REASONING_TOOL = ToolFunctionSchema(
     ),
     strict=True,
 )
+
+READ_TOOL_OUTPUT_TOOL = ToolFunctionSchema(
+    type="function",
+    function=FunctionDefinitionSchema(
+        name="read_tool_output",
+        description="读取因过长而被存储在上下文之外的工具输出",
+        parameters=FunctionParametersSchema(
+            type="object",
+            properties={
+                "handle": FunctionPropertySchema(
+                    description="工具输出的引用",
+                    type="string",
+                ),
+                "offset": FunctionPropertySchema(
+                    description="开始读取的字符位置",
+                    type="integer",
+                ),
+            },
+            required=["handle", "offset"],
+        ),
+    ),
+    strict=True,
+)
@@ -0,0 +1,136 @@
+"""智能体上下文管理
+
+智能体模式下每一轮工具调用都会重新发送整个上下文，为避免上下文随轮数无限增长：
+- 过长的工具输出存储在上下文之外，上下文中只保留开头部分与引用，模型可通过
+  `read_tool_output` 工具按需读取其余内容；
+- 每轮请求前估算上下文大小，超出预算时从最早的工具结果开始截断（最近一轮的结果保持完整）；
+- 记录每轮请求的输入token数。
+"""
+
+from __future__ import annotations
+
+from nonebot import logger
+
+from ...config import config_manager
+from ..executor import count_tokens
+from ..libchat import extract_text_content
+from ..memory import Message, ToolResult
+from ..models import UniResponse
+from .builtin_tools import READ_TOOL_OUTPUT_TOOL
+
+TRUNCATED_PREVIEW_CHARS = 200
+
+
+class AgentContext:
+    """单次智能体运行的上下文"""
+
+    def __init__(self, messages: list[Message | ToolResult]) -> None:
+        """
+        Args:
+            messages: 初始上下文（系统提示词与用户输入），这些消息不会被截断
+        """
+        self.messages = messages
+        self.round_tokens: list[int] = []
+        self._protected = len(messages)
+        self._round_start = len(messages)
+        self._previous_round_start = len(messages)
+        self._outputs: dict[str, str] = {}
+        self._truncated: set[int] = set()
+
+    @property
+    def has_outputs(self) -> bool:
+        """是否有存储在上下文之外的工具输出"""
+        return bool(self._outputs)
+
+    def begin_round(self) -> None:
+        """开始新的一轮工具调用"""
+        self._previous_round_start = self._round_start
+        self._round_start = len(self.messages)
+
+    def offload(self, content: str) -> str:
+        """过长的工具输出存储在上下文之外，返回放入上下文的内容"""
+        max_chars = config_manager.config.llm_config.tools.agent_tool_output_max_chars
+        if max_chars <= 0 or len(content) <= max_chars:
+            return content
+        handle = f"output-{len(self._outputs) + 1}"
+        self._outputs[handle] = content
+        return (
+            f"{content[:max_chars]}\n……\n"
+            + f"[工具输出过长，完整内容已存储在上下文之外（引用：{handle}，共{len(content)}字符），"
+            + f"如需查看其余内容，请调用工具 '{READ_TOOL_OUTPUT_TOOL.function.name}' 并提供引用与起始位置。]"
+        )
+
+    def read_output(self, handle: str, offset: int) -> str:
+        """读取存储在上下文之外的工具输出"""
+        if (content := self._outputs.get(handle)) is None:
+            return f"ERR: 不存在引用为{handle}的工具输出"
+        max_chars = config_manager.config.llm_config.tools.agent_tool_output_max_chars
+        offset = max(0, offset)
+        end = offset + max_chars
+        return content[offset:end] + (
+            f"\n……[剩余{len(content) - end}字符，可从位置{end}继续读取]"
+            if end < len(content)
+            else ""
+        )
+
+    @staticmethod
+    def _message_text(message: Message | ToolResult) -> str:
+        text = extract_text_content(message.content)
+        if isinstance(message, Message) and message.tool_calls:
+            text += "".join(call.function.arguments for call in message.tool_calls)
+        return text
+
+    async def _count_context(self, stage: str) -> list[int]:
+        return await count_tokens(
+            [self._message_text(message) for message in self.messages],
+            config_manager.config.llm_config.tokens_count_mode,
+            stage=stage,
+        )
+
+    async def fit_budget(self) -> int | None:
+        """将上下文压缩到每轮的token预算内
+
+        Returns:
+            压缩后上下文的估算token数，未设置预算时不进行估算，返回None
+        """
+        budget = config_manager.config.llm_config.tools.agent_round_token_budget
+        if budget <= 0:
+            return None
+        mode = config_manager.config.llm_config.tokens_count_mode
+        counts = await self._count_context("agent_fit_budget")
+        total = sum(counts)
+        if total <= budget:
+            return total
+        for index in range(self._protected, self._previous_round_start):
+            if total <= budget:
+                break
+            message = self.messages[index]
+            if (
+                index in self._truncated
+                or not isinstance(message.content, str)
+                or len(message.content) <= TRUNCATED_PREVIEW_CHARS
+            ):
+                continue
+            message.content = (
+                f"{message.content[:TRUNCATED_PREVIEW_CHARS]}……[较早的内容已截断]"
+            )
+            self._truncated.add(index)
+            (count,) = await count_tokens([message.content], mode)
+            total -= counts[index] - count
+        if total > budget:
+            logger.warning(f"Agent上下文约{total} tokens，截断后仍超出预算{budget}")
+        return total
+
+    async def record_round(self, response: UniResponse, estimated: int | None) -> None:
+        """记录本轮请求的输入token数
+
+        优先使用模型返回的用量，其次使用 `fit_budget` 的估算值，都没有时才计算上下文的token数。
+        """
+        if response.usage:
+            tokens = response.usage.prompt_tokens
+        elif estimated is not None:
+            tokens = estimated
+        else:
+            tokens = sum(await self._count_context("agent_record_round"))
+        self.round_tokens.append(tokens)
+        logger.debug(f"第{len(self.round_tokens)}轮工具调用输入约{tokens} tokens")
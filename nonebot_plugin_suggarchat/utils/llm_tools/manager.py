@@ -4,7 +4,15 @@ from typing import Any, ClassVar
 
 from typing_extensions import Self
 
-from .models import FunctionDefinitionSchema, ToolContext, ToolData, ToolFunctionSchema
+from ...config import config_manager
+from ..response_cache import CacheStats, MemoryBackend
+from .models import (
+    FunctionDefinitionSchema,
+    ToolCachePolicy,
+    ToolContext,
+    ToolData,
+    ToolFunctionSchema,
+)
 
 T = typing.TypeVar("T")
 
@@ -15,6 +23,9 @@ class ToolsManager:
     _disabled_tools: ClassVar[set[str]] = (
         set()
     )  # 禁用的工具，使用has_tool与get_tool不会返回禁用工具
+    _result_cache: ClassVar[MemoryBackend | None] = None  # 工具结果缓存
+    _result_cache_version: ClassVar[int] = 0  # 创建工具结果缓存时的配置版本号
+    cache_stats: ClassVar[dict[str, CacheStats]] = {}  # 各工具的缓存命中统计
 
     def __new__(cls) -> Self:
         if cls._instance is None:
@@ -87,11 +98,55 @@ class ToolsManager:
     def get_disabled_tools(self) -> list[str]:
         return list(self._disabled_tools)
 
+    def _get_result_cache(self) -> MemoryBackend:
+        """获取工具结果缓存，配置变化（如MCP服务器或缓存有效期）后重建"""
+        size = config_manager.config.llm_config.tools.tool_cache_max_entries
+        cache = ToolsManager._result_cache
+        version = config_manager.config_version
+        if (
+            cache is None
+            or cache.max_entries != size
+            or ToolsManager._result_cache_version != version
+        ):
+            cache = ToolsManager._result_cache = MemoryBackend(size)
+            ToolsManager._result_cache_version = version
+        return cache
+
+    async def call_tool(self, name: str, data: dict[str, Any]) -> str:
+        """调用非自定义运行的工具，声明了缓存策略的工具会优先使用缓存的结果
+
+        Args:
+            name: 工具名称
+            data: 工具参数
+
+        Returns:
+            工具返回内容
+        """
+        tool = self.get_tool(name)
+        if tool is None:
+            raise ValueError(f"工具 {name} 不存在或已经禁用")
+        func = typing.cast(Callable[[dict[str, Any]], Awaitable[str]], tool.func)
+        policy = tool.cache_policy
+        if policy is None or policy.ttl <= 0 or tool.custom_run:
+            return await func(data)
+        key = policy.make_key(name, data)
+        cache = self._get_result_cache()
+        stats = self.cache_stats.setdefault(name, CacheStats())
+        if (cached := await cache.get(key)) is not None:
+            stats.hits += 1
+            return cached
+        stats.misses += 1
+        result = await func(data)
+        if isinstance(result, str):
+            await cache.set(key, result, policy.ttl)
+        return result
+
 
 def on_tools(
     data: FunctionDefinitionSchema,
     custom_run: bool = False,
     strict: bool = False,
+    cache_policy: ToolCachePolicy | None = None,
 ):
     """Tools注册装饰器
 
@@ -99,6 +154,7 @@ def on_tools(
         data (FunctionDefinitionSchema): 函数元数据
         custom_run (bool, optional): 是否启用自定义运行模式. Defaults to False.
         strict (bool, optional): 是否启用严格模式. Defaults to False.
+        cache_policy (ToolCachePolicy | None, optional): 结果缓存策略，仅对非自定义运行的幂等工具生效. Defaults to None.
     """
 
     def decorator(
@@ -109,6 +165,7 @@ def on_tools(
             func=func,
             data=ToolFunctionSchema(function=data, type="function", strict=strict),
             custom_run=custom_run,
+            cache_policy=cache_policy,
         )
         ToolsManager().register_tool(tool_data)
         return func
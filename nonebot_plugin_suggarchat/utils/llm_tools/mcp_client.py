@@ -1,30 +1,69 @@
 # mcp_client.py
+import asyncio
+import hashlib
+import json
 import random
 from asyncio import Lock
-from copy import deepcopy
+from collections.abc import Mapping
+from pathlib import Path
+from types import MappingProxyType
 from typing import Any, overload
 
+import nonebot_plugin_localstore as store
 from fastmcp import Client
 from fastmcp.client.transports import ClientTransportT
 from nonebot import logger
 from typing_extensions import Self
-from zipp import Path
 
+from ...config import config_manager
 from .manager import ToolsManager
 from .models import (
     FunctionDefinitionSchema,
     FunctionParametersSchema,
+    ToolCachePolicy,
     ToolData,
     ToolFunctionSchema,
 )
 
 MCP_SERVER_SCRIPT_TYPE = ClientTransportT
+MCP_CATALOG_FILE = "mcp_catalog.json"
 
 
 class NOT_GIVEN:
     pass
 
 
+def server_fingerprint(server_script: str | Path) -> str:
+    """计算 MCP Server 的指纹，本地脚本使用文件内容，其他（URI等）使用脚本字符串
+    Args:
+        server_script (str | Path): MCP Server 脚本路径（或URI）
+    """
+    path = Path(server_script)
+    try:
+        data = path.read_bytes() if path.is_file() else str(server_script).encode()
+    except OSError:
+        data = str(server_script).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_catalog() -> dict[str, dict[str, Any]]:
+    """读取持久化的 MCP 工具目录"""
+    path = store.get_plugin_data_dir() / MCP_CATALOG_FILE
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        logger.warning(f"读取 MCP 工具目录缓存失败：{e}")
+        return {}
+
+
+def save_catalog(catalog: dict[str, dict[str, Any]]) -> None:
+    """写入持久化的 MCP 工具目录"""
+    path = store.get_plugin_data_dir() / MCP_CATALOG_FILE
+    path.write_text(json.dumps(catalog, ensure_ascii=False), encoding="utf-8")
+
+
 class MCPClient:
     """可复用的MCP Client"""
 
@@ -36,7 +75,10 @@ class MCPClient:
         self.mcp_client = None
         self.server_script = server_script
         self.tools = []
-        self.openai_tools = []
+        self.openai_tools: list[ToolFunctionSchema] = []
+        self.read_only_tools: set[str] = set()  # 声明为只读(readOnlyHint)的工具
+        self.registered_tools: dict[str, str] = {}  # 已注册的工具(注册名称->原始名称)
+        self._connect_lock = Lock()
 
     async def __aenter__(self):
         await self._connect()
@@ -45,12 +87,43 @@ class MCPClient:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self._close()
 
+    @property
+    def connected(self) -> bool:
+        return self.mcp_client is not None
+
+    @property
+    def catalog_key(self) -> str | None:
+        """工具目录缓存的键，仅本地脚本与URI可被缓存"""
+        if isinstance(self.server_script, str | Path):
+            return str(self.server_script)
+        return None
+
+    async def ensure_connected(self) -> bool:
+        """确保已连接到 MCP Server
+
+        Returns:
+            bool: 是否是本次调用建立的连接
+        """
+        timeout = config_manager.config.llm_config.tools.agent_mcp_connect_timeout
+        async with self._connect_lock:
+            if self.mcp_client is not None:
+                return False
+            try:
+                await asyncio.wait_for(
+                    self._connect(update_tools=True), timeout if timeout > 0 else None
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"连接超时（{timeout}秒）") from None
+            return True
+
     async def simple_call(self, tool_name: str, data: dict[str, Any]):
-        """调用 MCP 工具
+        """调用 MCP 工具（未连接时会先连接）
         Args:
             tool_name (str): 工具名称
             data (dict[str, Any]): 工具参数
         """
+        if await self.ensure_connected():
+            await ClientManager().refresh_if_changed(self)
         if self.mcp_client is None:
             raise RuntimeError("MCP Server 未连接！")
         return await self.mcp_client.call_tool(tool_name, data)
@@ -64,12 +137,23 @@ class MCPClient:
             raise RuntimeError("MCP Server 已经连接了！")
 
         server_script = self.server_script
-        self.mcp_client = Client(server_script)
-        await self.mcp_client.__aenter__()
+        mcp_client = Client(server_script)
+        await mcp_client.__aenter__()
+        self.mcp_client = mcp_client
         logger.info(f"✅ 成功连接到 MCP Server@{server_script}")
-        if self.tools is None or update_tools:
-            tools = await self.mcp_client.list_tools()
+        if not self.tools or update_tools:
+            try:
+                tools = await mcp_client.list_tools()
+            except BaseException:
+                await self._close()
+                raise
             self.tools = tools
+            self._cast_tool_to_openai()
+            self.read_only_tools = {
+                tool.name
+                for tool in tools
+                if getattr(getattr(tool, "annotations", None), "readOnlyHint", False)
+            }
             logger.info(f"🛠️  可用工具: {[tool.name for tool in tools]}")
 
     def _format_tools_for_openai(self):
@@ -96,35 +180,72 @@ class MCPClient:
         self.openai_tools = self._format_tools_for_openai()
 
     def get_tools(self):
-        """获取 MCP 工具列表，并转换为 OpenAI 工具列表"""
-        return self._format_tools_for_openai()
+        """获取 OpenAI 格式的工具列表（连接后获取或从工具目录缓存中加载）"""
+        return [tool.model_copy(deep=True) for tool in self.openai_tools]
+
+    def load_catalog_entry(self, entry: dict[str, Any]) -> None:
+        """从工具目录缓存中加载工具列表"""
+        self.openai_tools = [
+            ToolFunctionSchema.model_validate(tool) for tool in entry["tools"]
+        ]
+        self.read_only_tools = set(entry.get("read_only", []))
+
+    def dump_catalog_entry(self) -> dict[str, Any]:
+        """导出工具目录缓存"""
+        assert self.catalog_key is not None
+        return {
+            "fingerprint": server_fingerprint(self.catalog_key),
+            "tools": [tool.model_dump(exclude_none=True) for tool in self.openai_tools],
+            "read_only": sorted(self.read_only_tools),
+        }
+
+    def get_cache_policy(self, tool_name: str) -> ToolCachePolicy | None:
+        """获取 MCP 工具的结果缓存策略（配置优先，其次为工具声明的只读提示）
+        Args:
+            tool_name (str): 工具的原始名称
+        """
+        conf = config_manager.config.llm_config.tools
+        if (ttl := conf.agent_mcp_tool_cache_ttl.get(tool_name)) is None:
+            ttl = (
+                conf.agent_mcp_readonly_cache_ttl
+                if tool_name in self.read_only_tools
+                else 0
+            )
+        return ToolCachePolicy(ttl=ttl) if ttl > 0 else None
 
     async def _close(self):
         """关闭连接"""
         if self.mcp_client:
-            await self.mcp_client.__aexit__(None, None, None)
-            self.mcp_client = None
+            mcp_client, self.mcp_client = self.mcp_client, None
+            await mcp_client.__aexit__(None, None, None)
 
 
 class ClientManager:
+    """MCP Client 管理器
+
+    工具名称到 MCP Client 的映射是不可变的，注册或注销工具时（持有锁）构建新的映射后整体替换，
+    调用工具时查找 MCP Client 无需等待锁。
+    """
+
     clients: list[MCPClient]
     script_to_clients: dict[str, MCPClient]
-    name_to_clients: dict[str, MCPClient]  # 根据FunctionName映射到MCPClient
-    tools_remapping: dict[
+    name_to_clients: Mapping[str, MCPClient]  # 根据(注册的)FunctionName映射到MCPClient
+    tools_remapping: Mapping[
         str, str
     ]  # 针对于SuggarChat重复工具的重映射(原始名称->重映射名称)
-    reversed_remappings: dict[str, str]  # 逆向映射(重映射名称->原始名称)
+    reversed_remappings: Mapping[str, str]  # 逆向映射(重映射名称->原始名称)
     _instance = None
     _lock: Lock
     _is_initialized = False  # ToolsMapping是否已经就绪
+    _background_task: asyncio.Task | None = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls.clients = []
-            cls.name_to_clients = {}
-            cls.tools_remapping = {}
-            cls.reversed_remappings = {}
+            cls.name_to_clients = MappingProxyType({})
+            cls.tools_remapping = MappingProxyType({})
+            cls.reversed_remappings = MappingProxyType({})
             cls.script_to_clients = {}
             cls._lock = Lock()
         return cls._instance
@@ -139,21 +260,21 @@ class ClientManager:
     async def get_client_by_tool_name(self, tool_name: str) -> MCPClient:
         """根据工具名称获取 MCP Client
         Args:
-            tool_name (str): 工具名称
+            tool_name (str): 工具名称（注册名称或原始名称）
         """
-        async with self._lock:
-            name = self.tools_remapping.get(tool_name) or tool_name
-            if name in self.name_to_clients:
-                return self.name_to_clients[name]
-            raise RuntimeError(
-                f"未找到工具：{tool_name}{f'（由`{name}`重映射）' if name != tool_name else ''}"
-            )
+        name_to_clients = self.name_to_clients
+        name = self.tools_remapping.get(tool_name) or tool_name
+        if client := name_to_clients.get(tool_name) or name_to_clients.get(name):
+            return client
+        raise RuntimeError(
+            f"未找到工具：{tool_name}{f'（由`{name}`重映射）' if name != tool_name else ''}"
+        )
 
     @staticmethod
-    def _tools_wrapper(tool_name: str):
+    def _tools_wrapper(tool_name: str, original_name: str | None = None):
         async def tools_runner(data: dict[str, Any]) -> str:
             client = await ClientManager().get_client_by_tool_name(tool_name)
-            return (await client.simple_call(tool_name, data)).data
+            return (await client.simple_call(original_name or tool_name, data)).data
 
         return tools_runner
 
@@ -181,99 +302,220 @@ class ClientManager:
             self.clients.append(client)
         else:
             raise ValueError("请提供MCP Server脚本或MCP Client")
+        if (key := client.catalog_key) is not None:
+            self.script_to_clients[key] = client
         return self
 
+    def _publish_mappings(
+        self,
+        name_to_clients: dict[str, MCPClient],
+        tools_remapping: dict[str, str],
+        reversed_remappings: dict[str, str],
+    ) -> None:
+        """整体替换工具映射，需要持有锁"""
+        self.name_to_clients = MappingProxyType(name_to_clients)
+        self.tools_remapping = MappingProxyType(tools_remapping)
+        self.reversed_remappings = MappingProxyType(reversed_remappings)
+
+    @staticmethod
+    def _drop_tools(
+        client: MCPClient,
+        name_to_clients: dict[str, MCPClient],
+        tools_remapping: dict[str, str],
+        reversed_remappings: dict[str, str],
+    ) -> None:
+        for name, original_name in client.registered_tools.items():
+            ToolsManager().remove_tool(name)
+            name_to_clients.pop(name, None)
+            if name != original_name:
+                reversed_remappings.pop(name, None)
+                if tools_remapping.get(original_name) == name:
+                    del tools_remapping[original_name]
+        client.registered_tools = {}
+
+    def _unregister_tools(self, client: MCPClient) -> None:
+        """注销 MCP Client 已注册的工具，需要持有锁"""
+        mappings = (
+            dict(self.name_to_clients),
+            dict(self.tools_remapping),
+            dict(self.reversed_remappings),
+        )
+        self._drop_tools(client, *mappings)
+        self._publish_mappings(*mappings)
+
+    def _register_tools(self, client: MCPClient) -> None:
+        """将 MCP Client 的工具注册到 ToolsManager，需要持有锁"""
+        name_to_clients = dict(self.name_to_clients)
+        tools_remapping = dict(self.tools_remapping)
+        reversed_remappings = dict(self.reversed_remappings)
+        self._drop_tools(client, name_to_clients, tools_remapping, reversed_remappings)
+        for tool in client.get_tools():
+            original_name = tool.function.name
+            cache_policy = client.get_cache_policy(original_name)
+            if original_name in name_to_clients:
+                logger.warning(
+                    f"{client}@{client.server_script} has a tool named {original_name}, which is already registered"
+                )
+            name = original_name
+            if ToolsManager().has_tool(original_name):
+                name = f"referred_{random.randint(1, 100)}_{original_name}"
+                logger.warning(
+                    f"⚠️  工具已存在：{original_name}，它将被重映射到：{name}"
+                )
+                tools_remapping[original_name] = name
+                reversed_remappings[name] = original_name
+                tool.function.name = name
+            ToolsManager().register_tool(
+                ToolData(
+                    data=tool,
+                    func=self._tools_wrapper(name, original_name),
+                    cache_policy=cache_policy,
+                )
+            )
+            name_to_clients[name] = client
+            client.registered_tools[name] = original_name
+        self._publish_mappings(name_to_clients, tools_remapping, reversed_remappings)
+        if (key := client.catalog_key) is not None:
+            self.script_to_clients[key] = client
+
+    @staticmethod
+    def _save_catalog_entry(client: MCPClient) -> None:
+        if (key := client.catalog_key) is None:
+            return
+        try:
+            catalog = load_catalog()
+            catalog[key] = client.dump_catalog_entry()
+            save_catalog(catalog)
+        except Exception as e:
+            logger.warning(f"写入 MCP 工具目录缓存失败：{e}")
+
+    async def refresh_if_changed(self, client: MCPClient) -> None:
+        """连接后工具列表与已注册的工具（来自工具目录缓存）不一致时重新注册，并更新缓存"""
+        registered = {
+            original: name for name, original in client.registered_tools.items()
+        }
+        listed = {tool.function.name for tool in client.openai_tools}
+        if set(registered) != listed or any(
+            (meta := ToolsManager().get_tool_meta(registered[tool.function.name]))
+            is None
+            or meta.function.model_dump(exclude={"name"})
+            != tool.function.model_dump(exclude={"name"})
+            for tool in client.openai_tools
+        ):
+            logger.info(f"MCP Server@{client.server_script} 的工具列表已变化，正在更新")
+            async with self._lock:
+                self._register_tools(client)
+        self._save_catalog_entry(client)
+
     @staticmethod
     async def update_tools(client: MCPClient):
-        tools = client.get_tools()
-        async with ClientManager._lock:
-            for tool in tools:
-                name = tool.function.name
-                ToolsManager().remove_tool(name)
-                ClientManager.name_to_clients.pop(name, None)
-                if remap := ClientManager.tools_remapping.pop(name, None):
-                    ClientManager.reversed_remappings.pop(remap, None)
+        """重新获取 MCP Client 的工具列表并重新注册"""
+        await client._close()
         await ClientManager()._load_this(client)
 
     async def initialize_this(self, server_script: MCP_SERVER_SCRIPT_TYPE) -> Self:
         """注册并初始化单个MCP Server"""
         client = self.get_client_by_script(server_script)
-        async with self._lock:
-            try:
-                await self._load_this(client)
-            except Exception as e:
-                logger.error(f"❌ 初始化 MCP Server@{server_script} 失败：{e}")
-                raise
-            else:
-                self.clients.append(client)
+        try:
+            await self._load_this(client)
+        except Exception as e:
+            logger.error(f"❌ 初始化 MCP Server@{server_script} 失败：{e}")
+            raise
+        else:
+            self.clients.append(client)
         return self
 
     async def _load_this(self, client: MCPClient, fail_then_raise=True):
         try:
-            tools_remapping_tmp = {}
-            reversed_remappings_tmp = {}
-            name_to_clients_tmp = {}
-            async with client as c:
-                tools = deepcopy(c.get_tools())
-                for tool in tools:
-                    if (
-                        tool.function.name in self.tools_remapping
-                        or tool.function.name in self.name_to_clients
-                    ):
-                        logger.warning(
-                            f"{client}@{client.server_script} has a tool named {tool.function.name}, which is already registered"
-                        )
-                    name_to_clients_tmp[tool.function.name] = client
-                    if ToolsManager().has_tool(tool.function.name):
-                        remapped_name = (
-                            f"referred_{random.randint(1, 100)}_{tool.function.name}"
-                        )
-                        logger.warning(
-                            f"⚠️  工具已存在：{tool.function.name}，它将被重映射到：{remapped_name}"
-                        )
-                        tools_remapping_tmp[tool.function.name] = remapped_name
-                        reversed_remappings_tmp[remapped_name] = tool.function.name
-                        tool.function.name = remapped_name
-
-                        ToolsManager().register_tool(
-                            ToolData(
-                                data=tool, func=self._tools_wrapper(tool.function.name)
-                            )
-                        )
-
+            await client.ensure_connected()
+            async with self._lock:
+                self._register_tools(client)
         except Exception as e:
+            await client._close()
             if fail_then_raise:
                 raise
             logger.error(f"❌ 连接到 MCP Server@{client.server_script} 失败：{e}")
         else:
             logger.info(f"✅ 加载到 MCP Server@{client.server_script} 成功")
-            self.tools_remapping.update(tools_remapping_tmp)
-            self.reversed_remappings.update(reversed_remappings_tmp)
-            self.name_to_clients.update(name_to_clients_tmp)
-            if isinstance(client.server_script, str | Path):
-                server_script = str(client.server_script)
-                self.script_to_clients[server_script] = client
+            self._save_catalog_entry(client)
+
+    async def _reload_client(self, client: MCPClient):
+        try:
+            await client._close()
+        except Exception as e:
+            logger.warning(f"断开 MCP Server@{client.server_script} 失败：{e}")
+        await self._load_this(client, False)
 
     async def initialize_all(self):
-        """连接所有 MCP Server"""
-        async with self._lock:
-            for client in self.clients:
-                await self._load_this(client, False)
-            self._is_initialized = True
+        """(重新)并发连接所有 MCP Server，单个 MCP Server 连接失败或超时不影响其他 MCP Server"""
+        await asyncio.gather(*(self._reload_client(client) for client in self.clients))
+        self._is_initialized = True
+
+    async def startup(self):
+        """注册配置中的 MCP Server
+
+        工具目录缓存的指纹与 MCP Server 一致时立即从缓存注册工具，
+        之后在后台连接（启用延迟连接时在首次调用工具时连接）；
+        没有可用缓存的 MCP Server 在后台连接后注册工具。
+        """
+        conf = config_manager.config.llm_config.tools
+        catalog = load_catalog()
+        pending: list[MCPClient] = []
+        for script in conf.agent_mcp_server_scripts:
+            if script in self.script_to_clients:
+                continue
+            client = MCPClient(script)
+            self.register_only(client=client)
+            entry = catalog.get(script)
+            if entry and entry.get("fingerprint") == server_fingerprint(script):
+                client.load_catalog_entry(entry)
+                async with self._lock:
+                    self._register_tools(client)
+                logger.info(
+                    f"已从缓存注册 MCP Server@{script} 的{len(client.openai_tools)}个工具"
+                )
+                if conf.agent_mcp_lazy_connect:
+                    continue
+            pending.append(client)
+        if pending:
+            self._background_task = asyncio.create_task(
+                self._connect_in_background(pending)
+            )
+        self._is_initialized = True
+
+    async def _connect_client(self, client: MCPClient):
+        try:
+            if await client.ensure_connected():
+                await self.refresh_if_changed(client)
+        except Exception as e:
+            await client._close()
+            logger.error(f"❌ 连接到 MCP Server@{client.server_script} 失败：{e}")
+
+    async def _connect_in_background(self, clients: list[MCPClient]):
+        await asyncio.gather(*(self._connect_client(client) for client in clients))
+
+    async def close_all(self):
+        """断开所有 MCP Server 的连接"""
+        if self._background_task is not None:
+            self._background_task.cancel()
+            self._background_task = None
+        results = await asyncio.gather(
+            *(client._close() for client in self.clients), return_exceptions=True
+        )
+        for client, result in zip(self.clients, results):
+            if isinstance(result, Exception):
+                logger.warning(f"断开 MCP Server@{client.server_script} 失败：{result}")
 
     async def unregister_client(self, script_name: str | Path):
         """注销一个 MCP Server"""
+        script_name = str(script_name)
         async with self._lock:
-            script_name = str(script_name)
-            if script_name in self.script_to_clients:
-                client = self.script_to_clients.pop(script_name)
-                for tool in client.openai_tools:
-                    name = tool.function.name
-                    ToolsManager().remove_tool(name)
-                    ClientManager.name_to_clients.pop(name, None)
-                    if remap := ClientManager.tools_remapping.pop(name, None):
-                        ClientManager.reversed_remappings.pop(remap, None)
-                for client in self.clients:
-                    if client.server_script == script_name:
-                        self.clients.remove(client)
-                        break
+            if (client := self.script_to_clients.pop(script_name, None)) is None:
+                return
+            self._unregister_tools(client)
+            if client in self.clients:
+                self.clients.remove(client)
+        await client._close()
+        catalog = load_catalog()
+        if catalog.pop(script_name, None) is not None:
+            save_catalog(catalog)
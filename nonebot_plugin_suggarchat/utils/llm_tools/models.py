@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from collections.abc import Awaitable, Callable
 from dataclasses import dataclass, field
 from typing import Any, Generic, Literal, TypeVar
@@ -116,6 +117,21 @@ class ToolContext:
     bot: Bot = field()
 
 
+class ToolCachePolicy(BaseModel):
+    """工具结果缓存策略，仅适用于幂等（相同参数返回相同结果）的工具"""
+
+    ttl: float = Field(..., description="缓存有效期(秒)，小于等于0为不缓存")
+    key_fields: list[str] | None = Field(
+        default=None, description="参与缓存键计算的参数名，为空时使用全部参数"
+    )
+
+    def make_key(self, name: str, data: dict[str, Any]) -> str:
+        """根据工具名称与规范化后的参数计算缓存键"""
+        if self.key_fields is not None:
+            data = {k: data.get(k) for k in self.key_fields}
+        return f"{name}:{json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
 class ToolData(BaseModel):
     """用于注册Tool的数据模型"""
 
@@ -128,3 +144,7 @@ class ToolData(BaseModel):
         default=False,
         description="是否自定义运行，如果启用则会传入Context类而不是dict，并且不会强制要求返回值。",
     )
+    cache_policy: ToolCachePolicy | None = Field(
+        default=None,
+        description="结果缓存策略，自定义运行的工具不会被缓存。",
+    )
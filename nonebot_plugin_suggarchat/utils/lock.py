@@ -15,3 +15,8 @@ def get_private_lock(_: int) -> asyncio.Lock:
 @lru_cache(maxsize=2048)
 def database_lock(*args, **kwargs) -> asyncio.Lock:
     return asyncio.Lock()
+
+
+@lru_cache(maxsize=1024)
+def get_summary_lock(*_) -> asyncio.Lock:
+    return asyncio.Lock()
@@ -1,22 +1,29 @@
 from __future__ import annotations
 
+import asyncio
 import time
+import typing
 from datetime import datetime
-from typing import overload
+from typing import Any, overload
 
 from nonebot import logger
 from nonebot.adapters.onebot.v11 import (
     Event,
 )
 from nonebot_plugin_orm import AsyncSession, get_session
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from ..chatmanager import chat_manager
+from ..config import config_manager
+from .executor import run_cpu
 from .models import (
     BaseModel,
     Message,
     ToolResult,
+    dump_sessions_blob,
+    get_disabled_groups,
     get_or_create_data,
+    get_sessions_data,
 )
 from .models import (
     MemoryModel as Memory,
@@ -33,6 +40,42 @@ class MemoryModel(BaseModel, extra="allow"):
     usage: int = Field(default=0, description="请求次数")
     input_token_usage: int = Field(default=0, description="token使用量")
     output_token_usage: int = Field(default=0, description="token使用量")
+    _ins_id: int | None = PrivateAttr(default=None)
+    _is_group: bool = PrivateAttr(default=False)
+
+    if not typing.TYPE_CHECKING:
+
+        def __getattr__(self, item: str) -> Any:
+            if item == "sessions":
+                raise AttributeError(
+                    "归档的会话尚未加载，请先调用 `await data.load_sessions()`"
+                )
+            return super().__getattr__(item)
+
+    @property
+    def sessions_loaded(self) -> bool:
+        """归档的会话是否已加载（或已被重新赋值）"""
+        return "sessions" in vars(self)
+
+    def _defer_sessions(self) -> None:
+        """标记归档的会话尚未加载，加载前访问 `sessions` 会抛出 `AttributeError`"""
+        vars(self).pop("sessions", None)
+
+    async def load_sessions(self) -> list[Memory]:
+        """按需加载归档的会话
+
+        获取记忆数据时不会读取归档的会话，需要使用 `sessions` 前先调用此方法，
+        否则访问 `sessions` 会抛出 `AttributeError`；
+        未加载归档的会话时，保存记忆数据也不会写入归档的会话。
+        """
+        if not self.sessions_loaded:
+            assert self._ins_id is not None
+            async with get_session() as session:
+                sessions_data = await get_sessions_data(
+                    session=session, ins_id=self._ins_id, is_group=self._is_group
+                )
+            self.sessions = sessions_data
+        return self.sessions
 
     async def save(
         self,
@@ -48,6 +91,26 @@ class MemoryModel(BaseModel, extra="allow"):
             await write_memory_data(event, self, session, raise_err)
 
 
+_disabled_groups_lock = asyncio.Lock()
+
+
+async def load_disabled_groups() -> set[int]:
+    """从数据库加载已禁用聊天功能的群号，之后由写入记忆数据时维护"""
+    async with _disabled_groups_lock:
+        if chat_manager.disabled_groups is None:
+            async with get_session() as session:
+                chat_manager.disabled_groups = await get_disabled_groups(session)
+        return chat_manager.disabled_groups
+
+
+async def is_group_disabled(group_id: int) -> bool:
+    """群聊是否已禁用聊天功能（不访问数据库）"""
+    disabled = chat_manager.disabled_groups
+    if disabled is None:
+        disabled = await load_disabled_groups()
+    return group_id in disabled
+
+
 @overload
 async def get_memory_data(*, user_id: int) -> MemoryModel: ...
 
@@ -66,7 +129,11 @@ async def get_memory_data(
     user_id: int | None = None,
     group_id: int | None = None,
 ) -> MemoryModel:
-    """获取事件对应的记忆数据，如果不存在则创建初始数据"""
+    """获取事件对应的记忆数据，如果不存在则创建初始数据
+
+    返回的数据不包含归档的会话，使用 `sessions` 前需要先调用 `await data.load_sessions()`，
+    否则访问 `sessions` 会抛出 `AttributeError`。
+    """
 
     is_group = False
     if (ins_id := (getattr(event, "group_id", None) or group_id)) is not None:
@@ -94,28 +161,19 @@ async def get_memory_data(
             memory = await get_or_create_data(session=session, ins_id=ins_id)
 
         session.add(memory)
-        await session.refresh(memory)
-        memory_data = memory.memory_json
-        sessions_data = memory.sessions_json
-        messages = [
-            (
-                Message.model_validate(i)
-                if i["role"] != "tool"
-                else ToolResult.model_validate(i)
-            )
-            for i in (memory_data)["messages"]
-        ]
-        c_memory = Memory(messages=messages, time=memory.time.timestamp())
+        c_memory = memory.memory_json
+        c_memory.time = memory.time.timestamp()
 
-        sessions = [Memory.model_validate(i) for i in sessions_data]
         conf = MemoryModel(
             memory=c_memory,
-            sessions=sessions,
             usage=memory.usage_count,
             timestamp=memory.time.timestamp(),
             input_token_usage=memory.input_token_usage,
             output_token_usage=memory.output_token_usage,
         )
+        conf._ins_id = ins_id
+        conf._is_group = is_group
+        conf._defer_sessions()
         if group_conf:
             conf.enable = group_conf.enable
             conf.fake_people = group_conf.fake_people
@@ -173,8 +231,20 @@ async def write_memory_data(
                     for_update=True,
                 )
             session.add(memory)
-            memory.memory_json = data.memory.model_dump()
-            memory.sessions_json = [s.model_dump() for s in data.sessions]
+            memory.memory_json = data.memory
+            if data.sessions_loaded:
+                memory.sessions_blob = await run_cpu(
+                    dump_sessions_blob,
+                    data.sessions,
+                    config_manager.config.session.archive_compression,
+                    size=sum(
+                        len(str(msg.content))
+                        for archived in data.sessions
+                        for msg in archived.messages
+                    ),
+                    stage="encode_sessions",
+                )
+                memory.sessions_json = []
             memory.time = datetime.fromtimestamp(data.timestamp)
             memory.usage_count = data.usage
             memory.input_token_usage = data.input_token_usage
@@ -185,8 +255,26 @@ async def write_memory_data(
                 group_conf.fake_people = data.fake_people
                 group_conf.last_updated = datetime.now()
             await session.commit()
+            if group_conf and chat_manager.disabled_groups is not None:
+                if data.enable:
+                    chat_manager.disabled_groups.discard(ins_id)
+                else:
+                    chat_manager.disabled_groups.add(ins_id)
         except Exception as e:
             logger.opt(exception=e, colors=True).error(f"写入记忆数据时出错: {e}")
             await session.rollback()
             if raise_err:
                 raise e
+
+
+__all__ = [
+    "BaseModel",
+    "Memory",
+    "MemoryModel",
+    "Message",
+    "ToolResult",
+    "get_memory_data",
+    "is_group_disabled",
+    "load_disabled_groups",
+    "write_memory_data",
+]
@@ -3,12 +3,14 @@ from __future__ import annotations
 import json
 import time
 import typing
+import warnings
+from collections.abc import Callable, Coroutine, Iterable
 from datetime import datetime, timedelta
-from typing import Any, Generic, Literal, overload
+from typing import Annotated, Any, ClassVar, Generic, Literal, overload
 
 from nonebot_plugin_orm import AsyncSession, Model, get_session
 from pydantic import BaseModel as B_Model
-from pydantic import Field
+from pydantic import Discriminator, Field, Tag, TypeAdapter
 from sqlalchemy import (
     JSON,
     BigInteger,
@@ -17,6 +19,7 @@ from sqlalchemy import (
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     UniqueConstraint,
@@ -26,12 +29,26 @@ from sqlalchemy import (
     text,
     update,
 )
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Dialect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Mapped, defer, mapped_column
+from sqlalchemy.types import TypeDecorator
 from typing_extensions import Self
 
 from ..config import config_manager
+from .archive import ARCHIVE_CODEC, compress_archive, decompress_archive
+from .executor import run_cpu
 from .lock import database_lock
 
+try:
+    from orjson import loads as json_loads  # pyright: ignore[reportMissingImports]
+except ImportError:
+    from json import loads as json_loads
+
 # Pydantic 模型
 T = typing.TypeVar("T", None, str, None | typing.Literal[""])
 T_INT = typing.TypeVar("T_INT", int, None)
@@ -47,7 +64,37 @@ class BaseModel(B_Model):
         return self.__str__()
 
     def __getitem__(self, key: str) -> Any:
-        return self.model_dump()[key]
+        """按字段名读取字段值
+
+        直接返回字段值，不再序列化整个模型；嵌套的模型同样支持dict风格的访问。
+        """
+        if key in type(self).model_fields or (
+            self.__pydantic_extra__ is not None and key in self.__pydantic_extra__
+        ):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]  # type: ignore[index]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """与 `dict.get` 相同（已弃用，请直接访问属性）
+
+        嵌套的值不再是dict，而是同样支持dict风格访问的模型。
+        """
+        warnings.warn(
+            f"{type(self).__name__}.get() 已弃用，请直接访问属性",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
     def __setitem__(self, key: str, value: Any) -> None:
         self.__setattr__(key, value)
@@ -84,6 +131,8 @@ class UniResponseUsage(BaseModel, Generic[T_INT]):
     prompt_tokens: T_INT
     completion_tokens: T_INT
     total_tokens: T_INT
+    cached_tokens: int = 0  # 命中供应商前缀缓存的输入token数
+    reasoning_tokens: int = 0  # 输出token中用于思考的token数
 
 
 class UniResponse(
@@ -133,9 +182,66 @@ class ToolResult(BaseModel):
     tool_call_id: str = Field(..., description="工具调用ID")
 
 
+def _message_kind(value: Any) -> str:
+    """按role区分消息与工具结果，避免逐个尝试联合类型"""
+    role = (
+        value.get("role") if isinstance(value, dict) else getattr(value, "role", None)
+    )
+    return "tool" if role == "tool" else "message"
+
+
+ChatMessage = Annotated[
+    Annotated[Message, Tag("message")] | Annotated[ToolResult, Tag("tool")],
+    Discriminator(_message_kind),
+]
+
+_messages_adapter = TypeAdapter(list[ChatMessage])
+
+
+def dump_messages(messages: Iterable[Message | ToolResult]) -> list[dict[str, Any]]:
+    """将消息转换为API请求使用的dict列表
+
+    整个列表由pydantic一次完成序列化，比逐条调用 `model_dump()` 更快。
+    """
+    return _messages_adapter.dump_python(list(messages))
+
+
+def copy_messages(messages: Iterable[Message | ToolResult]) -> list[ChatMessage]:
+    """深拷贝消息列表
+
+    由pydantic一次完成序列化与校验，比逐条 `copy.deepcopy` 更快。
+    """
+    return _messages_adapter.validate_python(
+        _messages_adapter.dump_python(list(messages))
+    )
+
+
 class MemoryModel(BaseModel):
-    messages: list[Message | ToolResult] = Field(default_factory=list)
+    messages: list[ChatMessage] = Field(default_factory=list)
     time: float = Field(default_factory=time.time, description="时间戳")
+    summary: str = Field(default="", description="被移出上下文的早期对话摘要")
+
+
+_Insights = typing.TypeVar("_Insights", bound="InsightsModel")
+
+
+class _LoadOrGet:
+    """`InsightsModel.get`：在类上访问时为 `load()`，在实例上访问时为dict风格的 `get()`"""
+
+    @overload
+    def __get__(
+        self, instance: None, owner: type[_Insights]
+    ) -> Callable[[], Coroutine[Any, Any, _Insights]]: ...
+
+    @overload
+    def __get__(
+        self, instance: InsightsModel, owner: type[InsightsModel]
+    ) -> Callable[..., Any]: ...
+
+    def __get__(self, instance: Any, owner: Any) -> Any:
+        if instance is None:
+            return owner.load
+        return BaseModel.get.__get__(instance, owner)
 
 
 class InsightsModel(BaseModel):
@@ -145,9 +251,15 @@ class InsightsModel(BaseModel):
     token_input: int = Field(..., description="输入token使用量")
     token_output: int = Field(..., description="输出token使用量")
     usage_count: int = Field(..., description="聊天请求次数")
+    token_cached: int = Field(default=0, description="命中缓存的输入token数")
+    token_reasoning: int = Field(default=0, description="输出token中用于思考的token数")
+
+    # 兼容旧的 `InsightsModel.get()`，实例上的 `get()` 仍为dict风格的访问
+    get: ClassVar[_LoadOrGet] = _LoadOrGet()  # pyright: ignore[reportIncompatibleMethodOverride]
 
     @classmethod
-    async def get(cls) -> Self:
+    async def load(cls) -> Self:
+        """读取当天的统计数据"""
         date_now = datetime.now().strftime("%Y-%m-%d")
         async with database_lock(date_now):
             async with get_session() as session:
@@ -248,6 +360,65 @@ class GlobalInsights(Model):
         BigInteger, default=0, server_default=text("0")
     )
     usage_count: Mapped[int] = mapped_column(Integer, default=0)
+    token_cached: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default=text("0")
+    )
+    token_reasoning: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default=text("0")
+    )
+
+
+class PydanticJSON(TypeDecorator):
+    """以pydantic直接序列化/解析的JSON列
+
+    写入时由pydantic直接将模型序列化为JSON文本，不经过中间的dict；
+    读取时使用orjson（未安装时使用标准库json）解析后校验为模型，
+    对中文为主的聊天记录，这比pydantic自带的JSON解析更快。
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def __init__(self, model_type: Any) -> None:
+        super().__init__()
+        self.model_type = model_type
+        self._adapter = TypeAdapter(model_type)
+
+    def bind_processor(self, dialect: Dialect):
+        adapter = self._adapter
+
+        def process(value: Any) -> str | None:
+            if value is None:
+                return None
+            return adapter.dump_json(value).decode("utf-8")
+
+        return process
+
+    def result_processor(self, dialect: Dialect, coltype: Any):
+        adapter = self._adapter
+
+        def process(value: Any) -> Any:
+            if value is None:
+                return None
+            if isinstance(value, str | bytes):
+                value = json_loads(value)
+            # 部分驱动会自行解析JSON列
+            return adapter.validate_python(value)
+
+        return process
+
+
+_sessions_adapter = TypeAdapter(list[MemoryModel])
+
+
+def dump_sessions_blob(sessions: list[MemoryModel], codec: ARCHIVE_CODEC) -> bytes:
+    """将归档的会话序列化并压缩"""
+    return compress_archive(_sessions_adapter.dump_json(sessions), codec)
+
+
+def parse_sessions_blob(blob: bytes) -> list[MemoryModel]:
+    """解压并解析归档的会话"""
+    return _sessions_adapter.validate_python(json_loads(decompress_archive(blob)))
 
 
 class Memory(Model):
@@ -255,18 +426,24 @@ class Memory(Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ins_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     is_group: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
-    memory_json: Mapped[dict[str, Any]] = mapped_column(
-        JSON,
-        default=MemoryModel().model_dump(),
+    memory_json: Mapped[MemoryModel] = mapped_column(
+        PydanticJSON(MemoryModel),
+        default=MemoryModel(),
         nullable=False,
         server_default=text("'{}'"),
     )
-    sessions_json: Mapped[list[dict[str, Any]]] = mapped_column(
-        JSON,
+    sessions_json: Mapped[list[MemoryModel]] = mapped_column(
+        PydanticJSON(list[MemoryModel]),
         default=[],
         nullable=False,
         server_default=text("'[]'"),
-    )
+        deferred=True,  # 归档的会话仅在需要时加载
+    )  # 旧格式的归档会话，新的归档写入sessions_blob
+    sessions_blob: Mapped[bytes | None] = mapped_column(
+        LargeBinary().with_variant(LONGBLOB(), "mysql"),
+        nullable=True,
+        deferred=True,
+    )  # 压缩存储的归档会话，格式见utils.archive
     time: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.now, nullable=False
     )
@@ -303,6 +480,63 @@ class GroupConfig(Model):
     )
 
 
+_RowModel = typing.TypeVar("_RowModel", bound=Memory | GroupConfig)
+
+
+def _insert_ignore(session: AsyncSession, model: type[_RowModel], **values: Any):
+    """构建「已存在则忽略」的插入语句，不支持的数据库返回None"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert(model).values(**values).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql_insert(model).values(**values).on_conflict_do_nothing()
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql_insert(model).values(**values)
+        # 冲突时不做任何修改
+        return stmt.on_duplicate_key_update(id=model.id)
+    return None
+
+
+async def _ensure_row(
+    session: AsyncSession, model: type[_RowModel], **values: Any
+) -> None:
+    """确保数据行存在，并发创建时不会因唯一约束冲突而失败，也不会提交调用方的事务"""
+    if (stmt := _insert_ignore(session, model, **values)) is not None:
+        await session.execute(stmt)
+        return
+    exists = select(model.id).filter_by(**values)
+    if (await session.execute(exists)).scalar_one_or_none() is not None:
+        return
+    try:
+        async with session.begin_nested():
+            await session.execute(insert(model).values(**values))
+    except IntegrityError:
+        pass
+
+
+async def get_sessions_data(
+    *, session: AsyncSession, ins_id: int, is_group: bool = False
+) -> list[MemoryModel]:
+    """读取归档的会话（压缩存储的归档会话在读取时解压）"""
+    stmt = select(Memory.sessions_blob, Memory.sessions_json).where(
+        Memory.ins_id == ins_id, Memory.is_group == is_group
+    )
+    if (row := (await session.execute(stmt)).first()) is None:
+        return []
+    blob, sessions = row
+    if blob:
+        return await run_cpu(
+            parse_sessions_blob, blob, size=len(blob) * 4, stage="parse_sessions"
+        )
+    return sessions or []
+
+
+async def get_disabled_groups(session: AsyncSession) -> set[int]:
+    """获取已禁用聊天功能的群号"""
+    stmt = select(GroupConfig.group_id).where(GroupConfig.enable.is_(False))
+    return set((await session.execute(stmt)).scalars())
+
+
 @overload
 async def get_or_create_data(
     *, session: AsyncSession, ins_id: int, for_update: bool = False
@@ -324,32 +558,30 @@ async def get_or_create_data(
     is_group: bool = False,
     for_update: bool = False,
 ) -> Memory | tuple[GroupConfig, Memory]:
-    async with database_lock(ins_id, is_group):
+    """获取记忆数据（群聊同时获取群组配置），不存在时创建
+
+    数据已存在时只需一次查询（群聊通过连接同时查询群组配置）；
+    不存在时以「已存在则忽略」的方式插入后重新查询，不依赖进程内的锁，也不会提交调用方的事务。
+    """
+    if is_group:
+        stmt = (
+            select(GroupConfig, Memory)
+            .join(GroupConfig, GroupConfig.group_id == Memory.ins_id)
+            .where(Memory.ins_id == ins_id, Memory.is_group == is_group)
+        )
+    else:
         stmt = select(Memory).where(
             Memory.ins_id == ins_id, Memory.is_group == is_group
         )
-        stmt = stmt.with_for_update() if for_update else stmt
-        result = await session.execute(stmt)
-        if not (memory := result.scalar_one_or_none()):
-            stmt = insert(Memory).values(ins_id=ins_id, is_group=is_group)
-            await session.execute(stmt)
-            await session.commit()
-            stmt = select(Memory).where(
-                Memory.ins_id == ins_id, Memory.is_group == is_group
-            )
-            stmt = stmt.with_for_update() if for_update else stmt
-            memory = (await session.execute(stmt)).scalar_one()
-        session.add(memory)
-        if not is_group:
-            return memory
-        stmt = select(GroupConfig).where(GroupConfig.group_id == ins_id)
-        stmt = stmt.with_for_update() if for_update else stmt
-        result = await session.execute(stmt)
-        if not (group_config := result.scalar_one_or_none()):
-            stmt = insert(GroupConfig).values(group_id=ins_id)
-            await session.execute(stmt)
-            await session.commit()
-            stmt = select(GroupConfig).where(GroupConfig.group_id == ins_id)
-            group_config = (await session.execute(stmt)).scalar_one()
-        session.add(group_config)
-        return group_config, memory
+    if for_update:
+        # 写入时会整体替换记忆，无需解析数据库中的旧记忆
+        stmt = stmt.with_for_update().options(defer(Memory.memory_json))
+    if (row := (await session.execute(stmt)).first()) is None:
+        await _ensure_row(session, Memory, ins_id=ins_id, is_group=is_group)
+        if is_group:
+            await _ensure_row(session, GroupConfig, group_id=ins_id)
+        row = (await session.execute(stmt)).one()
+    if not is_group:
+        return row[0]
+    group_config, memory = row
+    return group_config, memory
@@ -0,0 +1,155 @@
+"""内容审查
+
+- 纯文本输入的审查结果按实际送审的消息缓存，相同的审查内容不会重复请求模型；
+- 推测审查模式下，审查与工具调用、模型请求并行进行，发送回复前再检查审查结果，
+  审查通常先于工具调用与模型请求完成，未被举报的消息不会因此增加延迟。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+from dataclasses import asdict, dataclass
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Bot, MessageEvent
+
+from ..config import config_manager
+from .admin import send_to_admin
+from .libchat import tools_caller
+from .llm_tools.builtin_tools import REPORT_TOOL, report
+from .memory import Message, ToolResult, get_memory_data
+from .models import dump_messages
+from .response_cache import MemoryBackend
+
+
+@dataclass
+class Verdict:
+    """审查结果"""
+
+    flagged: bool = False
+    reason: str = ""
+
+
+_verdict_cache: MemoryBackend | None = None
+_verdict_cache_versions: tuple[int, int] = (0, 0)
+_pending_reviews: dict[int, asyncio.Task[Verdict]] = {}
+
+
+def _get_verdict_cache() -> MemoryBackend:
+    """获取审查结果缓存，配置或模型预设变化后重建"""
+    global _verdict_cache, _verdict_cache_versions
+    size = config_manager.config.llm_config.tools.report_cache_size
+    versions = (config_manager.config_version, config_manager.presets_version)
+    if (
+        _verdict_cache is None
+        or _verdict_cache.max_entries != size
+        or _verdict_cache_versions != versions
+    ):
+        _verdict_cache = MemoryBackend(size)
+        _verdict_cache_versions = versions
+    return _verdict_cache
+
+
+def is_cacheable_input(event: MessageEvent) -> bool:
+    """消息是否为可缓存审查结果的纯文本输入
+
+    图片、表情、合并转发与引用回复等内容不会体现在纯文本中，这类消息不使用审查缓存。
+    """
+    return (
+        event.reply is None
+        and bool(event.get_plaintext().strip())
+        and all(segment.is_text() for segment in event.message)
+    )
+
+
+def _verdict_key(messages: list[Message | ToolResult]) -> str:
+    payload = json.dumps(
+        dump_messages(messages), ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def review(
+    messages: list[Message | ToolResult], cacheable: bool = False
+) -> Verdict:
+    """审查消息
+
+    Args:
+        messages: 交给模型审查的消息，序列化后用作审查结果的缓存键
+        cacheable: 是否使用审查结果缓存
+
+    Returns:
+        审查结果
+    """
+    ttl = config_manager.config.llm_config.tools.report_cache_ttl if cacheable else 0
+    key = _verdict_key(messages) if ttl > 0 else ""
+    if ttl > 0 and (cached := await _get_verdict_cache().get(key)) is not None:
+        logger.debug("命中内容审查缓存")
+        return Verdict(**json.loads(cached))
+
+    response = await tools_caller(messages, [REPORT_TOOL])
+    verdict = Verdict()
+    for tool_call in response.tool_calls or []:
+        function_name = tool_call.function.name
+        if function_name == REPORT_TOOL.function.name:
+            function_args = json.loads(tool_call.function.arguments)
+            verdict = Verdict(flagged=True, reason=function_args.get("content", ""))
+        else:
+            await send_to_admin(
+                f"[LLM-Report] 检测到非传入工具调用：{function_name}，请向模型提供商反馈此问题。"
+            )
+    if ttl > 0:
+        await _get_verdict_cache().set(key, json.dumps(asdict(verdict)), ttl)
+    return verdict
+
+
+async def enforce_verdict(event: MessageEvent, bot: Bot, verdict: Verdict) -> bool:
+    """执行审查结果：举报，并在配置了举报后阻断时清除上下文
+
+    Returns:
+        是否需要阻断本次回复
+    """
+    if not verdict.flagged:
+        return False
+    await report(event, verdict.reason, bot)
+    if not config_manager.config.llm_config.tools.report_then_block:
+        return False
+    data = await get_memory_data(event)
+    data.memory.messages = []
+    data.memory.summary = ""
+    await data.save(event)
+    await bot.send(event, random.choice(config_manager.config.llm_config.block_msg))
+    return True
+
+
+def start_speculative_review(
+    event: MessageEvent, messages: list[Message | ToolResult], cacheable: bool = False
+) -> None:
+    """在后台开始审查，结果由 `settle_review` 在发送回复前检查"""
+    discard_review(event)
+    _pending_reviews[id(event)] = asyncio.create_task(review(messages, cacheable))
+
+
+async def settle_review(event: MessageEvent, bot: Bot) -> bool:
+    """等待后台审查完成并执行审查结果
+
+    Returns:
+        是否需要阻断本次回复
+    """
+    if (task := _pending_reviews.pop(id(event), None)) is None:
+        return False
+    try:
+        verdict = await task
+    except Exception as e:
+        logger.opt(exception=e, colors=True).error(f"内容审查失败：{e!s}")
+        return False
+    return await enforce_verdict(event, bot, verdict)
+
+
+def discard_review(event: MessageEvent) -> None:
+    """取消尚未检查的后台审查"""
+    if (task := _pending_reviews.pop(id(event), None)) is not None:
+        task.cancel()
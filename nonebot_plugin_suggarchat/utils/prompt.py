@@ -0,0 +1,63 @@
+"""提示词模板
+
+提示词文件在加载时编译为 `PromptTemplate`，将文本拆分为静态片段与 `{name}` 形式的命名占位符，
+每轮对话只需绑定变量并拼接片段，不再对整个提示词反复执行字符串替换。
+聊天与戳一戳共用同一套模板，提示词文件变更后由配置监视器重新编译。
+"""
+
+from __future__ import annotations
+
+import re
+
+BASE_PROMPT = "你在纯文本环境工作，不允许使用MarkDown回复，我会提供聊天记录，你可以从这里面获取一些关键信息，比如时间与用户身份（e.g.: [管理员/群主/自己/群员][YYYY-MM-DD weekday hh:mm:ss AM/PM][昵称（QQ号）]说:<内容>），但是请不要以这个格式回复。对于消息上报我给你的有几个类型，除了文本还有,\\（戳一戳消息）\\：就是QQ的戳一戳消息是戳一戳了你，而不是我，请参与讨论。交流时不同话题尽量不使用相似句式回复，用户与你交谈的信息在<内容>。\n"
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class PromptTemplate:
+    """编译后的提示词模板
+
+    渲染时未绑定的占位符保持原样，提示词中其他的花括号（如JSON示例）不受影响。
+    """
+
+    __slots__ = ("_parts", "fields", "source")
+
+    def __init__(self, source: str = "") -> None:
+        self.source = source
+        # 偶数位为静态片段，奇数位为占位符名称
+        parts: list[str] = []
+        pos = 0
+        for match in _PLACEHOLDER.finditer(source):
+            parts.extend((source[pos : match.start()], match.group(1)))
+            pos = match.end()
+        parts.append(source[pos:])
+        self._parts = tuple(parts)
+        self.fields = frozenset(parts[1::2])
+
+    def render(self, **values: str) -> str:
+        """绑定变量并生成提示词
+
+        Args:
+            **values: 占位符名称与对应的值
+        """
+        if not self.fields:
+            return self.source
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = values[name] if name in values else f"{{{name}}}"
+        return "".join(parts)
+
+
+def render_system_prompt(
+    template: PromptTemplate, *, use_base_prompt: bool, **values: str
+) -> str:
+    """生成系统提示词
+
+    Args:
+        template: 提示词模板
+        use_base_prompt: 是否在提示词前添加基础提示词
+        **values: 占位符名称与对应的值
+    """
+    text = template.render(**values)
+    return BASE_PROMPT + text if use_base_prompt else text
@@ -0,0 +1,259 @@
+"""模型响应缓存
+
+对固定系统提示词的戳一戳回复、内容审查等高度重复的请求，以
+（预设、规范化后的消息、工具）的稳定哈希为键缓存模型响应：
+- 仅对声明了缓存场景（scope）的调用生效，各场景的缓存相互隔离且有独立的有效期；
+- 内存后端按最久未使用淘汰，SQLite后端按最近访问时间淘汰；
+- 命中的响应用量为0，不会重复计入token统计。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from abc import abstractmethod
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import nonebot_plugin_localstore as store
+from nonebot import logger
+from pydantic import BaseModel as PydanticBaseModel
+
+from ..config import config_manager
+from .models import UniResponse, UniResponseUsage
+
+
+class CacheBackend:
+    """缓存后端基础类"""
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+
+class MemoryBackend(CacheBackend):
+    """内存缓存后端"""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        if (item := self._data.get(key)) is None:
+            return None
+        expire_at, value = item
+        if expire_at < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._data.clear()
+
+
+class SQLiteBackend(CacheBackend):
+    """SQLite缓存后端，可在重启后保留缓存"""
+
+    def __init__(self, path: Path, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expire_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = asyncio.Lock()
+
+    def _get(self, key: str) -> str | None:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value, expire_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute(
+            "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        self._conn.commit()
+        return row[0]
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+            (key, value, now + ttl, now),
+        )
+        self._conn.execute("DELETE FROM response_cache WHERE expire_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM response_cache WHERE key NOT IN "
+            "(SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def _clear(self) -> None:
+        self._conn.execute("DELETE FROM response_cache")
+        self._conn.commit()
+
+    async def get(self, key: str) -> str | None:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def clear(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._clear)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, PydanticBaseModel):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list | tuple):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+class ResponseCache:
+    """模型响应缓存"""
+
+    def __init__(self) -> None:
+        self._backend: CacheBackend | None = None
+        self._backend_conf: tuple[str, int] | None = None
+        self.stats: dict[str, CacheStats] = {}
+
+    @property
+    def backend(self) -> CacheBackend:
+        conf = config_manager.config.response_cache
+        if self._backend is None or self._backend_conf != (
+            conf.backend,
+            conf.max_entries,
+        ):
+            if isinstance(self._backend, SQLiteBackend):
+                self._backend.close()
+            self._backend = (
+                SQLiteBackend(
+                    store.get_plugin_cache_dir() / "response_cache.db",
+                    conf.max_entries,
+                )
+                if conf.backend == "sqlite"
+                else MemoryBackend(conf.max_entries)
+            )
+            self._backend_conf = (conf.backend, conf.max_entries)
+        return self._backend
+
+    def ttl(self, scope: str | None) -> float:
+        """获取调用场景的缓存有效期，返回0表示不缓存"""
+        conf = config_manager.config.response_cache
+        if not conf.enable or scope is None:
+            return 0
+        return max(0, conf.ttl.get(scope, conf.default_ttl))
+
+    @staticmethod
+    async def make_key(
+        kind: str, presets: list[str], messages: Iterable[Any], *extra: Any
+    ) -> str:
+        """计算缓存键
+
+        Args:
+            kind: 调用类型
+            presets: 预设列表，键中包含预设对应的协议、地址与模型，预设被修改后缓存自然失效
+            messages: 消息列表
+            *extra: 其他影响响应的参数（如工具列表）
+        """
+        preset_models = [
+            (name, preset.protocol, preset.base_url, preset.model)
+            for name in presets
+            if (preset := await config_manager.get_preset(name, cache=True))
+        ]
+        payload = json.dumps(
+            [
+                kind,
+                preset_models,
+                config_manager.config.llm_config.max_tokens,
+                _normalize(list(messages)),
+                _normalize(list(extra)),
+            ],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, scope: str, key: str) -> UniResponse | None:
+        """读取缓存的响应，命中时用量为0"""
+        stats = self.stats.setdefault(scope, CacheStats())
+        try:
+            value = await self.backend.get(f"{scope}:{key}")
+        except Exception as e:
+            logger.warning(f"读取响应缓存失败：{e!s}")
+            value = None
+        if value is None:
+            stats.misses += 1
+            return None
+        stats.hits += 1
+        response = UniResponse.model_validate_json(value)
+        response.usage = UniResponseUsage(
+            prompt_tokens=0, completion_tokens=0, total_tokens=0
+        )
+        return response
+
+    async def set(self, scope: str, key: str, response: UniResponse) -> None:
+        """写入响应缓存"""
+        if (ttl := self.ttl(scope)) <= 0:
+            return
+        try:
+            await self.backend.set(f"{scope}:{key}", response.model_dump_json(), ttl)
+        except Exception as e:
+            logger.warning(f"写入响应缓存失败：{e!s}")
+
+    async def clear(self) -> None:
+        """清空缓存与统计"""
+        await self.backend.clear()
+        self.stats.clear()
+
+
+response_cache = ResponseCache()
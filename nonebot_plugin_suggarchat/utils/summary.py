@@ -0,0 +1,141 @@
+"""滚动上下文摘要
+
+上下文超出记忆长度或Tokens限制时，被移出的旧消息不再直接丢弃，而是交给后台任务
+与已有摘要合并为新的摘要，之后每轮对话以一条系统消息的形式携带该摘要：
+- 摘要在会话锁之外生成，不会阻塞回复；
+- 同一会话的摘要任务串行执行，后一次压缩总是基于前一次的结果；
+- 生成的摘要先登记为待应用摘要，下一轮对话在会话锁内应用，同时也会直接写入记忆数据，
+  避免在锁外读取的旧数据覆盖掉新摘要。
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Event
+
+from ..config import config_manager
+from .libchat import extract_text_content, get_chat, get_tokens
+from .lock import get_group_lock, get_private_lock, get_summary_lock
+from .memory import MemoryModel, Message, ToolResult, get_memory_data
+from .models import InsightsModel
+
+SUMMARY_PROMPT = (
+    "你是一个对话摘要助手。请将已有摘要与新的对话记录合并为一份简洁的摘要，"
+    "保留关键事实、参与者的身份与偏好、尚未结束的话题，不要编造内容，不要使用MarkDown，"
+    "直接输出摘要正文。"
+)
+
+_pending_summaries: dict[tuple[int, bool], str] = {}
+_summary_tasks: dict[tuple[int, bool], set[asyncio.Task[None]]] = {}
+
+
+def conversation_key(event: Event) -> tuple[int, bool]:
+    """获取事件对应的会话标识（群号或用户ID，是否为群聊）"""
+    if (group_id := getattr(event, "group_id", None)) is not None:
+        return int(group_id), True
+    return int(event.get_user_id()), False
+
+
+def summary_message(summary: str) -> Message[str]:
+    """将摘要包装为发送给模型的系统消息"""
+    return Message(
+        role="system",
+        content=f"以下是更早之前的对话摘要，仅供参考：\n{summary}",
+    )
+
+
+def apply_pending_summary(data: MemoryModel, event: Event) -> None:
+    """将后台生成的摘要应用到记忆数据上，需要在会话锁内调用"""
+    if (summary := _pending_summaries.pop(conversation_key(event), None)) is not None:
+        data.memory.summary = summary
+
+
+def discard_summary(event: Event) -> None:
+    """丢弃会话尚未应用的摘要并取消进行中的摘要任务（用于清除上下文）"""
+    key = conversation_key(event)
+    _pending_summaries.pop(key, None)
+    for task in _summary_tasks.pop(key, set()):
+        task.cancel()
+
+
+def schedule_summary(
+    event: Event, evicted: list[Message | ToolResult]
+) -> asyncio.Task[None] | None:
+    """在后台将被移出上下文的消息合并进会话摘要
+
+    Args:
+        event: 会话对应的事件
+        evicted: 被移出上下文的消息
+
+    Returns:
+        摘要任务，未启用摘要或没有需要压缩的消息时返回None
+    """
+    if not config_manager.config.session.summary_enable or not evicted:
+        return None
+    key = conversation_key(event)
+    task = asyncio.create_task(_summarize(event, key, list(evicted)))
+    tasks = _summary_tasks.setdefault(key, set())
+    tasks.add(task)
+
+    def _done(t: asyncio.Task[None]) -> None:
+        tasks.discard(t)
+        if not tasks and _summary_tasks.get(key) is tasks:
+            del _summary_tasks[key]
+
+    task.add_done_callback(_done)
+    return task
+
+
+def _format_transcript(messages: list[Message | ToolResult]) -> str:
+    lines: list[str] = []
+    for message in messages:
+        if isinstance(message, ToolResult):
+            lines.append(f"[工具 {message.name} 返回]{message.content}")
+        elif text := extract_text_content(message.content):
+            lines.append(
+                f"[{'助手' if message.role == 'assistant' else message.role}]{text}"
+            )
+    return "\n".join(lines)
+
+
+async def _summarize(
+    event: Event, key: tuple[int, bool], evicted: list[Message | ToolResult]
+) -> None:
+    try:
+        async with get_summary_lock(*key):
+            previous = _pending_summaries.get(key)
+            if previous is None:
+                previous = (await get_memory_data(event)).memory.summary
+            messages: list[Message | ToolResult] = [
+                Message(role="system", content=SUMMARY_PROMPT),
+                Message(
+                    role="user",
+                    content=f"已有摘要：\n{previous or '无'}\n\n新的对话记录：\n{_format_transcript(evicted)}",
+                ),
+            ]
+            preset = config_manager.config.session.summary_preset
+            response = await get_chat(messages, [preset] if preset else None)
+            if not (summary := (response.content or "").strip()):
+                return
+            _pending_summaries[key] = summary
+
+            tokens = await get_tokens(messages, response)
+            insights = await InsightsModel.load()
+            insights.token_input += tokens.prompt_tokens
+            insights.token_output += tokens.completion_tokens
+            insights.token_cached += tokens.cached_tokens
+            insights.token_reasoning += tokens.reasoning_tokens
+            await insights.save()
+
+            ins_id, is_group = key
+            async with (get_group_lock if is_group else get_private_lock)(ins_id):
+                data = await get_memory_data(event)
+                data.memory.summary = summary
+                await data.save(event)
+            logger.debug(f"会话{key}的上下文摘要已更新，共压缩{len(evicted)}条消息")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.opt(exception=e, colors=True).warning(f"生成上下文摘要失败：{e!s}")
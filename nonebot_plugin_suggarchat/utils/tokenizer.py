@@ -27,6 +27,23 @@ def hybrid_token_count(
     return Tokenizer(mode=mode, truncate_mode=truncate_mode).count_tokens(text=text)
 
 
+def count_tokens_batch(
+    texts: list[str],
+    mode: Literal["word", "bpe", "char"] = "word",
+) -> list[int]:
+    """
+    批量计算文本的 Token 数量（可在线程池/进程池中执行）
+
+    Args:
+        texts: 文本列表
+        mode: 分词模式 ['char'(字符级), 'word'(词语级), 'bpe'(混合模式)]
+
+    Returns:
+        list[int]: 与texts一一对应的token数量
+    """
+    return [hybrid_token_count(text, mode) for text in texts]
+
+
 class Tokenizer:
     """通用文本分词器"""
 
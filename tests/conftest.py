@@ -0,0 +1,15 @@
+import tempfile
+from pathlib import Path
+
+import nonebot
+from nonebot.adapters.onebot.v11 import Adapter as OneBotV11Adapter
+
+_store_dir = Path(tempfile.mkdtemp(prefix="suggarchat-test-"))
+
+nonebot.init(
+    localstore_cache_dir=_store_dir / "cache",
+    localstore_config_dir=_store_dir / "config",
+    localstore_data_dir=_store_dir / "data",
+)
+nonebot.get_driver().register_adapter(OneBotV11Adapter)
+nonebot.load_plugin("nonebot_plugin_suggarchat")
@@ -0,0 +1,35 @@
+import pytest
+
+from nonebot_plugin_suggarchat.config import config_manager
+from nonebot_plugin_suggarchat.utils import moderation
+from nonebot_plugin_suggarchat.utils.llm_tools.manager import ToolsManager
+
+
+@pytest.fixture(autouse=True)
+def versions(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(config_manager, "config_version", config_manager.config_version)
+    monkeypatch.setattr(
+        config_manager, "presets_version", config_manager.presets_version
+    )
+
+
+def test_verdict_cache_follows_config_and_presets():
+    cache = moderation._get_verdict_cache()
+    assert moderation._get_verdict_cache() is cache
+
+    config_manager.presets_version += 1
+    after_presets = moderation._get_verdict_cache()
+    assert after_presets is not cache
+
+    config_manager.config_version += 1
+    assert moderation._get_verdict_cache() is not after_presets
+
+
+def test_tool_result_cache_follows_config():
+    manager = ToolsManager()
+    cache = manager._get_result_cache()
+    config_manager.presets_version += 1
+    assert manager._get_result_cache() is cache
+
+    config_manager.config_version += 1
+    assert manager._get_result_cache() is not cache
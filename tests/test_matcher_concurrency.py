@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from nonebot_plugin_suggarchat.config import config_manager
+from nonebot_plugin_suggarchat.event import SuggarEvent
+from nonebot_plugin_suggarchat.matcher import MatcherManager
+from nonebot_plugin_suggarchat.on_event import on_event
+from nonebot_plugin_suggarchat.utils.models import Message
+
+EVENT_TYPE = "test_concurrent_merge"
+
+
+class MergeEvent(SuggarEvent):
+    def get_event_type(self) -> str:
+        return EVENT_TYPE
+
+
+appending = on_event(event_type=EVENT_TYPE, priority=1, block=False)
+replacing = on_event(event_type=EVENT_TYPE, priority=1, block=False)
+
+
+@appending.handle()
+async def append_message(event: MergeEvent) -> None:
+    await asyncio.sleep(0)
+    event.message.append(Message(role="assistant", content="appended"))
+
+
+@replacing.handle()
+async def replace_system_prompt(event: MergeEvent) -> None:
+    event.message[0] = Message(role="system", content="replaced")
+
+
+@pytest.fixture(autouse=True)
+def concurrency(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(config_manager.ins_config, "matcher_concurrency", True)
+
+
+def test_appends_survive_replacement():
+    user_message = Message(role="user", content="hello")
+    messages = [Message(role="system", content="original"), user_message]
+    event = MergeEvent("", None, 0, messages)  # type: ignore[arg-type]
+
+    asyncio.run(MatcherManager.trigger_event(event))
+
+    assert event.message is messages
+    assert [msg.content for msg in messages] == ["replaced", "hello", "appended"]
+    assert messages[1] is user_message
@@ -0,0 +1,19 @@
+import pytest
+
+from nonebot_plugin_suggarchat.utils.models import InsightsModel, Message
+
+
+def test_dict_style_get_is_deprecated():
+    message = Message(role="user", content="hello")
+    with pytest.deprecated_call():
+        assert message.get("role") == "user"
+    with pytest.deprecated_call():
+        assert message.get("missing", "default") == "default"
+
+
+def test_insights_get_on_class_and_instance():
+    assert InsightsModel.get == InsightsModel.load
+    insights = InsightsModel(token_input=1, token_output=2, usage_count=3)
+    with pytest.deprecated_call():
+        assert insights.get("token_output") == 2
+    assert insights["usage_count"] == 3
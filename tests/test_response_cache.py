@@ -0,0 +1,119 @@
+import asyncio
+from collections.abc import Iterable
+from typing import Any
+
+import pytest
+
+from nonebot_plugin_suggarchat.config import ModelPreset, config_manager
+from nonebot_plugin_suggarchat.utils import response_cache as response_cache_module
+from nonebot_plugin_suggarchat.utils.libchat import get_chat
+from nonebot_plugin_suggarchat.utils.memory import Message
+from nonebot_plugin_suggarchat.utils.models import UniResponse, UniResponseUsage
+from nonebot_plugin_suggarchat.utils.protocol import ModelAdapter
+from nonebot_plugin_suggarchat.utils.response_cache import response_cache
+
+
+class CountingAdapter(ModelAdapter):
+    """记录调用次数的测试适配器"""
+
+    __override__ = True
+    calls = 0
+
+    async def call_api(self, messages: Iterable[Any]) -> UniResponse[str, None]:
+        CountingAdapter.calls += 1
+        return UniResponse(
+            role="assistant",
+            content=f"reply {CountingAdapter.calls}",
+            usage=UniResponseUsage(
+                prompt_tokens=10, completion_tokens=5, total_tokens=15
+            ),
+            tool_calls=None,
+        )
+
+    @staticmethod
+    def get_adapter_protocol() -> str:
+        return "test-counting"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(response_cache_module, "time", fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def counting_preset(monkeypatch: pytest.MonkeyPatch):
+    conf = config_manager.ins_config
+    monkeypatch.setattr(
+        conf,
+        "default_preset",
+        ModelPreset(name="default", model="stub", protocol="test-counting"),
+    )
+    monkeypatch.setattr(conf.response_cache, "enable", True)
+    monkeypatch.setattr(conf.response_cache, "backend", "memory")
+    monkeypatch.setattr(conf.response_cache, "default_ttl", 60.0)
+    monkeypatch.setattr(conf.response_cache, "ttl", {"disabled": 0})
+    CountingAdapter.calls = 0
+    asyncio.run(response_cache.clear())
+    yield
+    asyncio.run(response_cache.clear())
+
+
+def chat(scope: str | None, text: str = "hello") -> UniResponse[str, None]:
+    return asyncio.run(
+        get_chat(
+            [Message(role="user", content=text)],
+            ["default"],
+            cache_scope=scope,
+        )
+    )
+
+
+def test_hit_within_ttl(clock: FakeClock):
+    first = chat("poke")
+    clock.now += 30
+    second = chat("poke")
+    assert CountingAdapter.calls == 1
+    assert second.content == first.content
+    assert second.usage is not None
+    assert second.usage.total_tokens == 0
+    assert response_cache.stats["poke"].hits == 1
+
+
+def test_miss_after_ttl(clock: FakeClock):
+    chat("poke")
+    clock.now += 61
+    second = chat("poke")
+    assert CountingAdapter.calls == 2
+    assert second.content == "reply 2"
+
+
+def test_scope_isolation(clock: FakeClock):
+    chat("poke")
+    chat("summary")
+    assert CountingAdapter.calls == 2
+    chat("poke")
+    chat("summary")
+    assert CountingAdapter.calls == 2
+
+
+def test_no_cache_when_ttl_disabled(clock: FakeClock):
+    chat("disabled")
+    chat("disabled")
+    assert CountingAdapter.calls == 2
+    assert "disabled" not in response_cache.stats
+
+
+def test_no_cache_without_scope(clock: FakeClock):
+    chat(None)
+    chat(None)
+    assert CountingAdapter.calls == 2
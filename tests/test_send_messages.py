@@ -0,0 +1,78 @@
+import asyncio
+
+from nonebot.adapters.onebot.v11 import Message as OneBotMessage
+from nonebot.adapters.onebot.v11.event import PrivateMessageEvent, Sender
+
+from nonebot_plugin_suggarchat.event import SuggarEvent
+from nonebot_plugin_suggarchat.handlers.chat import prepare_send_messages
+from nonebot_plugin_suggarchat.matcher import MatcherManager
+from nonebot_plugin_suggarchat.on_event import on_event
+from nonebot_plugin_suggarchat.utils.memory import Memory, MemoryModel
+from nonebot_plugin_suggarchat.utils.models import (
+    Message,
+    TextContent,
+    ToolResult,
+)
+from nonebot_plugin_suggarchat.utils.prompt import PromptTemplate
+
+EVENT_TYPE = "test_mutating_hook"
+
+
+class HookEvent(SuggarEvent):
+    def get_event_type(self) -> str:
+        return EVENT_TYPE
+
+
+mutating = on_event(event_type=EVENT_TYPE, priority=1, block=False)
+
+
+@mutating.handle()
+async def mutate_messages(event: HookEvent) -> None:
+    for msg in event.message:
+        if isinstance(msg, ToolResult) or msg.role == "system":
+            continue
+        if isinstance(msg.content, list):
+            msg.content += [TextContent(text="tampered")]
+        elif isinstance(msg.content, str):
+            msg.content += "tampered"
+
+
+def make_event() -> PrivateMessageEvent:
+    return PrivateMessageEvent(
+        time=0,
+        self_id=1,
+        post_type="message",
+        sub_type="friend",
+        user_id=2,
+        message_type="private",
+        message_id=3,
+        message=OneBotMessage("hi"),
+        original_message=OneBotMessage("hi"),
+        raw_message="hi",
+        font=0,
+        sender=Sender(user_id=2, nickname="tester"),
+    )
+
+
+def test_hook_mutation_does_not_touch_memory():
+    data = MemoryModel(
+        memory=Memory(
+            messages=[
+                Message(role="user", content="hello"),
+                Message(role="assistant", content="hi there"),
+                Message(role="user", content=[TextContent(text="look")]),
+            ]
+        ),
+        sessions=[],
+    )
+    before = data.memory.model_dump()
+    send_messages = prepare_send_messages(
+        make_event(), data, PromptTemplate("system prompt")
+    )
+    event = HookEvent("", None, 0, send_messages)  # type: ignore[arg-type]
+
+    asyncio.run(MatcherManager.trigger_event(event))
+
+    assert data.memory.model_dump() == before
+    contents = [msg.content for msg in event.message if msg.role != "system"]
+    assert contents[:2] == ["hellotampered", "hi theretampered"]